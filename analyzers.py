@@ -0,0 +1,42 @@
+# Analyzers
+import backtrader as bt
+
+
+class TradeList(bt.Analyzer):
+    # Closed trades as plain dicts
+    def start(self):
+        self.trades = []
+        self.sizes = {}
+
+    def notify_trade(self, trade):
+        if trade.justopened:
+            self.sizes[trade.ref] = trade.size
+        elif trade.isclosed:
+            self.trades.append({
+                'data': trade.data._name,
+                'dtopen': bt.num2date(trade.dtopen).isoformat(),
+                'dtclose': bt.num2date(trade.dtclose).isoformat(),
+                'barlen': trade.barlen,
+                'size': self.sizes.pop(trade.ref, None),
+                'price': trade.price,
+                'pnl': trade.pnl,
+                'pnlcomm': trade.pnlcomm,
+                'commission': trade.commission,
+            })
+
+    def get_analysis(self):
+        return self.trades
+
+
+class EquityCurve(bt.Analyzer):
+    # Broker value at the end of every bar
+    def start(self):
+        self.dates = []
+        self.values = []
+
+    def next(self):
+        self.dates.append(self.strategy.datetime[0])
+        self.values.append(self.strategy.broker.getvalue())
+
+    def get_analysis(self):
+        return {'datetime': self.dates, 'value': self.values}
@@ -0,0 +1,263 @@
+# Reproducible benchmarks on synthetic data.
+#
+#   python bench.py --preset quick --out bench_results.json
+#   python bench.py --bars 1000 100000 --tickers 1 10 --only strategy indicator
+#
+# Every case runs in a fresh spawned process so the reported peak RSS belongs
+# to that case alone. Results are written as JSON for comparison across runs.
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+PRESETS = {
+    'quick': dict(bars=[1000, 10000], tickers=[1, 10]),
+    'default': dict(bars=[1000, 10000, 100000], tickers=[1, 10, 100]),
+    'full': dict(bars=[1000, 10000, 100000, 1000000, 10000000], tickers=[1, 10, 100, 1000]),
+}
+
+STRATEGIES = ['SMACrossover', 'MomentumStrategy', 'KDJStrategyOld', 'ElliottWaveStrategy', 'KDJStrategy',
+              'MACDStrategy']
+INDICATORS = ['DirectionalChangeInd', 'CustomZigZag', 'KDJ']
+SIZERS = ['AllInSizer', 'FixedValueSizer']
+
+
+def synthetic_ohlcv(bars, seed=0, mu=0.05, sigma=0.3):
+    # Geometric Brownian motion closes with a plausible open/high/low/volume
+    rng = np.random.default_rng(seed)
+    dt = 1 / 252
+    close = 100 * np.exp(np.cumsum((mu - sigma ** 2 / 2) * dt + sigma * np.sqrt(dt) * rng.standard_normal(bars)))
+    open_ = np.concatenate([[100.0], close[:-1]]) * np.exp(rng.normal(0, 0.002, bars))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, bars))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, bars))
+    volume = rng.integers(1e5, 1e7, bars).astype(np.float64)
+    freq = 'D' if bars <= 50000 else 'min'
+    index = pd.date_range('1990-01-01', periods=bars, freq=freq, name='Date')
+    return pd.DataFrame({'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}, index=index)
+
+
+def _cerebro(bars, tickers):
+    import backtrader as bt
+    cerebro = bt.Cerebro(stdstats=False)
+    for i in range(tickers):
+        cerebro.adddata(bt.feeds.PandasData(dataname=synthetic_ohlcv(bars, seed=i), name=f'T{i}'))
+    cerebro.broker.setcash(10000.0)
+    cerebro.broker.setcommission(commission=0.001)
+    return cerebro
+
+
+def case_strategy(name, bars, tickers):
+    import strategy
+    cerebro = _cerebro(bars, tickers)
+    cerebro.addstrategy(getattr(strategy, name))
+    start = time.perf_counter()
+    cerebro.run()
+    return time.perf_counter() - start
+
+
+def case_indicator(name, bars, tickers):
+    import backtrader as bt
+    import indicator
+
+    class Holder(bt.Strategy):
+        def __init__(self):
+            cls = getattr(indicator, name)
+            source = self.data.close if name == 'CustomZigZag' else self.data
+            self.indicator = cls(source)
+
+    cerebro = _cerebro(bars, tickers)
+    cerebro.addstrategy(Holder)
+    start = time.perf_counter()
+    cerebro.run()
+    return time.perf_counter() - start
+
+
+def case_sizer(name, bars, tickers):
+    import sizer
+    import strategy
+    cerebro = _cerebro(bars, tickers)
+    cerebro.addstrategy(strategy.SMACrossover)
+    cerebro.addsizer(getattr(sizer, name))
+    start = time.perf_counter()
+    cerebro.run()
+    return time.perf_counter() - start
+
+
+def case_get_data(name, bars, tickers):
+    # name is 'miss' (fetch + store write) or 'hit' (served from the store)
+    from datastore import ColumnStore
+    from loader import LocalProvider, load_many
+    with tempfile.TemporaryDirectory() as tmp:
+        raw = os.path.join(tmp, 'raw')
+        os.makedirs(raw)
+        for i in range(tickers):
+            synthetic_ohlcv(bars, seed=i).to_csv(os.path.join(raw, f'T{i}.csv'))
+        provider = LocalProvider(raw)
+        store = ColumnStore(os.path.join(tmp, 'store'))
+        names = [f'T{i}' for i in range(tickers)]
+        end = '2100-01-01'
+        if name == 'hit':
+            load_many(names, '1990-01-01', end, provider=provider, store=store)
+        start = time.perf_counter()
+        load_many(names, '1990-01-01', end, provider=provider, store=store)
+        return time.perf_counter() - start
+
+
+def case_engine(name, bars, tickers):
+    # SMA(10/20) crossover on the same bars through each engine
+    df = synthetic_ohlcv(bars)
+    if name == 'backtrader':
+        import strategy
+        cerebro = _cerebro(bars, 1)
+        cerebro.addstrategy(strategy.SMACrossover, fast=10, slow=20)
+        start = time.perf_counter()
+        cerebro.run()
+        return time.perf_counter() - start
+    if name == 'vector':
+        import strategy
+        import vector
+        start = time.perf_counter()
+        vector.run_fast(strategy.SMACrossover, df, stake=1, fast=10, slow=20)
+        return time.perf_counter() - start
+
+    from backtesting import Backtest, Strategy
+    from backtesting.lib import crossover
+    from backtesting.test import SMA
+
+    class SmaCross(Strategy):
+        n1 = 10
+        n2 = 20
+
+        def init(self):
+            self.sma1 = self.I(SMA, self.data.Close, self.n1)
+            self.sma2 = self.I(SMA, self.data.Close, self.n2)
+
+        def next(self):
+            if crossover(self.sma1, self.sma2):
+                self.buy(size=1)
+            elif crossover(self.sma2, self.sma1):
+                self.position.close()
+
+    data = df.rename(columns=str.capitalize)
+    start = time.perf_counter()
+    Backtest(data, SmaCross, cash=10000, commission=.001).run()
+    return time.perf_counter() - start
+
+
+CASES = {
+    'strategy': (case_strategy, STRATEGIES),
+    'indicator': (case_indicator, INDICATORS),
+    'sizer': (case_sizer, SIZERS),
+    'get_data': (case_get_data, ['miss', 'hit']),
+    'engine': (case_engine, ['backtrader', 'vector', 'backtesting']),
+}
+
+# Cases where more tickers only means more feeds stepping in lockstep
+SINGLE_TICKER = {'engine'}
+
+
+def _run_case(kind, name, bars, tickers, queue):
+    func = CASES[kind][0]
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            seconds = func(name, bars, tickers)
+        error = None
+    except Exception as e:  # keep going, record the failure
+        seconds, error = None, f'{type(e).__name__}: {e}'
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        rss *= 1024  # kilobytes on Linux
+    queue.put((seconds, rss, error))
+
+
+def run_case(kind, name, bars, tickers, timeout=None):
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    proc = ctx.Process(target=_run_case, args=(kind, name, bars, tickers, queue))
+    proc.start()
+    proc.join(timeout)
+    if proc.is_alive():
+        proc.terminate()
+        proc.join()
+        seconds, rss, error = None, None, 'timeout'
+    else:
+        seconds, rss, error = queue.get() if not queue.empty() else (None, None, f'exit code {proc.exitcode}')
+    total = bars * tickers
+    return {
+        'case': kind,
+        'name': name,
+        'bars': bars,
+        'tickers': tickers,
+        'seconds': seconds,
+        'bars_per_sec': total / seconds if seconds else None,
+        'peak_rss_mb': rss / 2 ** 20 if rss else None,
+        'error': error,
+    }
+
+
+def metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    versions = {}
+    for module in ('numpy', 'pandas', 'backtrader', 'backtesting'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'versions': versions,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest benchmark suite')
+    parser.add_argument('--preset', choices=PRESETS, default='quick')
+    parser.add_argument('--bars', type=int, nargs='+')
+    parser.add_argument('--tickers', type=int, nargs='+')
+    parser.add_argument('--only', nargs='+', choices=CASES, help='case kinds to run')
+    parser.add_argument('--names', nargs='+', help='restrict to these strategy/indicator/... names')
+    parser.add_argument('--timeout', type=float, default=600, help='seconds per case')
+    parser.add_argument('--out', default='bench_results.json')
+    args = parser.parse_args(argv)
+
+    bars = args.bars or PRESETS[args.preset]['bars']
+    tickers = args.tickers or PRESETS[args.preset]['tickers']
+    results = []
+    for kind in args.only or CASES:
+        for name in CASES[kind][1]:
+            if args.names and name not in args.names:
+                continue
+            for n_tickers in ([1] if kind in SINGLE_TICKER else tickers):
+                for n_bars in bars:
+                    row = run_case(kind, name, n_bars, n_tickers, args.timeout)
+                    results.append(row)
+                    rate = f"{row['bars_per_sec']:,.0f} bars/s" if row['bars_per_sec'] else row['error']
+                    print(f'{kind:10s} {name:22s} bars={n_bars:<9d} tickers={n_tickers:<5d} {rate}')
+
+    with open(args.out, 'w') as f:
+        json.dump({'meta': metadata(), 'results': results}, f, indent=2)
+    print(f'Wrote {len(results)} results to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,347 @@
+# Cleaning and corporate-action adjustment of stored bars
+#
+# clean() turns a ticker's raw bars in the column store into backtest-ready
+# arrays, all vectorized over the whole history:
+#   - rows with a missing or non-positive price are dropped, high/low are
+#     widened to cover open/close and negative volume is zeroed
+#   - splits and dividends (saved next to the bars by save_actions) are
+#     folded into one per-bar factor; 'back' keeps the latest prices as
+#     traded, 'forward' the first ones. Volume is adjusted for splits only.
+#     Bars a provider already split-adjusts (yfinance; its `split_adjusted`
+#     attribute, saved with the actions) only get the dividend factor.
+#   - a bad print (a one-bar spike that reverses the next bar, both moves
+#     beyond outlier_z robust z-scores) is flattened to the previous close,
+#     or dropped with outliers='drop'
+#   - a daily bar following more than max_gap missing weekdays is flagged
+#   - prices are stored as float32, volume as int32 when it fits
+#
+# The result is cached next to the raw data
+#
+#   data/store/9988.HK/clean/meta.json
+#   data/store/9988.HK/clean/close.npy ...
+#
+# keyed by a hash of the raw column files, the actions and the options, and
+# read back memory-mapped. The hash is only recomputed when the raw files'
+# sizes or mtimes change. panel() aligns several tickers on one calendar.
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from datastore import COLUMNS, ColumnStore, _ns
+
+VERSION = 1  # Part of the cache key; bump when the cleaning rules change
+FIELDS = ('index',) + COLUMNS + ('factor', 'flags')
+
+# flags bits
+GAP = 1
+OUTLIER = 2
+REPAIRED = 4
+
+OPTIONS = {
+    'adjust': 'back',  # 'back', 'forward' or None
+    'outliers': 'fill',  # 'fill', 'drop' or 'keep' (flag only)
+    'outlier_z': 10.0,
+    'max_gap': 5,  # Weekdays
+}
+
+
+def _actions_path(store, ticker):
+    return os.path.join(store._dir(ticker), 'actions.npz')
+
+
+def _action_arrays(actions):
+    # actions: DataFrame indexed by ex-date with 'Dividends' and 'Stock Splits'
+    # columns, as yfinance reports them (dividends in split-adjusted terms,
+    # a 2:1 split as 2.0, 0 where there is none)
+    import pandas as pd
+    index = pd.DatetimeIndex(actions.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return {
+        'index': index.as_unit('ns').asi8.astype(np.int64),
+        'dividends': actions.get('Dividends', pd.Series(0.0, index=actions.index)).to_numpy(dtype=np.float64),
+        'splits': actions.get('Stock Splits', pd.Series(0.0, index=actions.index)).to_numpy(dtype=np.float64),
+    }
+
+
+def save_actions(store, ticker, actions, split_adjusted=False):
+    # actions: see _action_arrays. split_adjusted: the stored bars already
+    # have the splits applied.
+    os.makedirs(store._dir(ticker), exist_ok=True)
+    arrays = {**_action_arrays(actions), 'split_adjusted': np.array(bool(split_adjusted))}
+    tmp = _actions_path(store, ticker) + '.tmp.npz'
+    np.savez(tmp, **arrays)
+    os.replace(tmp, _actions_path(store, ticker))
+
+
+def load_actions(store, ticker):
+    file = _actions_path(store, ticker)
+    if not os.path.exists(file):
+        return None
+    with np.load(file) as f:
+        actions = {k: f[k] for k in ('index', 'dividends', 'splits')}
+        # Files saved before the flag existed hold raw bars' actions
+        actions['split_adjusted'] = bool(f['split_adjusted']) if 'split_adjusted' in f.files else False
+        return actions
+
+
+def adjustment(index, close, actions, how='back'):
+    # (price factor, split factor) per bar. An action applies from the first
+    # bar on or after its ex-date to every earlier bar.
+    n = len(index)
+    price = np.ones(n)
+    split = np.ones(n)
+    if actions is None or how is None or n == 0:
+        return price, split
+    at = np.searchsorted(index, actions['index'], side='left')
+    keep = (at > 0) & (at < n)
+    at = at[keep]
+    splits = np.where(actions['splits'][keep] > 0, actions['splits'][keep], 1.0)
+    if actions.get('split_adjusted'):
+        # The bars already have the splits in; only dividends are left
+        splits = np.ones(len(at))
+    step = np.ones(n)
+    np.multiply.at(step, at, 1.0 / splits)
+    # Product of every later bar's step, i.e. the factor for bars before it
+    split = np.append(np.cumprod(step[::-1])[::-1][1:], 1.0)
+    dividends = actions['dividends'][keep]
+    ratio = np.ones(n)
+    np.multiply.at(ratio, at, 1.0 - dividends / (close[at - 1] * split[at - 1]))
+    price = split * np.append(np.cumprod(ratio[::-1])[::-1][1:], 1.0)
+    if how == 'forward':
+        price = price / price[0]
+        split = split / split[0]
+    elif how != 'back':
+        raise ValueError("adjust must be 'back', 'forward' or None")
+    return price, split
+
+
+def _spikes(close, z):
+    # One-bar moves beyond z robust z-scores that the next bar reverses
+    flags = np.zeros(len(close), dtype=bool)
+    if len(close) < 3:
+        return flags
+    r = np.diff(np.log(close))
+    mad = np.median(np.abs(r - np.median(r))) * 1.4826
+    if not mad > 0:
+        return flags
+    big = np.abs(r - np.median(r)) / mad > z
+    reverse = big[:-1] & big[1:] & (np.sign(r[:-1]) != np.sign(r[1:]))
+    flags[1:-1] = reverse
+    return flags
+
+
+def _gaps(index, max_gap):
+    flags = np.zeros(len(index), dtype=bool)
+    if len(index) < 2:
+        return flags
+    days = index.view('datetime64[ns]').astype('datetime64[D]')
+    if np.median(np.diff(days).astype(np.int64)) < 1:
+        return flags  # Intraday bars
+    missing = np.busday_count(days[:-1], days[1:]) - 1
+    flags[1:] = missing > max_gap
+    return flags
+
+
+def _build(raw, actions, options):
+    index = np.asarray(raw['index'])
+    o, h, l, c, v = (np.asarray(raw[col], dtype=np.float64) for col in COLUMNS)
+    ok = np.isfinite(o) & np.isfinite(h) & np.isfinite(l) & np.isfinite(c) & (np.minimum(o, c) > 0)
+    index, o, h, l, c, v = (x[ok] for x in (index, o, h, l, c, v))
+    flags = np.zeros(len(index), dtype=np.uint8)
+
+    high = np.maximum.reduce([o, h, l, c])
+    low = np.minimum.reduce([o, h, l, c])
+    v = np.where(np.isfinite(v) & (v > 0), v, 0.0)
+    flags[(high != h) | (low != l)] |= REPAIRED
+    h, l = high, low
+
+    price, split = adjustment(index, c, actions, options['adjust'])
+    o, h, l, c = o * price, h * price, l * price, c * price
+    v = v / split
+
+    spikes = _spikes(c, options['outlier_z'])
+    flags[spikes] |= OUTLIER
+    if options['outliers'] == 'fill':
+        at = np.flatnonzero(spikes)
+        o[at] = h[at] = l[at] = c[at] = c[at - 1]
+    elif options['outliers'] == 'drop':
+        index, o, h, l, c, v, price, flags = (x[~spikes] for x in (index, o, h, l, c, v, price, flags))
+    elif options['outliers'] != 'keep':
+        raise ValueError("outliers must be 'fill', 'drop' or 'keep'")
+    flags[_gaps(index, options['max_gap'])] |= GAP
+
+    volume = np.rint(v)
+    vtype = np.int32 if not len(volume) or volume.max() < 2 ** 31 else np.int64
+    out = {'index': index.astype(np.int64)}
+    out.update({col: x.astype(np.float32) for col, x in zip(COLUMNS[:4], (o, h, l, c))})
+    out['volume'] = volume.astype(vtype)
+    out['factor'] = price.astype(np.float32)
+    out['flags'] = flags
+    return out
+
+
+def _raw_files(store, ticker):
+    version = store.meta(ticker).get('version')
+    names = [store._path(ticker, name, version) for name in ('index',) + COLUMNS]
+    names.append(os.path.join(store._dir(ticker), 'meta.json'))
+    if os.path.exists(_actions_path(store, ticker)):
+        names.append(_actions_path(store, ticker))
+    return names
+
+
+def _stat(store, ticker):
+    return [[os.path.basename(f), s.st_size, s.st_mtime_ns] for f in _raw_files(store, ticker)
+            for s in [os.stat(f)]]
+
+
+def _hash(raw, actions, options):
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([VERSION, options], sort_keys=True).encode())
+    for name in ('index',) + COLUMNS:
+        digest.update(memoryview(np.ascontiguousarray(raw[name])).cast('B'))
+    if actions is not None:
+        for name in ('index', 'dividends', 'splits'):
+            digest.update(actions[name].tobytes())
+        digest.update(b'split_adjusted' if actions.get('split_adjusted') else b'')
+    return digest.hexdigest()
+
+
+def _clean_dir(store, ticker):
+    return os.path.join(store._dir(ticker), 'clean')
+
+
+def clean(ticker, store=None, **options):
+    # The whole cleaned history of ticker as a dict of memory-mapped arrays
+    # (FIELDS), rebuilt only when the raw bars, actions or options changed.
+    # None when the ticker is not in the store.
+    store = store or ColumnStore()
+    options = {**OPTIONS, **options}
+    if store.meta(ticker) is None:
+        return None
+    directory = _clean_dir(store, ticker)
+    meta_file = os.path.join(directory, 'meta.json')
+    meta = None
+    if os.path.exists(meta_file):
+        with open(meta_file) as f:
+            meta = json.load(f)
+    stat = _stat(store, ticker)
+    key = json.dumps([VERSION, options], sort_keys=True)
+    if meta is None or meta['options'] != key or meta['stat'] != stat:
+        raw = store.columns(ticker)
+        actions = load_actions(store, ticker)
+        digest = _hash(raw, actions, options)
+        if meta is None or meta['hash'] != digest:
+            os.makedirs(directory, exist_ok=True)
+            for name, arr in _build(raw, actions, options).items():
+                tmp = os.path.join(directory, f'{name}.tmp.npy')
+                np.save(tmp, arr)
+                os.replace(tmp, os.path.join(directory, f'{name}.npy'))
+        meta = {'hash': digest, 'options': key, 'stat': stat}
+        tmp = meta_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_file)
+    return {name: np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r') for name in FIELDS}
+
+
+def columns(ticker, start=None, end=None, store=None, **options):
+    # [start, end) of the cleaned arrays, as slices of the mapped files
+    arrays = clean(ticker, store, **options)
+    if arrays is None:
+        return None
+    index = arrays['index']
+    lo = 0 if start is None else int(np.searchsorted(index, _ns(start), side='left'))
+    hi = len(index) if end is None else int(np.searchsorted(index, _ns(end), side='left'))
+    return {name: arr[lo:hi] for name, arr in arrays.items()}
+
+
+def read(ticker, start=None, end=None, store=None, **options):
+    # Same shape as ColumnStore.read, for bt.feeds.PandasData
+    import pandas as pd
+    cols = columns(ticker, start, end, store, **options)
+    if cols is None:
+        return None
+    index = pd.DatetimeIndex(np.asarray(cols['index']).view('datetime64[ns]'), name='Date')
+    return pd.DataFrame({c: np.asarray(cols[c]) for c in COLUMNS}, index=index)
+
+
+def load(ticker, start, end, store=None, provider=None, **options):
+    # loader.get_data(..., clean=True): fetches the raw bars that are not
+    # stored yet, then reads the cleaned range. When the provider has an
+    # actions() method the actions are fetched again whenever new bars are,
+    # since those may cross a new split or dividend, and whenever none are
+    # stored (bars cached by a plain get_data have none).
+    store = store or ColumnStore()
+    covered = store.covers(ticker, start, end)
+    if covered and load_actions(store, ticker) is not None:
+        return read(ticker, start, end, store, **options)
+    from loader import default_provider
+    provider = provider or default_provider()
+    if not covered:
+        store.load(ticker, start, end, provider)
+    if hasattr(provider, 'actions'):
+        actions = provider.actions(ticker)
+        if actions is not None:
+            split_adjusted = getattr(provider, 'split_adjusted', False)
+            if split_adjusted and _new_split(load_actions(store, ticker), actions):
+                # A split-adjusting provider rewrites its whole history on a
+                # split, so bars stored before it are in the old terms
+                meta = store.meta(ticker)
+                store.write(ticker, provider(ticker, meta['start'], meta['end']), meta['start'], meta['end'])
+            save_actions(store, ticker, actions, split_adjusted)
+    return read(ticker, start, end, store, **options)
+
+
+def _new_split(stored, actions):
+    # True when actions has a split that the stored actions did not. Without
+    # stored actions the bars are taken to be as of their download.
+    if stored is None:
+        return False
+    arrays = _action_arrays(actions)
+    known = stored['index'][stored['splits'] > 0]
+    return bool(np.isin(arrays['index'][arrays['splits'] > 0], known, invert=True).any())
+
+
+def panel(tickers, start=None, end=None, store=None, calendar=None, fill=True, **options):
+    # Cleaned bars of several tickers on one calendar: dict with 'index'
+    # (int64 ns, the union of the tickers' dates unless calendar is given),
+    # (dates x tickers) arrays per column and a 'present' mask. Missing bars
+    # are NaN, or with fill=True a flat bar at the last close with no volume
+    # (NaN before a ticker's first bar).
+    store = store or ColumnStore()
+    parts = [columns(ticker, start, end, store, **options) for ticker in tickers]
+    if calendar is None:
+        calendar = np.unique(np.concatenate([np.asarray(p['index']) for p in parts if p is not None] or
+                                            [np.empty(0, dtype=np.int64)]))
+    else:
+        calendar = np.asarray(calendar)
+        if calendar.dtype.kind == 'M':
+            calendar = calendar.astype('datetime64[ns]').astype(np.int64)
+        elif calendar.dtype.kind not in 'iu':
+            calendar = np.array([_ns(d) for d in calendar], dtype=np.int64)
+    rows, width = len(calendar), len(tickers)
+    out = {'index': calendar, 'present': np.zeros((rows, width), dtype=bool)}
+    for col in COLUMNS:
+        out[col] = np.full((rows, width), np.nan, dtype=np.float32)
+    for j, part in enumerate(parts):
+        if part is None or not len(part['index']):
+            continue
+        at = np.searchsorted(calendar, part['index'])
+        hit = (at < rows) & (calendar[np.minimum(at, rows - 1)] == part['index'])
+        out['present'][at[hit], j] = True
+        for col in COLUMNS:
+            out[col][at[hit], j] = np.asarray(part[col])[hit]
+    if fill and rows:
+        # Row of each cell's last present bar, per column
+        last = np.where(out['present'], np.arange(rows)[:, None], -1)
+        np.maximum.accumulate(last, axis=0, out=last)
+        seen = last >= 0
+        prev = np.where(seen, out['close'][np.maximum(last, 0), np.arange(width)], np.nan)
+        gap = ~out['present']
+        for col in ('open', 'high', 'low', 'close'):
+            out[col][gap] = prev[gap]
+        out['volume'][gap & seen] = 0
+    return out
@@ -0,0 +1,217 @@
+# Columnar on-disk OHLCV store
+import json
+import os
+
+import numpy as np
+
+COLUMNS = ('open', 'high', 'low', 'close', 'volume')
+
+# bt.date2num of 1970-01-01; bar dates are stored as ns since the epoch
+EPOCH_NUM = 719163.0
+NS_PER_DAY = 86400e9
+
+
+def _ns(value):
+    # Date bound as int64 ns since the epoch. Strings are parsed by NumPy so
+    # slicing cached bars does not need pandas imported.
+    if isinstance(value, str):
+        return int(np.datetime64(value, 'ns').astype(np.int64))
+    import pandas as pd
+    return pd.Timestamp(value).value
+
+
+class ColumnStore:
+    # One directory per ticker, one raw float64 file per column plus an int64
+    # nanosecond date index. Reads are memory-mapped so any date range is a
+    # slice of the mapped files rather than a fresh unpickle.
+    #
+    #   data/store/9988.HK/meta.json
+    #   data/store/9988.HK/index.3.bin
+    #   data/store/9988.HK/open.3.bin ...
+    #
+    # A rewrite (write, prepend) puts every column in new files tagged with
+    # the next version and only then switches meta.json to it, so a crash
+    # leaves the previous version intact. Stores from before versioning have
+    # plain {column}.bin names.
+
+    def __init__(self, root='data/store'):
+        self.root = root
+
+    def _dir(self, ticker):
+        return os.path.join(self.root, ticker)
+
+    def _path(self, ticker, name, version=None):
+        suffix = f'.{version}' if version else ''
+        return os.path.join(self._dir(ticker), f'{name}{suffix}.bin')
+
+    def meta(self, ticker):
+        file = os.path.join(self._dir(ticker), 'meta.json')
+        if not os.path.exists(file):
+            return None
+        with open(file) as f:
+            return json.load(f)
+
+    def _write_meta(self, ticker, meta):
+        file = os.path.join(self._dir(ticker), 'meta.json')
+        tmp = file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, file)
+
+    def _map(self, ticker, name, meta):
+        dtype = np.int64 if name == 'index' else np.float64
+        if meta['rows'] == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._path(ticker, name, meta.get('version')), dtype=dtype, mode='r',
+                         shape=(meta['rows'],))
+
+    def _bounds(self, ticker, meta, start, end):
+        index = self._map(ticker, 'index', meta)
+        lo = 0 if start is None else int(np.searchsorted(index, _ns(start), side='left'))
+        hi = meta['rows'] if end is None else int(np.searchsorted(index, _ns(end), side='left'))
+        return index, lo, hi
+
+    def columns(self, ticker, start=None, end=None):
+        # Zero-copy view of [start, end) as a dict of memmap slices
+        meta = self.meta(ticker)
+        if meta is None:
+            return None
+        index, lo, hi = self._bounds(ticker, meta, start, end)
+        out = {'index': index[lo:hi]}
+        for col in COLUMNS:
+            out[col] = self._map(ticker, col, meta)[lo:hi]
+        return out
+
+    def iter_chunks(self, ticker, start=None, end=None, size=65536):
+        # Yields dicts of column blocks for [start, end), read with np.fromfile
+        # so resident memory stays at one block however long the range is
+        meta = self.meta(ticker)
+        if meta is None:
+            return
+        _, lo, hi = self._bounds(ticker, meta, start, end)
+        version = meta.get('version')
+        for pos in range(lo, hi, size):
+            count = min(size, hi - pos)
+            block = {'index': np.fromfile(self._path(ticker, 'index', version), dtype=np.int64, count=count,
+                                          offset=pos * 8)}
+            for col in COLUMNS:
+                block[col] = np.fromfile(self._path(ticker, col, version), dtype=np.float64, count=count,
+                                         offset=pos * 8)
+            yield block
+
+    def read(self, ticker, start=None, end=None, copy=False):
+        # DataFrame whose columns are the memmap slices themselves (read-only);
+        # copy=True detaches it from the files
+        import pandas as pd
+        cols = self.columns(ticker, start, end)
+        if cols is None:
+            return None
+        index = pd.DatetimeIndex(cols['index'].view('datetime64[ns]'), name='Date', copy=copy)
+        return pd.DataFrame({c: cols[c] for c in COLUMNS}, index=index, copy=copy)
+
+    def _to_arrays(self, df):
+        import pandas as pd
+        if df is None or len(df) == 0:
+            return {'index': np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in COLUMNS}}
+        index = pd.DatetimeIndex(df.index)
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        arrays = {'index': index.as_unit('ns').asi8.astype(np.int64)}
+        for col in COLUMNS:
+            arrays[col] = df[col].to_numpy(dtype=np.float64)
+        return arrays
+
+    @staticmethod
+    def _covered(end, fetched, index, previous):
+        # How far [.., end) is known to be complete. A fetch that returned no
+        # bars proves nothing (outage, bad ticker) and keeps the previous end.
+        # Otherwise days before today are final, so the range is covered up
+        # to today even where it has no bars (weekends, holidays); a bar dated
+        # today or later may still be forming and its day is left open, so
+        # the next load fetches it again.
+        if not fetched:
+            return previous
+        today = str(np.datetime64('today', 'D'))
+        last = str(np.datetime64(int(index[-1]), 'ns').astype('datetime64[D]'))
+        return min(end, max(previous, today, last))
+
+    def _rewrite(self, ticker, arrays, meta):
+        # Every column into files of the next version, then the switch to it
+        # in meta.json, then the old version is dropped
+        os.makedirs(self._dir(ticker), exist_ok=True)
+        old = None if meta is None else meta.get('version')
+        version = (old or 0) + 1
+        for name, arr in arrays.items():
+            arr.tofile(self._path(ticker, name, version))
+        meta = {**(meta or {}), 'version': version, 'rows': len(arrays['index'])}
+        self._write_meta(ticker, meta)
+        for name in arrays:
+            try:
+                os.remove(self._path(ticker, name, old))
+            except OSError:
+                # Already gone, or still mapped by a reader on Windows
+                pass
+        return meta
+
+    def write(self, ticker, df, start, end):
+        # Replace whatever is stored for ticker with df, covering [start, end)
+        arrays = self._to_arrays(df)
+        meta = self.meta(ticker)
+        end = self._covered(end, len(arrays['index']), arrays['index'], start)
+        self._rewrite(ticker, arrays, {'version': None if meta is None else meta.get('version'),
+                                       'start': start, 'end': end})
+
+    def append(self, ticker, df, end):
+        # Bars after the stored tail; only the new bytes are written. Fetched
+        # bars from the stored last day on replace the stored ones, which may
+        # have been partial.
+        meta = self.meta(ticker)
+        arrays = self._to_arrays(df)
+        fetched = len(arrays['index'])
+        rows = meta['rows']
+        pos = rows
+        if rows and fetched:
+            pos = int(np.searchsorted(self._map(ticker, 'index', meta), arrays['index'][0], side='left'))
+        version = meta.get('version')
+        for name, arr in arrays.items():
+            with open(self._path(ticker, name, version), 'r+b') as f:
+                # Writing from `pos` and cutting there also drops the tail of
+                # an append that crashed before meta.json was updated
+                f.seek(pos * arr.itemsize)
+                arr.tofile(f)
+                f.truncate()
+        meta['rows'] = pos + fetched
+        meta['end'] = self._covered(end, fetched, self._map(ticker, 'index', meta), meta['end'])
+        self._write_meta(ticker, meta)
+
+    def prepend(self, ticker, df, start):
+        # New head bars: the column files have to be rewritten once
+        meta = self.meta(ticker)
+        old = self.columns(ticker)
+        arrays = self._to_arrays(df)
+        if not len(arrays['index']):
+            return
+        if len(old['index']):
+            keep = arrays['index'] < old['index'][0]
+            arrays = {k: v[keep] for k, v in arrays.items()}
+        merged = {k: np.concatenate([arrays[k], np.asarray(old[k])]) for k in arrays}
+        del old
+        self._rewrite(ticker, merged, {**meta, 'start': start})
+
+    def covers(self, ticker, start, end):
+        # True when [start, end) can be served without fetching
+        meta = self.meta(ticker)
+        return meta is not None and meta['start'] <= start and meta['end'] >= end
+
+    def load(self, ticker, start, end, fetch):
+        # Return [start, end) for ticker, calling fetch(ticker, start, end) only
+        # for the part of the range that is not on disk yet.
+        meta = self.meta(ticker)
+        if meta is None:
+            self.write(ticker, fetch(ticker, start, end), start, end)
+        else:
+            if start < meta['start']:
+                self.prepend(ticker, fetch(ticker, start, meta['start']), start)
+            if end > meta['end']:
+                self.append(ticker, fetch(ticker, meta['end'], end), end)
+        return self.read(ticker, start, end)
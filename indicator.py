@@ -1,4 +1,138 @@
+import math
+import threading
+from array import array
+from collections import OrderedDict, deque
+
 import backtrader as bt
+import numpy as np
+
+
+class IndicatorCache:
+    # Shares one indicator instance between strategies running on the same
+    # feed. Entries are keyed by (class, source lines, params); sources are
+    # compared by identity so separate runs never collide. The creating
+    # strategy owns (and advances) the indicator and drops its entries when it
+    # stops; maxsize bounds the cache in large multi-strategy runs.
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, owner, indcls, *datas, **params):
+        key = (indcls, tuple(id(d) for d in datas), tuple(sorted(params.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and all(a is b for a, b in zip(entry[1], datas)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        indicator = indcls(*datas, **params)
+        with self._lock:
+            self._entries[key] = (indicator, datas, owner)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return indicator
+
+    def release(self, owner):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[2] is owner]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+indicator_cache = IndicatorCache()
+
+
+# Batch kernels used by the indicators' once() in runonce mode. They walk the
+# full line arrays in one call with the exact arithmetic of the streaming
+# next() code, so both paths produce bit-identical lines.
+
+def directional_change(high, low, close, sigma, start, end, state):
+    # state = [up_zig, tmp_max, tmp_min]; returns {index: top} and {index: bottom}
+    up_zig, tmp_max, tmp_min = state
+    tops, bottoms = {}, {}
+    for i in range(start, end):
+        if up_zig:
+            if high[i] > tmp_max:
+                tmp_max = high[i]
+            elif close[i] < tmp_max - tmp_max * sigma / 1000:
+                tops[i] = tmp_max
+                up_zig = False
+                tmp_min = low[i]
+        else:
+            if low[i] < tmp_min:
+                tmp_min = low[i]
+            elif close[i] > tmp_min + tmp_min * sigma / 1000:
+                bottoms[i] = tmp_min
+                up_zig = True
+                tmp_max = high[i]
+    state[:] = [up_zig, tmp_max, tmp_min]
+    return tops, bottoms
+
+
+def zigzag(data, percent, start, end, state):
+    # state = [last_pivot_price, last_pivot_type, last_pivot_idx]; returns the
+    # zigzag values for [start, end)
+    last_price, last_type, last_idx = state
+    up = 1 + percent / 100
+    down = 1 - percent / 100
+    out = [0.0] * (end - start)
+    for i in range(start, end):
+        price = data[i]
+        if last_price is None:
+            last_price = price
+            last_type = 'low'
+            out[i - start] = price
+        elif last_type == 'low':
+            if price >= last_price * up:
+                out[i - start] = price
+                last_price = price
+                last_type = 'high'
+                last_idx = i
+        elif price <= last_price * down:
+            out[i - start] = price
+            last_price = price
+            last_type = 'low'
+            last_idx = i
+    state[:] = [last_price, last_type, last_idx]
+    return out
+
+
+def kdj(high, low, close, period, period_d, period_j):
+    # Returns K, D, J arrays (NaN until each line's own warm-up is over)
+    high = np.asarray(high, dtype=np.float64)
+    low = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    n = len(close)
+    k = np.full(n, np.nan)
+    d = np.full(n, np.nan)
+    j = np.full(n, np.nan)
+    if n < period:
+        return k, d, j
+    hh = np.lib.stride_tricks.sliding_window_view(high, period).max(axis=1)
+    ll = np.lib.stride_tricks.sliding_window_view(low, period).min(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = 100 * (close[period - 1:] - ll) / (hh - ll)
+    rsv[hh == ll] = np.nan
+    # bt's SMA divides a math.fsum, which numpy's pairwise sum does not match
+    k0 = period + period_d - 2
+    if n > k0:
+        windows = np.lib.stride_tricks.sliding_window_view(rsv, period_d).tolist()
+        k[k0:] = [math.fsum(w) / period_d for w in windows]
+    d0 = k0 + period_j - 1
+    if n > d0:
+        windows = np.lib.stride_tricks.sliding_window_view(k[k0:], period_j).tolist()
+        d[d0:] = [math.fsum(w) / period_j for w in windows]
+        j[d0:] = 3 * k[d0:] - 2 * d[d0:]
+    return k, d, j
+
 
 class DirectionalChangeInd(bt.Indicator):
     lines = ('tops', 'bottoms',)
@@ -42,6 +176,20 @@ class DirectionalChangeInd(bt.Indicator):
                 self.up_zig = True
                 self.tmp_max = self.data.high[0]
 
+    def preonce(self, start, end):
+        if end > start:
+            self.tmp_max = self.data.high.array[end - 1]
+            self.tmp_min = self.data.low.array[end - 1]
+
+    def once(self, start, end):
+        state = [self.up_zig, self.tmp_max, self.tmp_min]
+        tops, bottoms = directional_change(self.data.high.array, self.data.low.array,
+                                           self.data.close.array, self.p.sigma, start, end, state)
+        self.up_zig, self.tmp_max, self.tmp_min = state
+        for dst, values in ((self.l.tops.array, tops), (self.l.bottoms.array, bottoms)):
+            for i, value in values.items():
+                dst[i] = value
+
 
 class CustomZigZag(bt.Indicator):
     lines = ('zigzag',)
@@ -82,6 +230,11 @@ class CustomZigZag(bt.Indicator):
             else:
                 self.lines.zigzag[0] = 0  # No new pivot
 
+    def once(self, start, end):
+        state = [self.last_pivot_price, self.last_pivot_type, self.last_pivot_idx]
+        self.lines.zigzag.array[start:end] = array('d', zigzag(self.data.array, self.p.percent, start, end, state))
+        self.last_pivot_price, self.last_pivot_type, self.last_pivot_idx = state
+
 
 class KDJ(bt.Indicator):
     lines = ('K', 'D', 'J')
@@ -92,12 +245,41 @@ class KDJ(bt.Indicator):
     )
 
     def __init__(self):
-        # Calculate %K
-        highest = bt.indicators.Highest(self.data.high, period=self.p.period)
-        lowest = bt.indicators.Lowest(self.data.low, period=self.p.period)
-        rsv = 100 * (self.data.close - lowest) / (highest - lowest)
-        self.lines.K = bt.indicators.SMA(rsv, period=self.p.period_d)
-        # Calculate %D
-        self.lines.D = bt.indicators.SMA(self.lines.K, period=self.p.period_j)
-        # Calculate %J
-        self.lines.J = 3 * self.lines.K - 2 * self.lines.D
\ No newline at end of file
+        # %K = SMA(RSV, period_d), %D = SMA(%K, period_j), %J = 3K - 2D
+        self.addminperiod(self.p.period + self.p.period_d + self.p.period_j - 2)
+        self._rsv = deque(maxlen=self.p.period_d)
+        self._k = deque(maxlen=self.p.period_j)
+
+    def prenext(self):
+        # K (and D) become available before the full minimum period
+        self.next()
+
+    def next(self):
+        if len(self) < self.p.period:
+            return
+        highest = max(self.data.high.get(size=self.p.period))
+        lowest = min(self.data.low.get(size=self.p.period))
+        # A flat window has no range: NaN, as the numpy kernel in once() gives
+        rsv = 100 * (self.data.close[0] - lowest) / (highest - lowest) if highest != lowest else math.nan
+        self._rsv.append(rsv)
+        if len(self._rsv) < self.p.period_d:
+            return
+        self.lines.K[0] = k = math.fsum(self._rsv) / self.p.period_d
+        self._k.append(k)
+        if len(self._k) < self.p.period_j:
+            return
+        self.lines.D[0] = d = math.fsum(self._k) / self.p.period_j
+        self.lines.J[0] = 3 * k - 2 * d
+
+    def preonce(self, start, end):
+        pass
+
+    def oncestart(self, start, end):
+        pass
+
+    def once(self, start, end):
+        # Whole history in one pass, including the warm-up values of K and D
+        k, d, j = kdj(self.data.high.array[:end], self.data.low.array[:end], self.data.close.array[:end],
+                      self.p.period, self.p.period_d, self.p.period_j)
+        for line, values in ((self.lines.K, k), (self.lines.D, d), (self.lines.J, j)):
+            line.array[:end] = array('d', values.tolist())
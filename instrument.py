@@ -0,0 +1,109 @@
+# Opt-in hot-path instrumentation for strategies
+import cProfile
+import io
+import pstats
+import resource
+import sys
+import time
+
+
+def rss_bytes():
+    # Current resident set size; falls back to the peak where /proc is missing
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+class HotPath:
+    # Installed on a strategy instance only when asked for: next() and
+    # notify_order() are replaced by timed wrappers on that instance, so a
+    # strategy without instrumentation runs the original methods untouched.
+    # get_analysis() mirrors the analyzer interface.
+
+    def __init__(self, strategy, every=1000, profile=None):
+        self.strategy = strategy
+        self.every = every
+        self.profile = profile  # None, 'cprofile' or 'line'
+        self.bars = 0
+        self.next_ns = 0
+        self.next_max_ns = 0
+        self.orders = {}
+        self.memory = []
+        self.started = None
+        self.first_next = None
+        self.stopped = None
+        self.profiler = None
+
+    def install(self):
+        strategy = self.strategy
+        next_ = strategy.next
+        notify_order = strategy.notify_order
+        clock = time.perf_counter_ns
+
+        def timed_next():
+            t0 = clock()
+            if self.first_next is None:
+                self.first_next = t0
+            next_()
+            dt = clock() - t0
+            self.next_ns += dt
+            if dt > self.next_max_ns:
+                self.next_max_ns = dt
+            self.bars += 1
+            if self.bars % self.every == 0:
+                self.memory.append((self.bars, rss_bytes()))
+
+        def counted_notify_order(order):
+            status = order.getstatusname()
+            self.orders[status] = self.orders.get(status, 0) + 1
+            notify_order(order)
+
+        strategy.next = timed_next
+        strategy.notify_order = counted_notify_order
+
+        if self.profile == 'cprofile':
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        elif self.profile == 'line':
+            from line_profiler import LineProfiler
+            self.profiler = LineProfiler(type(strategy).next)
+            self.profiler.enable_by_count()
+        self.memory.append((0, rss_bytes()))
+        self.started = clock()
+
+    def finish(self):
+        self.stopped = time.perf_counter_ns()
+        if self.profiler is not None:
+            if self.profile == 'line':
+                self.profiler.disable_by_count()
+            else:
+                self.profiler.disable()
+        self.memory.append((self.bars, rss_bytes()))
+
+    def profile_text(self, limit=30):
+        if self.profiler is None:
+            return None
+        stream = io.StringIO()
+        if self.profile == 'line':
+            self.profiler.print_stats(stream=stream)
+        else:
+            pstats.Stats(self.profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+        return stream.getvalue()
+
+    def get_analysis(self):
+        warmup = (self.first_next or self.stopped or self.started) - self.started
+        return {
+            'bars': self.bars,
+            'next_total_s': self.next_ns / 1e9,
+            'next_mean_us': self.next_ns / self.bars / 1e3 if self.bars else None,
+            'next_max_us': self.next_max_ns / 1e3,
+            'warmup_s': warmup / 1e9,
+            'run_s': ((self.stopped or time.perf_counter_ns()) - self.started) / 1e9,
+            'orders': dict(self.orders),
+            'memory': [(bars, rss / 2 ** 20) for bars, rss in self.memory],
+            'rss_growth_mb': (self.memory[-1][1] - self.memory[0][1]) / 2 ** 20,
+            'profile': self.profile_text(),
+        }
@@ -0,0 +1,114 @@
+# Buffered, structured trade/event journal
+import logging
+
+import numpy as np
+
+DEBUG = logging.DEBUG
+INFO = logging.INFO
+WARNING = logging.WARNING
+
+FIELDS = ('price', 'size', 'value', 'comm', 'cash', 'stop', 'target', 'k', 'd', 'k_prev', 'd_prev')
+
+# Message templates, only rendered when the journal is read
+EVENTS = {
+    'message': '{text}',
+    'buy_executed': 'BUY EXECUTED: {size:.0f} shares at ${price:.2f}, Total Value: ${value:.2f}, '
+                    'Commission: ${comm:.2f}, Cash: ${cash:.2f}',
+    'sell_executed': 'SELL EXECUTED: {size:.0f} shares at ${price:.2f}, Total Value: ${value:.2f}, '
+                     'Commission: ${comm:.2f}, Cash: ${cash:.2f}',
+    'buy_create': 'BUY CREATE at {price:.2f}',
+    'sell_create': 'SELL CREATE at {price:.2f}',
+    'buy_bracket': 'BUY at {price:.2f}, Stop: {stop:.2f}, Profit: {target:.2f}',
+    'sell': 'SELL at {price:.2f}',
+    'stop_hit': 's {price} {target}',
+    'kd_sell': 's {k} {d} {k_prev} {d_prev}',
+    'kd_buy': 'b {k} {d} {k_prev} {d_prev}',
+    'final_value': 'Final Portfolio Value: {value:.2f}',
+}
+EVENT_NAMES = list(EVENTS)
+EVENT_CODES = {name: i for i, name in enumerate(EVENT_NAMES)}
+
+
+class Journal:
+    # Appends typed records to preallocated NumPy columns (doubling when
+    # full). mode is 'memory' (keep records), 'print' (also echo each record
+    # as it arrives) or 'off' (drop everything, e.g. in sweeps). Records below
+    # `level` are dropped at the call site.
+
+    def __init__(self, mode='memory', level=INFO, capacity=256):
+        self.mode = mode
+        self.level = level if mode != 'off' else float('inf')
+        self.n = 0
+        self.dt = np.empty(capacity)
+        self.levels = np.empty(capacity, dtype=np.int8)
+        self.events = np.empty(capacity, dtype=np.int16)
+        self.values = np.full((capacity, len(FIELDS)), np.nan)
+        self.texts = {}
+
+    def enabled(self, level=INFO):
+        return level >= self.level
+
+    def _grow(self):
+        capacity = 2 * len(self.dt)
+        self.dt = np.resize(self.dt, capacity)
+        self.levels = np.resize(self.levels, capacity)
+        self.events = np.resize(self.events, capacity)
+        values = np.full((capacity, len(FIELDS)), np.nan)
+        values[:self.n] = self.values[:self.n]
+        self.values = values
+
+    def record(self, dt, event, level=INFO, text=None, **fields):
+        if level < self.level:
+            return
+        if self.n == len(self.dt):
+            self._grow()
+        i = self.n
+        self.dt[i] = dt
+        self.levels[i] = level
+        self.events[i] = EVENT_CODES[event]
+        row = self.values[i]
+        for name, value in fields.items():
+            row[FIELDS.index(name)] = value
+        if text is not None:
+            self.texts[i] = text
+        self.n += 1
+        if self.mode == 'print':
+            print(self.format(i))
+
+    def __len__(self):
+        return self.n
+
+    def format(self, i):
+        fields = dict(zip(FIELDS, self.values[i].tolist()))
+        fields['text'] = self.texts.get(i, '')
+        return f'{self._date(self.dt[i])}: {EVENTS[EVENT_NAMES[self.events[i]]].format(**fields)}'
+
+    @staticmethod
+    def _date(dt):
+        import backtrader as bt
+        return bt.num2date(dt).date()
+
+    def lines(self):
+        return [self.format(i) for i in range(self.n)]
+
+    def to_frame(self, messages=False):
+        import backtrader as bt
+        import pandas as pd
+        n = self.n
+        df = pd.DataFrame(self.values[:n], columns=list(FIELDS))
+        df.insert(0, 'datetime', [bt.num2date(dt) for dt in self.dt[:n].tolist()])
+        df.insert(1, 'level', self.levels[:n])
+        df.insert(2, 'event', pd.Categorical.from_codes(self.events[:n], categories=EVENT_NAMES))
+        df['text'] = [self.texts.get(i) for i in range(n)]
+        if messages:
+            df['message'] = self.lines()
+        return df.dropna(axis=1, how='all')
+
+    def flush(self, path):
+        # Bulk write to .parquet or .csv
+        df = self.to_frame()
+        if path.endswith('.parquet'):
+            df.to_parquet(path)
+        else:
+            df.to_csv(path, index=False)
+        return path
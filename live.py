@@ -0,0 +1,317 @@
+# Asyncio paper-trading replay with latency metrics
+#
+# ReplayServer is a local stand-in for a market data / order gateway: it
+# streams cached bars from the column store over a localhost socket as
+# newline-delimited JSON, merged across tickers in time order and paced at
+# `speed` times real time, and acknowledges order messages.
+#
+# run_paper() connects to it, routes each bar into a per-ticker queue, and
+# runs one Cerebro per ticker (in its own thread) on a LiveFeed reading that
+# queue, so the unchanged strategy classes and their indicators step bar by
+# bar as data arrives. Orders the strategies place are mirrored to the
+# server. Two latency histograms are kept:
+#   tick_to_decision   bar received from the socket -> strategy.next() returns
+#   decision_to_order  next() returns -> server acknowledged the order
+import asyncio
+import json
+import math
+import queue
+import threading
+import time
+
+import backtrader as bt
+import numpy as np
+
+from datastore import COLUMNS, EPOCH_NUM, NS_PER_DAY, ColumnStore
+
+EOF = None
+
+
+class Histogram:
+    # Log-spaced latency buckets from 1us to 100s (20 per decade)
+    EDGES = np.logspace(3, 11, 161)  # ns
+
+    def __init__(self):
+        self.counts = np.zeros(len(self.EDGES) + 1, dtype=np.int64)
+        self.n = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, ns):
+        self.counts[np.searchsorted(self.EDGES, ns)] += 1
+        self.n += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.n += other.n
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q):
+        # Upper edge of the bucket holding the q-th percentile, in ns
+        if not self.n:
+            return math.nan
+        i = int(np.searchsorted(np.cumsum(self.counts), math.ceil(self.n * q / 100)))
+        return min(float(self.EDGES[min(i, len(self.EDGES) - 1)]), self.max)
+
+    def summary(self):
+        us = 1e-3
+        return {
+            'count': self.n,
+            'mean_us': self.total / self.n * us if self.n else math.nan,
+            'p50_us': self.percentile(50) * us,
+            'p90_us': self.percentile(90) * us,
+            'p99_us': self.percentile(99) * us,
+            'max_us': self.max * us,
+        }
+
+
+class ReplayServer:
+    # Serves [start, end) of `tickers` from a ColumnStore to each client.
+    # speed=60 plays a minute bar per second; speed=None sends as fast as
+    # the socket takes them.
+
+    def __init__(self, store, tickers, start=None, end=None, speed=None, host='127.0.0.1', port=0):
+        self.store = store
+        self.tickers = list(tickers)
+        self.start = start
+        self.end = end
+        self.speed = speed
+        self.host = host
+        self.port = port
+        self.server = None
+        self.clients = set()
+
+    async def serve(self):
+        self.server = await asyncio.start_server(self._client, self.host, self.port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        self.server.close()
+        await asyncio.gather(*self.clients, return_exceptions=True)
+        await self.server.wait_closed()
+
+    def _bars(self):
+        # All tickers merged into one time-ordered stream
+        parts = []
+        for i, ticker in enumerate(self.tickers):
+            cols = self.store.columns(ticker, self.start, self.end)
+            if cols is None or not len(cols['index']):
+                continue
+            block = np.column_stack([np.asarray(cols[c]) for c in COLUMNS])
+            parts.append((np.asarray(cols['index']), np.full(len(block), i), block))
+        if not parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty((0, len(COLUMNS)))
+        index = np.concatenate([p[0] for p in parts])
+        order = np.argsort(index, kind='stable')
+        return (index[order], np.concatenate([p[1] for p in parts])[order],
+                np.concatenate([p[2] for p in parts])[order])
+
+    async def _client(self, reader, writer):
+        self.clients.add(asyncio.current_task())
+        acks = asyncio.create_task(self._ack(reader, writer))
+        index, which, values = self._bars()
+        previous = None
+        started = time.perf_counter()
+        for t, i, row in zip(index.tolist(), which.tolist(), values.tolist()):
+            if self.speed and previous is not None and t != previous:
+                # Pace on the bar clock, measured from the first bar
+                due = (t - index[0]) / 1e9 / self.speed - (time.perf_counter() - started)
+                if due > 0:
+                    await asyncio.sleep(due)
+            previous = t
+            writer.write(json.dumps({'s': self.tickers[i], 't': t, 'v': row}).encode() + b'\n')
+            await writer.drain()
+        writer.write(b'{"eof": 1}\n')
+        await writer.drain()
+        await acks
+        writer.close()
+
+    async def _ack(self, reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            message = json.loads(line)
+            writer.write(json.dumps({'ack': message['id']}).encode() + b'\n')
+            await writer.drain()
+
+
+class LiveFeed(bt.feed.DataBase):
+    # Bars pushed into `queue` as (bt date, open, high, low, close, volume,
+    # receive time in ns); EOF (None) ends the feed. An empty queue makes
+    # _load return None, which backtrader's live loop treats as "no bar yet".
+    params = (
+        ('queue', None),
+        ('qcheck', 0.5),
+    )
+
+    recv_ns = 0
+
+    def islive(self):
+        return True
+
+    def _load(self):
+        try:
+            bar = self.p.queue.get(timeout=self._qcheck)
+        except queue.Empty:
+            return None
+        if bar is EOF:
+            return False
+        dt, o, h, l, c, v, self.recv_ns = bar
+        self.lines.datetime[0] = dt
+        self.lines.open[0] = o
+        self.lines.high[0] = h
+        self.lines.low[0] = l
+        self.lines.close[0] = c
+        self.lines.volume[0] = v
+        self.lines.openinterest[0] = 0.0
+        return True
+
+
+class OrderGateway:
+    # Mirrors orders to the replay server; called from the strategy threads
+    def __init__(self, loop, writer):
+        self.loop = loop
+        self.writer = writer
+        self.pending = {}
+        self.ids = 0
+        self.lock = threading.Lock()
+
+    def send(self, ticker, order, decided, histogram):
+        with self.lock:
+            self.ids += 1
+            oid = self.ids
+            self.pending[oid] = (decided, histogram)
+        message = {'id': oid, 's': ticker, 'side': 'buy' if order.isbuy() else 'sell', 'size': order.size}
+        self.loop.call_soon_threadsafe(self.writer.write, json.dumps(message).encode() + b'\n')
+
+    def ack(self, oid, received):
+        with self.lock:
+            decided, histogram = self.pending.pop(oid)
+        histogram.record(received - decided)
+
+
+class Latency(bt.Analyzer):
+    # Wraps this strategy instance's next() to time each decision and send
+    # the orders it placed through the gateway
+    params = (('gateway', None),)
+
+    def start(self):
+        strategy = self.strategy
+        feed = strategy.data
+        next_ = strategy.next
+        clock = time.perf_counter_ns
+        self.tick_to_decision = Histogram()
+        self.decision_to_order = Histogram()
+        self.orders = 0
+
+        def timed_next():
+            placed = len(strategy.broker.orders)
+            next_()
+            decided = clock()
+            self.tick_to_decision.record(decided - feed.recv_ns)
+            for order in strategy.broker.orders[placed:]:
+                self.orders += 1
+                if self.p.gateway is not None:
+                    self.p.gateway.send(feed._name, order, decided, self.decision_to_order)
+
+        strategy.next = timed_next
+
+    def get_analysis(self):
+        return {'tick_to_decision': self.tick_to_decision, 'decision_to_order': self.decision_to_order,
+                'orders': self.orders}
+
+
+def _session(ticker, bars, strategy, params, cash, commission, sizer, sizer_params, gateway, timeframe,
+             compression):
+    cerebro = bt.Cerebro(stdstats=False, preload=False, runonce=False)
+    cerebro.adddata(LiveFeed(queue=bars, name=ticker, timeframe=timeframe, compression=compression))
+    cerebro.addstrategy(strategy, **params)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    if sizer is not None:
+        cerebro.addsizer(sizer, **(sizer_params or {}))
+    cerebro.addanalyzer(Latency, _name='latency', gateway=gateway)
+    strat = cerebro.run()[0]
+    return {'ticker': ticker, 'bars': len(strat.data), 'final_value': strat.broker.getvalue(),
+            **strat.analyzers.latency.get_analysis()}
+
+
+async def run_paper(tickers, strategy, params=None, start=None, end=None, store=None, speed=None, cash=10000.0,
+                    commission=0.001, sizer=None, sizer_params=None, timeframe=bt.TimeFrame.Minutes,
+                    compression=1):
+    # Returns dict(sessions=[per ticker], tick_to_decision=summary,
+    # decision_to_order=summary, wall_s, bars)
+    store = store or ColumnStore()
+    params = dict(params or {})
+    if 'journal' in strategy.params._getkeys():
+        params.setdefault('journal', 'off')
+    server = ReplayServer(store, tickers, start, end, speed)
+    host, port = await server.serve()
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    gateway = OrderGateway(loop, writer)
+    queues = {ticker: queue.Queue() for ticker in tickers}
+    results = {}
+
+    def session(ticker):
+        results[ticker] = _session(ticker, queues[ticker], strategy, params, cash, commission, sizer,
+                                   sizer_params, gateway, timeframe, compression)
+
+    threads = [threading.Thread(target=session, args=(ticker,), daemon=True) for ticker in tickers]
+    for thread in threads:
+        thread.start()
+
+    started = time.perf_counter()
+    bars = 0
+    clock = time.perf_counter_ns
+    while True:
+        line = await reader.readline()
+        if not line:
+            break
+        received = clock()
+        message = json.loads(line)
+        if 'ack' in message:
+            gateway.ack(message['ack'], received)
+        elif 'eof' in message:
+            for q in queues.values():
+                q.put(EOF)
+            # Keep reading acks until every session has drained its queue
+            waiting = asyncio.gather(*[asyncio.to_thread(thread.join) for thread in threads])
+            while not waiting.done() or gateway.pending:
+                try:
+                    line = await asyncio.wait_for(reader.readline(), 0.1)
+                except asyncio.TimeoutError:
+                    continue
+                if not line:
+                    break
+                gateway.ack(json.loads(line)['ack'], clock())
+            await waiting
+            break
+        else:
+            o, h, l, c, v = message['v']
+            queues[message['s']].put((EPOCH_NUM + message['t'] / NS_PER_DAY, o, h, l, c, v, received))
+            bars += 1
+    wall = time.perf_counter() - started
+    writer.close()
+    await writer.wait_closed()
+    await server.close()
+
+    sessions = [results[ticker] for ticker in tickers if ticker in results]
+    tick = Histogram()
+    order = Histogram()
+    for s in sessions:
+        tick.merge(s.pop('tick_to_decision'))
+        order.merge(s.pop('decision_to_order'))
+    return {'sessions': sessions, 'tick_to_decision': tick.summary(), 'decision_to_order': order.summary(),
+            'wall_s': wall, 'bars': bars}
+
+
+def paper(tickers, strategy, **kwargs):
+    # Blocking wrapper: paper(['AAA', 'BBB'], KDJStrategy, speed=600)
+    return asyncio.run(run_paper(tickers, strategy, **kwargs))
@@ -0,0 +1,138 @@
+# Data providers and bulk loading
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from datastore import COLUMNS, ColumnStore
+
+store = ColumnStore('data/store')
+
+
+def normalize(_data):
+    # Flatten MultiIndex columns if present
+    if isinstance(_data.columns, pd.MultiIndex):
+        _data.columns = [col[0] for col in _data.columns]
+
+    # Rename columns for Backtrader
+    _data = _data.rename(columns={
+        'Open': 'open',
+        'High': 'high',
+        'Low': 'low',
+        'Close': 'close',
+        'Volume': 'volume',
+        'vol': 'volume',
+        'Adj Close': 'adj_close'
+    })
+
+    # Ensure datetime index and clean data
+    _data.index = pd.to_datetime(_data.index)
+    _data = _data.sort_index()
+    # Select first so NaNs in extra provider columns do not drop bars
+    _data = _data.reindex(columns=list(COLUMNS))
+    _data = _data.dropna()
+    return _data
+
+
+class YFinanceProvider:
+    # Yahoo's OHLCV is split-adjusted even with auto_adjust=False, which only
+    # leaves out the dividends; clean.py applies just those on read
+    split_adjusted = True
+
+    def __call__(self, ticker, start, end):
+        import yfinance as yf
+        print(f"Downloading data for {ticker} {start}..{end} from yfinance")
+        # Ticker.history rather than yf.download, which keeps its results in
+        # module globals and mixes up tickers fetched from several threads.
+        _data = normalize(yf.Ticker(ticker).history(start=start, end=end, auto_adjust=False, actions=False))
+        # history() dates are midnight in the exchange's zone
+        if _data.index.tz is not None:
+            _data.index = _data.index.tz_localize(None)
+        return _data
+
+    def actions(self, ticker):
+        # Dividends and splits for clean.py
+        import yfinance as yf
+        return yf.Ticker(ticker).actions
+
+
+class TushareProvider:
+    # api is the tushare pro endpoint: 'daily' for A-shares, 'hk_daily' for HK
+    def __init__(self, token=None, api='daily'):
+        self.token = token or os.environ.get('TUSHARE_TOKEN')
+        self.api = api
+
+    def __call__(self, ticker, start, end):
+        import tushare as ts
+        pro = ts.pro_api(self.token)
+        # tushare end_date is inclusive, ours is exclusive
+        last = pd.Timestamp(end) - pd.Timedelta(days=1)
+        _data = getattr(pro, self.api)(ts_code=ticker, start_date=start.replace('-', ''),
+                                       end_date=last.strftime('%Y%m%d'))
+        _data = _data.set_index(pd.to_datetime(_data['trade_date'], format='%Y%m%d'))
+        return normalize(_data)
+
+
+class LocalProvider:
+    # Offline stand-in: reads {directory}/{ticker}.parquet or {ticker}.csv.
+    # split_adjusted=True for files whose prices already have the splits in
+    # (yfinance exports)
+    def __init__(self, directory, split_adjusted=False):
+        self.directory = directory
+        self.split_adjusted = split_adjusted
+
+    def __call__(self, ticker, start, end):
+        file = os.path.join(self.directory, f'{ticker}.parquet')
+        if os.path.exists(file):
+            _data = pd.read_parquet(file)
+        else:
+            _data = pd.read_csv(os.path.join(self.directory, f'{ticker}.csv'),
+                                index_col=0, parse_dates=True)
+        _data = normalize(_data)
+        return _data[(_data.index >= pd.Timestamp(start)) & (_data.index < pd.Timestamp(end))]
+
+    def actions(self, ticker):
+        # Optional {ticker}.actions.csv with Dividends / Stock Splits columns
+        file = os.path.join(self.directory, f'{ticker}.actions.csv')
+        if not os.path.exists(file):
+            return None
+        return pd.read_csv(file, index_col=0, parse_dates=True)
+
+
+def default_provider():
+    # BACKTEST_DATA_DIR points CI / air-gapped boxes at a local directory
+    directory = os.environ.get('BACKTEST_DATA_DIR')
+    if directory:
+        return LocalProvider(directory)
+    return YFinanceProvider()
+
+
+def get_data(ticker='1810.HK', start='2024-01-01', end='2025-05-20', provider=None, store=store, clean=False):
+    # Bars live in one columnar store per ticker; only the missing head/tail
+    # of [start, end) is fetched, the rest is sliced from the mapped files.
+    # clean=True (or a dict of clean.OPTIONS) returns the cached cleaned and
+    # adjusted bars instead of the raw ones.
+    provider = provider or default_provider()
+    if store is None:
+        return provider(ticker, start, end)
+    if clean:
+        from clean import load
+        return load(ticker, start, end, store, provider, **(clean if isinstance(clean, dict) else {}))
+    return store.load(ticker, start, end, provider)
+
+
+def _load_one(args):
+    ticker, start, end, provider, store, clean = args
+    return ticker, get_data(ticker, start, end, provider=provider, store=store, clean=clean)
+
+
+def load_many(tickers, start, end, provider=None, store=store, workers=8, processes=False, clean=False):
+    # Fetch and normalize a universe concurrently. Threads suit network-bound
+    # providers; processes=True helps when parsing local files dominates.
+    provider = provider or default_provider()
+    pool = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    jobs = [(ticker, start, end, provider, store, clean) for ticker in tickers]
+    with pool(max_workers=workers) as executor:
+        results = dict(executor.map(_load_one, jobs))
+    # Keep the caller's ticker order
+    return {ticker: results[ticker] for ticker in tickers}
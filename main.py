@@ -1,81 +1,238 @@
-import backtrader as bt
-import yfinance as yf
-import pandas as pd
+# Backtest entry point
+#
+#   python main.py                      the DEFAULT run below
+#   python main.py run.toml             a run spec (.toml, .yaml/.yml or .json)
+#   python main.py run.toml --strategy KDJStrategy --param kdj_period=14
+#
+# A run spec lists tickers, start/end, cash, commission, strategy, sizer and
+# analyzers; names resolve through registry.py, so only the modules the run
+# actually uses are imported. Date ranges already in the column store are fed
+# straight from it (no pandas, no provider import); anything else goes
+# through loader.get_data. run(spec) is the library entry point. With
+# `results` set to a resultstore directory, a run whose code, params, settings
+# and bars match one already stored is answered from it instead of re-run.
+#
+#   tickers = ['9988.HK']
+#   start = '2023-01-01'
+#   end = '2025-07-05'
+#   strategy = {name = 'KDJStrategy', params = {kdj_period = 14}}
+#   sizer = 'AllInSizer'
+#   analyzers = ['sharpe', 'drawdown', 'returns']
+import argparse
+import json
 import os
-from strategy import *
-from sizer import *
 
+from registry import names, resolve
 
-def get_data(ticker='1810.HK', start='2024-01-01', end='2025-05-20'):
-    # Check if CSV exists
-    file = f"data/{ticker}_{start.replace('-', '')}_{end.replace('-', '')}.pkl"
-    if os.path.exists(file):
-        print(f"Loading data from {file}")
-        _data = pd.read_pickle(file)
+DEFAULT = {
+    'tickers': ['9988.HK'],
+    'start': '2023-01-01',
+    'end': '2025-07-05',
+    'cash': 10000.0,
+    'commission': 0.001,
+    'strategy': {'name': 'MACDStrategy', 'params': {}},
+    'sizer': 'AllInSizer',
+    'analyzers': ['sharpe', 'drawdown', 'returns', 'equity'],
+    'store': 'data/store',
+    'data_dir': None,  # LocalProvider directory instead of yfinance
+    'clean': False,  # Feed clean.py's adjusted bars (True or a dict of clean.OPTIONS)
+    'journal': True,  # Print the trade journal after the run
+    'report': 'reports/main.html',  # Headless chart + numbers; None to skip
+    'results': None,  # ResultStore directory to serve repeated runs from; None to always run
+}
+
+# Analyzers a stored run needs, under the names sweep.analyze reads
+COLLECT = ('sharpe', 'drawdown', 'returns', 'tradelist', 'equity')
+
+
+def load_spec(path):
+    if path.endswith('.toml'):
+        try:
+            import tomllib
+        except ModuleNotFoundError:  # Python < 3.11
+            import tomli as tomllib
+        with open(path, 'rb') as f:
+            spec = tomllib.load(f)
+    elif path.endswith(('.yaml', '.yml')):
+        import yaml
+        with open(path) as f:
+            spec = yaml.safe_load(f)
     else:
-        print(f"Downloading data for {ticker} from yfinance")
-        _data = yf.download(ticker, start=start, end=end)
-        _data.to_pickle(file)
-        print(f"Saved data to {file}")
-
-    # Flatten MultiIndex columns if present
-    if isinstance(_data.columns, pd.MultiIndex):
-        _data.columns = [col[0] for col in _data.columns]
-
-    # Rename columns for Backtrader
-    _data = _data.rename(columns={
-        'Open': 'open',
-        'High': 'high',
-        'Low': 'low',
-        'Close': 'close',
-        'Volume': 'volume',
-        'Adj Close': 'adj_close'
-    })
-
-    # Ensure datetime index and clean data
-    _data.index = pd.to_datetime(_data.index)
-    _data = _data.dropna()
-    _data = _data[['open', 'high', 'low', 'close', 'volume']]
-    return _data
-
-
-
-
-
-# Set up Cerebro
-cerebro = bt.Cerebro()
-# Load or download data
-stocks = ['9988.HK']
-for stock in stocks:
-    data = get_data(ticker=stock, start='2023-01-01', end='2025-07-05')
-    data_feed = bt.feeds.PandasData(dataname=data, name=stock)
-    cerebro.adddata(data_feed)
-#cerebro.addstrategy(MomentumStrategy)
-#cerebro.addstrategy(SMACrossover)
-cerebro.addstrategy(MACDStrategy)
-#cerebro.addstrategy(KDJStrategy)
-#cerebro.addstrategy(ElliottWaveStrategy)
-cerebro.broker.setcash(10000.0)
-cerebro.broker.setcommission(commission=0.001)
-cerebro.addsizer(AllInSizer)
-#cerebro.addsizer(bt.sizers.PercentSizer, percents=90)
-#cerebro.addsizer(FixedValueSizer, value=1000)
-cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
-cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
-cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
-
-# Run backtest
-print('Starting Portfolio Value: %.2f' % cerebro.broker.getvalue())
-results = cerebro.run()
-print('Final Portfolio Value: %.2f' % cerebro.broker.getvalue())
-
-# Print analyzer results
-sharpe = results[0].analyzers.sharpe.get_analysis()
-drawdown = results[0].analyzers.drawdown.get_analysis()
-returns = results[0].analyzers.returns.get_analysis()
-#print(f"Sharpe Ratio: {sharpe.get('sharperatio', 'N/A'):.2f}")
-#print(f"Max Drawdown: {drawdown.get('max', {}).get('drawdown', 'N/A'):.2f}%")
-print(f"Total Return: {returns.get('rtot', 'N/A') * 100:.2f}%")
-
-# Plot
-cerebro.plot()
+        with open(path) as f:
+            spec = json.load(f)
+    return {**DEFAULT, **(spec or {})}
+
+
+def _named(entry):
+    # 'Name' or {name = 'Name', params = {...}}
+    if entry is None or isinstance(entry, str):
+        return entry, {}
+    return entry['name'], dict(entry.get('params') or {})
+
+
+def feeds(spec):
+    from datastore import ColumnStore
+    import backtrader as bt
+    store = ColumnStore(spec['store'])
+    out = []
+    for ticker in spec['tickers']:
+        if not spec.get('clean') and store.covers(ticker, spec['start'], spec['end']):
+            from streaming import StoreFeed
+            out.append(StoreFeed(store=store, ticker=ticker, start=spec['start'], end=spec['end'], name=ticker))
+            continue
+        from loader import LocalProvider, get_data
+        provider = LocalProvider(spec['data_dir']) if spec.get('data_dir') else None
+        data = get_data(ticker, spec['start'], spec['end'], provider=provider, store=store, clean=spec.get('clean'))
+        out.append(bt.feeds.PandasData(dataname=data, name=ticker))
+    return out
+
+
+def frames(spec):
+    # {ticker: DataFrame} of the run's bars, for hashing; stored ranges are
+    # read-only views of the column store files
+    from datastore import ColumnStore
+    from loader import LocalProvider, get_data
+    store = ColumnStore(spec['store'])
+    out = {}
+    for ticker in spec['tickers']:
+        if not spec.get('clean') and store.covers(ticker, spec['start'], spec['end']):
+            out[ticker] = store.read(ticker, spec['start'], spec['end'])
+            continue
+        provider = LocalProvider(spec['data_dir']) if spec.get('data_dir') else None
+        out[ticker] = get_data(ticker, spec['start'], spec['end'], provider=provider, store=store,
+                               clean=spec.get('clean'))
+    return out
+
+
+def build(spec, data=None):
+    # data: frames(spec) when the caller already has them
+    import backtrader as bt
+    cerebro = bt.Cerebro()
+    if data is None:
+        for feed in feeds(spec):
+            cerebro.adddata(feed)
+    else:
+        for ticker, df in data.items():
+            cerebro.adddata(bt.feeds.PandasData(dataname=df, name=ticker))
+    name, params = _named(spec['strategy'])
+    cerebro.addstrategy(resolve('strategy', name), **params)
+    cerebro.broker.setcash(spec['cash'])
+    cerebro.broker.setcommission(commission=spec['commission'])
+    name, params = _named(spec.get('sizer'))
+    if name is not None:
+        cerebro.addsizer(resolve('sizer', name), **params)
+    for entry in spec.get('analyzers') or []:
+        name, params = _named(entry)
+        cerebro.addanalyzer(resolve('analyzer', name), _name=name, **params)
+    return cerebro
+
+
+def run(spec):
+    # spec: dict (missing keys come from DEFAULT) or a spec file path.
+    # Returns (cerebro, strategies), or (None, [row]) when spec['results']
+    # already holds this run; row has the params and the stored metrics.
+    spec = load_spec(spec) if isinstance(spec, str) else {**DEFAULT, **spec}
+    if not spec.get('results'):
+        cerebro = build(spec)
+        return cerebro, cerebro.run()
+
+    from resultstore import ResultStore, data_fingerprint, module_fingerprint
+    from sweep import analyze
+    data = frames(spec)
+    name, params = _named(spec['strategy'])
+    strategy = resolve('strategy', name)
+    sizer, sizer_params = _named(spec.get('sizer'))
+    sizer = resolve('sizer', sizer) if sizer is not None else None
+    settings = dict(cash=spec['cash'], commission=spec['commission'], sizer=sizer, sizer_params=sizer_params)
+    data_fp = data_fingerprint(data)
+    store = ResultStore(spec['results'])
+    try:
+        key = store.key(strategy, params, data_fp, **settings,
+                        extra={'analyzers': spec.get('analyzers') or [], 'runner': module_fingerprint('main')})
+        cached = store.get(key)
+        if cached is not None:
+            return None, [cached]
+        spec = {**spec, 'analyzers': list(spec.get('analyzers') or []) +
+                [n for n in COLLECT if n not in [_named(a)[0] for a in spec.get('analyzers') or []]]}
+        cerebro = build(spec, data)
+        strategies = cerebro.run()
+        strat = strategies[0]
+        store.put(key, strategy, params, {**params, **analyze(strat)}, data_fp=data_fp,
+                  analysis={n: strat.analyzers.getbyname(n).get_analysis() for n in ('sharpe', 'drawdown', 'returns')},
+                  trades=strat.analyzers.tradelist.get_analysis(), equity=strat.analyzers.equity.get_analysis(),
+                  **settings)
+    finally:
+        store.close()
+    return cerebro, strategies
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a backtest from a run spec')
+    parser.add_argument('spec', nargs='?', help='.toml, .yaml or .json run spec')
+    parser.add_argument('--tickers', nargs='+')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--strategy')
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='strategy param, repeatable; values are parsed as JSON when possible')
+    parser.add_argument('--sizer')
+    parser.add_argument('--report', help='report path (.png or .html); "none" to skip')
+    parser.add_argument('--quiet', action='store_true', help='do not print the trade journal')
+    parser.add_argument('--results', help='result store directory; a run already in it is not repeated')
+    parser.add_argument('--list', action='store_true', help='list registered names and exit')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for kind in ('strategy', 'sizer', 'analyzer', 'indicator'):
+            print(f'{kind}: {", ".join(names(kind))}')
+        return None
+
+    spec = load_spec(args.spec) if args.spec else dict(DEFAULT)
+    for key in ('tickers', 'start', 'end', 'sizer', 'results'):
+        if getattr(args, key) is not None:
+            spec[key] = getattr(args, key)
+    if args.strategy is not None:
+        spec['strategy'] = {'name': args.strategy, 'params': {}}
+    if args.param:
+        name, params = _named(spec['strategy'])
+        params.update({k: _value(v) for k, v in (p.split('=', 1) for p in args.param)})
+        spec['strategy'] = {'name': name, 'params': params}
+    if args.report is not None:
+        spec['report'] = None if args.report.lower() == 'none' else args.report
+    if args.quiet:
+        spec['journal'] = False
+
+    print('Starting Portfolio Value: %.2f' % spec['cash'])
+    cerebro, results = run(spec)
+    if cerebro is None:
+        # Served from the result store: only the stored numbers exist, no
+        # journal or report
+        row = results[0]
+        print('Final Portfolio Value: %.2f (stored in %s)' % (row['final_value'], spec['results']))
+        if row.get('rtot') is not None:
+            print(f"Total Return: {row['rtot'] * 100:.2f}%")
+        return results
+    print('Final Portfolio Value: %.2f' % cerebro.broker.getvalue())
+    strat = results[0]
+
+    if spec['journal'] and getattr(strat, 'journal', None) is not None:
+        for line in strat.journal.lines():
+            print(line)
+    if 'returns' in strat.analyzers.getnames():
+        returns = strat.analyzers.returns.get_analysis()
+        print(f"Total Return: {returns.get('rtot', 'N/A') * 100:.2f}%")
+    if spec.get('report'):
+        from report import report
+        print('Report:', report(strat, os.path.normpath(spec['report'])))
+    return results
+
+
+if __name__ == '__main__':
+    main()
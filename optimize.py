@@ -0,0 +1,200 @@
+# Adaptive parameter search with early abort
+#
+# Candidates are sampled from a search space instead of enumerated, and run
+# in a worker pool. Every run reports its portfolio value through the
+# strategy's progress callback; workers compare it against checkpoints
+# published by the parent, and a run is stopped as soon as its value or
+# drawdown is clearly worse than the current top-k finished runs at the same
+# point of the history.
+#
+#   method='random'   n_trials candidates over the full history
+#   method='halving'  successive halving: every round runs the survivors on a
+#                     longer prefix of the history and keeps the best 1/eta
+#
+# Pruning compares equity, so it suits objectives that follow it
+# (final_value, rtot, rnorm, sharpe); pruned rows keep their partial metrics
+# and are flagged with pruned=True.
+import math
+import os
+from multiprocessing import Array, Pool, Value
+
+import numpy as np
+import pandas as pd
+
+from sweep import SharedOHLCV, _init_worker, _worker, analyze, build_cerebro
+
+CHECKPOINTS = 20
+
+# Objectives ranked lowest first unless optimize() is given a direction
+LOWER_IS_BETTER = ('max_drawdown',)
+
+
+def sample(space, rng):
+    # space maps a param to a list of choices or a (low, high) range; int
+    # bounds draw integers, float bounds draw uniformly
+    params = {}
+    for name, spec in space.items():
+        if isinstance(spec, tuple):
+            low, high = spec
+            if isinstance(low, int) and isinstance(high, int):
+                params[name] = int(rng.integers(low, high + 1))
+            else:
+                params[name] = float(rng.uniform(low, high))
+        else:
+            params[name] = spec[int(rng.integers(len(spec)))]
+    return params
+
+
+def grid_size(space, steps=10):
+    # Size of the exhaustive grid, counting ranges as `steps` values
+    return math.prod(len(spec) if not isinstance(spec, tuple) else steps for spec in space.values())
+
+
+def _init_optimizer(handles, config, thresholds, drawdown_limit):
+    _init_worker(handles, config)
+    _worker['thresholds'] = thresholds
+    _worker['drawdown_limit'] = drawdown_limit
+
+
+class _Monitor:
+    # progress callback: tracks peak/drawdown and the value at each
+    # checkpoint, and asks for a stop when the run falls behind
+    def __init__(self, bars, cash, slack):
+        self.bars = bars
+        self.peak = cash
+        self.drawdown = 0.0
+        self.slack = slack
+        self.values = [math.nan] * CHECKPOINTS
+        self.pruned = False
+
+    def __call__(self, bar, value):
+        if value > self.peak:
+            self.peak = value
+        self.drawdown = max(self.drawdown, (1 - value / self.peak) * 100)
+        checkpoint = min(bar * CHECKPOINTS // self.bars, CHECKPOINTS - 1)
+        self.values[checkpoint] = value
+        threshold = _worker['thresholds'][checkpoint]
+        behind = threshold > -math.inf and value < threshold * (1 - self.slack)
+        if behind or self.drawdown > _worker['drawdown_limit'].value:
+            self.pruned = True
+        return self.pruned
+
+
+def _run_trial(job):
+    trial, rung, rows, params = job
+    config = _worker['config']
+    data = {name: df.iloc[:rows] for name, df in _worker['data'].items()}
+    monitor = _Monitor(rows, config['cash'], config['slack'])
+    run_params = {**params, 'progress': monitor, 'progress_every': config['progress_every']}
+    cerebro = build_cerebro(data, config['strategy'], run_params, config['cash'], config['commission'],
+                            config['sizer'], config['sizer_params'])
+    strat = cerebro.run()[0]
+    row = {'trial': trial, 'rung': rung, 'bars': rows, 'pruned': monitor.pruned, **params, **analyze(strat)}
+    return row, monitor.values, monitor.drawdown
+
+
+class _Leaderboard:
+    # Finished (unpruned) runs of the current rung; publishes the k-th best
+    # value at every checkpoint and the drawdown limit derived from the top k
+    def __init__(self, k, objective, sign, slack, thresholds, drawdown_limit, max_drawdown):
+        self.k = k
+        self.slack = slack
+        self.objective = objective
+        self.sign = sign
+        self.thresholds = thresholds
+        self.drawdown_limit = drawdown_limit
+        self.max_drawdown = max_drawdown
+        self.reset()
+
+    def reset(self):
+        self.runs = []
+        for i in range(CHECKPOINTS):
+            self.thresholds[i] = -math.inf
+        self.drawdown_limit.value = self.max_drawdown
+
+    def add(self, row, values, drawdown):
+        score = row.get(self.objective)
+        if row['pruned'] or score is None or not np.isfinite(score):
+            return
+        self.runs.append((self.sign * score, values, drawdown))
+        if len(self.runs) < self.k:
+            return
+        top = sorted(self.runs, key=lambda run: run[0], reverse=True)[:self.k]
+        for i in range(CHECKPOINTS):
+            values = [run[1][i] for run in top if not math.isnan(run[1][i])]
+            self.thresholds[i] = min(values) if len(values) == self.k else -math.inf
+        # Same slack, in drawdown percentage points
+        self.drawdown_limit.value = min(self.max_drawdown, max(run[2] for run in top) + self.slack * 100)
+
+
+def optimize(strategy, space, data, method='random', n_trials=200, eta=3, min_bars=None, objective='final_value',
+             direction=None, top_k=5, slack=0.1, max_drawdown=math.inf, cash=10000.0, commission=0.001, sizer=None,
+             sizer_params=None, processes=None, seed=None, progress_every=50):
+    # Returns a DataFrame with one row per run (rung, bars, pruned, params,
+    # metrics), best first among the last rung. direction is 'max' or 'min';
+    # None means 'min' for LOWER_IS_BETTER objectives and 'max' otherwise.
+    # min_bars is the history length of the first halving round. slack is
+    # how far below the k-th best value a run may fall before it is stopped;
+    # max_drawdown (in percent) stops any run whose drawdown passes it.
+    if direction is None:
+        direction = 'min' if objective in LOWER_IS_BETTER else 'max'
+    if direction not in ('max', 'min'):
+        raise ValueError("direction must be 'max' or 'min'")
+    sign = 1 if direction == 'max' else -1
+    if isinstance(data, pd.DataFrame):
+        data = {'data': data}
+    rows = min(len(df) for df in data.values())
+    rng = np.random.default_rng(seed)
+    candidates = [sample(space, rng) for _ in range(n_trials)]
+    if method == 'random':
+        rungs = [rows]
+    elif method == 'halving':
+        count = max(1, int(math.log(n_trials, eta)))
+        # The first rung still needs enough bars for the longest indicator
+        first = min_bars or max(rows // eta ** count, min(rows, 250))
+        rungs = []
+        for i in range(count):
+            bars = min(rows, first * eta ** i)
+            if bars == rows:
+                break
+            if not rungs or bars > rungs[-1]:
+                rungs.append(bars)
+        # The last rung is always the full history, run once
+        rungs.append(rows)
+    else:
+        raise ValueError("method must be 'random' or 'halving'")
+
+    handles = {name: SharedOHLCV.create(df) for name, df in data.items()}
+    config = dict(strategy=strategy, cash=cash, commission=commission, sizer=sizer, sizer_params=sizer_params,
+                  slack=slack, progress_every=progress_every)
+    thresholds = Array('d', CHECKPOINTS, lock=False)
+    drawdown_limit = Value('d', max_drawdown, lock=False)
+    board = _Leaderboard(top_k, objective, sign, slack, thresholds, drawdown_limit, max_drawdown)
+    results = []
+    try:
+        with Pool(processes or os.cpu_count(), initializer=_init_optimizer,
+                  initargs=(handles, config, thresholds, drawdown_limit)) as pool:
+            alive = list(enumerate(candidates))
+            for rung, bars in enumerate(rungs):
+                board.reset()
+                finished = []
+                jobs = [(trial, rung, bars, params) for trial, params in alive]
+                for row, values, drawdown in pool.imap_unordered(_run_trial, jobs):
+                    board.add(row, values, drawdown)
+                    finished.append(row)
+                results.extend(finished)
+                ranked = sorted((row for row in finished if not row['pruned'] and row[objective] is not None),
+                                key=lambda row: sign * row[objective], reverse=True)
+                keep = max(1, len(alive) // eta)
+                alive = [(row['trial'], candidates[row['trial']]) for row in ranked[:keep]]
+                if not alive:
+                    break
+    finally:
+        for handle in handles.values():
+            handle.unlink()
+    df = pd.DataFrame(results)
+    if df.empty:
+        return df
+    df['score'] = df[objective].where(~df['pruned'])
+    return df.sort_values(['rung', 'score'], ascending=[False, direction == 'min'],
+                          na_position='last').reset_index(drop=True)
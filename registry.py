@@ -0,0 +1,66 @@
+# Strategies, sizers, analyzers and indicators by name
+#
+# Entries are 'module:attribute' strings and are only imported by resolve(),
+# so a run that names one strategy does not import the modules behind the
+# others. A name that is not registered may itself be a 'module:attribute'
+# reference, e.g. 'mystrategies:Breakout'.
+import importlib
+
+REGISTRY = {
+    'strategy': {
+        'SMACrossover': 'strategy:SMACrossover',
+        'MomentumStrategy': 'strategy:MomentumStrategy',
+        'ElliottWaveStrategy': 'strategy:ElliottWaveStrategy',
+        'KDJStrategy': 'strategy:KDJStrategy',
+        'KDJStrategyOld': 'strategy:KDJStrategyOld',
+        'MACDStrategy': 'strategy:MACDStrategy',
+        'SMACrossoverSpec': 'spec:SMACrossoverSpec',
+        'MACDSpec': 'spec:MACDSpec',
+        'KDJSpec': 'spec:KDJSpec',
+    },
+    'sizer': {
+        'AllInSizer': 'sizer:AllInSizer',
+        'FixedValueSizer': 'sizer:FixedValueSizer',
+        'PortfolioSizer': 'sizer:PortfolioSizer',
+        'FixedSize': 'backtrader.sizers:FixedSize',
+        'PercentSizer': 'backtrader.sizers:PercentSizer',
+        'AllInSizerInt': 'backtrader.sizers:AllInSizerInt',
+    },
+    'analyzer': {
+        'sharpe': 'backtrader.analyzers:SharpeRatio',
+        'drawdown': 'backtrader.analyzers:DrawDown',
+        'returns': 'backtrader.analyzers:Returns',
+        'trades': 'backtrader.analyzers:TradeAnalyzer',
+        'sqn': 'backtrader.analyzers:SQN',
+        'tradelist': 'analyzers:TradeList',
+        'equity': 'analyzers:EquityCurve',
+    },
+    'indicator': {
+        'DirectionalChangeInd': 'indicator:DirectionalChangeInd',
+        'CustomZigZag': 'indicator:CustomZigZag',
+        'KDJ': 'indicator:KDJ',
+        'SMA': 'backtrader.indicators:SMA',
+        'EMA': 'backtrader.indicators:EMA',
+        'RSI': 'backtrader.indicators:RSI',
+        'MACD': 'backtrader.indicators:MACD',
+    },
+}
+
+
+def register(kind, name, target):
+    # target is a 'module:attribute' string or the object itself
+    REGISTRY[kind][name] = target
+
+
+def names(kind):
+    return sorted(REGISTRY[kind])
+
+
+def resolve(kind, name):
+    target = REGISTRY[kind].get(name, name)
+    if not isinstance(target, str):
+        return target
+    if ':' not in target:
+        raise KeyError(f'unknown {kind} {name!r}, expected one of {names(kind)} or module:attribute')
+    module, attr = target.split(':', 1)
+    return getattr(importlib.import_module(module), attr)
@@ -0,0 +1,202 @@
+# Headless report rendering (replaces cerebro.plot())
+#
+# snapshot() pulls plain arrays out of a finished strategy: price, indicator
+# lines, executed orders and the equity curve. render() draws one to a PNG
+# (or an HTML page with the chart and the run's numbers) on matplotlib's Agg
+# canvas, so no display is needed. Lines are decimated to at most two points
+# per horizontal pixel, keeping each bucket's minimum and maximum so spikes
+# survive; marker lines such as DirectionalChangeInd's tops/bottoms are drawn
+# as plain points, thinned the same way. render_many() spreads snapshots over
+# a process pool.
+import base64
+import html
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from datastore import EPOCH_NUM
+
+DPI = 100
+
+
+def decimate(x, y, buckets):
+    # Min/max per bucket, in index order. Returns (x, y) with at most
+    # 2 * buckets points; all-NaN buckets are dropped.
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= 2 * buckets:
+        keep = ~np.isnan(y)
+        return x[keep], y[keep]
+    size = -(-n // buckets)
+    pad = size * buckets - n
+    lows = np.concatenate([y, np.full(pad, np.nan)]).reshape(buckets, size)
+    valid = ~np.isnan(lows).all(axis=1)
+    lo = np.argmin(np.where(np.isnan(lows), np.inf, lows), axis=1)
+    hi = np.argmax(np.where(np.isnan(lows), -np.inf, lows), axis=1)
+    first = np.minimum(lo, hi)[valid]
+    second = np.maximum(lo, hi)[valid]
+    base = np.arange(buckets)[valid] * size
+    index = np.stack([base + first, base + second], axis=1).ravel()
+    index = index[np.concatenate([[True], np.diff(index) != 0])]
+    return x[index], y[index]
+
+
+def _marker_line(indicator, alias):
+    info = getattr(indicator.plotlines, alias, None)
+    return info is not None and bool(info._get('marker', None)) and not info._get('ls', None)
+
+
+def snapshot(strat, title=None):
+    # Plain, picklable arrays of one strategy's run
+    data = strat.data
+    n = len(data.close.array)
+    dates = np.asarray(data.datetime.array[-n:]) - EPOCH_NUM
+
+    def tail(line):
+        values = np.asarray(line.array, dtype=np.float64)[-n:]
+        return np.concatenate([np.full(n - len(values), np.nan), values])
+
+    overlays, panels, markers = {}, {}, {}
+    for indicator in strat.getindicators():
+        if not indicator.plotinfo.plot:
+            continue
+        label = indicator.plotlabel() if hasattr(indicator, 'plotlabel') else type(indicator).__name__
+        lines = {}
+        for i, alias in enumerate(indicator.lines.getlinealiases()):
+            if _marker_line(indicator, alias):
+                values = tail(indicator.lines[i])
+                keep = ~np.isnan(values) & (values != 0)
+                markers[f'{label} {alias}'] = (dates[keep], values[keep])
+            else:
+                lines[alias] = tail(indicator.lines[i])
+        if lines:
+            target = panels.setdefault(label, {}) if indicator.plotinfo.subplot else overlays
+            target.update({f'{label} {k}' if not indicator.plotinfo.subplot else k: v for k, v in lines.items()})
+
+    orders = [o for o in strat.broker.orders if o.status == o.Completed and o.data is data]
+    buys = [(o.executed.dt - EPOCH_NUM, o.executed.price) for o in orders if o.isbuy()]
+    sells = [(o.executed.dt - EPOCH_NUM, o.executed.price) for o in orders if o.issell()]
+
+    equity = None
+    if 'equity' in strat.analyzers.getnames():
+        curve = strat.analyzers.equity.get_analysis()
+        equity = (np.asarray(curve['datetime']) - EPOCH_NUM, np.asarray(curve['value']))
+
+    stats = {}
+    for name in strat.analyzers.getnames():
+        if name in ('equity', 'tradelist'):
+            continue
+        analysis = strat.analyzers.getbyname(name).get_analysis()
+        stats.update({f'{name}.{k}': v for k, v in _flatten(analysis).items()})
+    return {
+        'title': title or f'{type(strat).__name__} {data._name}',
+        'dates': dates,
+        'close': tail(data.close),
+        'overlays': overlays,
+        'panels': panels,
+        'markers': markers,
+        'buys': np.asarray(buys).reshape(-1, 2),
+        'sells': np.asarray(sells).reshape(-1, 2),
+        'equity': equity,
+        'stats': stats,
+    }
+
+
+def _flatten(analysis, prefix=''):
+    out = {}
+    for key, value in analysis.items():
+        if isinstance(value, dict):
+            out.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float, np.floating)) or value is None:
+            out[f'{prefix}{key}'] = value
+    return out
+
+
+def figure(snap, width=1600, height=None):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    import matplotlib.dates as mdates
+
+    rows = 1 + len(snap['panels']) + (snap['equity'] is not None)
+    height = height or 300 + 160 * (rows - 1)
+    fig = Figure(figsize=(width / DPI, height / DPI), dpi=DPI)
+    FigureCanvasAgg(fig)
+    ratios = [3] + [1] * (rows - 1)
+    axes = fig.subplots(rows, 1, sharex=True, squeeze=False, gridspec_kw={'height_ratios': ratios})[:, 0]
+    buckets = max(width // 2, 1)
+
+    ax = axes[0]
+    ax.plot(*decimate(snap['dates'], snap['close'], buckets), lw=0.8, color='black', label='close')
+    for name, values in snap['overlays'].items():
+        ax.plot(*decimate(snap['dates'], values, buckets), lw=0.8, label=name)
+    for name, (x, y) in snap['markers'].items():
+        ax.plot(*decimate(x, y, buckets), ls='', marker='.', ms=3, label=name)
+    if len(snap['buys']):
+        ax.plot(snap['buys'][:, 0], snap['buys'][:, 1], ls='', marker='^', ms=5, color='green', label='buy')
+    if len(snap['sells']):
+        ax.plot(snap['sells'][:, 0], snap['sells'][:, 1], ls='', marker='v', ms=5, color='red', label='sell')
+    ax.set_title(snap['title'])
+    ax.legend(loc='upper left', fontsize='x-small', ncol=4)
+
+    i = 1
+    for label, lines in snap['panels'].items():
+        for name, values in lines.items():
+            axes[i].plot(*decimate(snap['dates'], values, buckets), lw=0.8, label=name)
+        axes[i].set_ylabel(label, fontsize='x-small')
+        axes[i].legend(loc='upper left', fontsize='x-small', ncol=4)
+        i += 1
+    if snap['equity'] is not None:
+        axes[i].plot(*decimate(*snap['equity'], buckets), lw=0.8, color='tab:blue')
+        axes[i].set_ylabel('value', fontsize='x-small')
+
+    axes[-1].xaxis.set_major_locator(mdates.AutoDateLocator())
+    axes[-1].xaxis.set_major_formatter(mdates.ConciseDateFormatter(axes[-1].xaxis.get_major_locator()))
+    for ax in axes:
+        ax.grid(alpha=0.3)
+    fig.tight_layout()
+    return fig
+
+
+def render(snap, path, width=1600, height=None):
+    # Writes a .png, or an .html page embedding the chart with the analyzer
+    # numbers and executed orders
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    fig = figure(snap, width, height)
+    if not path.endswith('.html'):
+        fig.savefig(path, dpi=DPI)
+        return path
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=DPI)
+    image = base64.b64encode(buf.getvalue()).decode()
+    stats = pd.Series(snap['stats'], dtype=object).to_frame('value')
+    orders = pd.DataFrame(
+        [('buy', *row) for row in snap['buys'].tolist()] + [('sell', *row) for row in snap['sells'].tolist()],
+        columns=['side', 'date', 'price']).sort_values('date')
+    orders['date'] = pd.to_datetime(orders['date'], unit='D')
+    with open(path, 'w') as f:
+        f.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{html.escape(snap["title"])}</title>'
+                '<style>body{font-family:sans-serif}table{border-collapse:collapse;font-size:12px}'
+                'td,th{border:1px solid #ccc;padding:2px 6px}</style></head><body>\n'
+                f'<h2>{html.escape(snap["title"])}</h2>\n<img src="data:image/png;base64,{image}">\n'
+                f'<h3>Analyzers</h3>\n{stats.to_html()}\n'
+                f'<h3>Orders</h3>\n{orders.to_html(index=False)}\n</body></html>\n')
+    return path
+
+
+def _render(args):
+    snap, path, width, height = args
+    return render(snap, path, width, height)
+
+
+def render_many(jobs, width=1600, height=None, processes=None):
+    # jobs: [(snapshot, path)]; returns the written paths in order
+    with ProcessPoolExecutor(processes or os.cpu_count()) as pool:
+        return list(pool.map(_render, [(snap, path, width, height) for snap, path in jobs]))
+
+
+def report(strat, path, title=None, width=1600, height=None):
+    return render(snapshot(strat, title), path, width, height)
@@ -0,0 +1,218 @@
+# Persistent backtest result cache
+import functools
+import hashlib
+import inspect
+import json
+import marshal
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from datastore import COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    strategy TEXT,
+    params TEXT,
+    sizer TEXT,
+    sizer_params TEXT,
+    cash REAL,
+    commission REAL,
+    data TEXT,
+    created REAL,
+    sharpe REAL,
+    max_drawdown REAL,
+    rtot REAL,
+    rnorm REAL,
+    final_value REAL,
+    analysis TEXT
+);
+CREATE TABLE IF NOT EXISTS trades (
+    key TEXT,
+    data TEXT,
+    dtopen TEXT,
+    dtclose TEXT,
+    barlen INTEGER,
+    size REAL,
+    price REAL,
+    pnl REAL,
+    pnlcomm REAL,
+    commission REAL
+);
+CREATE INDEX IF NOT EXISTS trades_key ON trades (key);
+"""
+
+METRICS = ('sharpe', 'max_drawdown', 'rtot', 'rnorm', 'final_value')
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _project_modules(module, found):
+    # module and every module of this project it reaches through its globals
+    # (imported modules, or functions/classes imported from them)
+    if module is None or module.__name__ in found:
+        return found
+    file = getattr(module, '__file__', None)
+    if not file or os.path.dirname(os.path.abspath(file)) != ROOT:
+        return found
+    found[module.__name__] = module
+    for value in list(vars(module).values()):
+        used = value if inspect.ismodule(value) else inspect.getmodule(value)
+        if used is not None and used is not module:
+            _project_modules(used, found)
+    return found
+
+
+@functools.lru_cache(maxsize=None)
+def module_fingerprint(name):
+    import importlib
+    modules = _project_modules(importlib.import_module(name), {})
+    sources = [f'{mod}\n{inspect.getsource(modules[mod])}' for mod in sorted(modules)]
+    return hashlib.sha256('\n'.join(sources).encode()).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def code_fingerprint(cls):
+    # Full source of every project module the class's MRO lives in, and of the
+    # project modules those use (helpers, kernels, indicators); backtrader's
+    # own classes are skipped
+    modules = sorted({base.__module__ for base in inspect.getmro(cls)
+                      if (base.__module__ or '').split('.')[0] not in ('backtrader', 'builtins')})
+    parts = [cls.__qualname__] + [module_fingerprint(module) for module in modules]
+    return hashlib.sha256('\n'.join(parts).encode()).hexdigest()
+
+
+def _with_defaults(cls, params):
+    # {} and the explicit defaults are the same run
+    if cls is None:
+        return params or {}
+    return {**dict(cls.params._getitems()), **(params or {})}
+
+
+def data_fingerprint(data):
+    # data is a {name: DataFrame} dict; hashes names, dates and OHLCV values
+    digest = hashlib.sha256()
+    for name in sorted(data):
+        df = data[name]
+        digest.update(name.encode())
+        digest.update(pd.DatetimeIndex(df.index).as_unit('ns').asi8.tobytes())
+        digest.update(np.ascontiguousarray(df[list(COLUMNS)].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+
+def _callable(fn):
+    # Callable params (progress hooks, sizer signals) by what they run:
+    # name, bytecode, defaults and closure values, plus the source of the
+    # project module they live in. str() would carry the memory address and
+    # never match the next run.
+    if inspect.isclass(fn):
+        return {'class': f'{fn.__module__}.{fn.__qualname__}', 'code': code_fingerprint(fn)}
+    if isinstance(fn, functools.partial):
+        return {'partial': _callable(fn.func), 'args': fn.args, 'keywords': fn.keywords}
+    out = {'callable': f'{getattr(fn, "__module__", None)}.{getattr(fn, "__qualname__", type(fn).__qualname__)}'}
+    code = getattr(fn, '__code__', None)
+    if code is not None:
+        out['code'] = hashlib.sha256(marshal.dumps(code)).hexdigest()
+        out['defaults'] = getattr(fn, '__defaults__', None)
+        out['closure'] = [cell.cell_contents for cell in getattr(fn, '__closure__', None) or ()]
+    module = inspect.getmodule(fn)
+    file = getattr(module, '__file__', None)
+    if file and os.path.dirname(os.path.abspath(file)) == ROOT:
+        out['module'] = module_fingerprint(module.__name__)
+    return out
+
+
+def _default(value):
+    if callable(value):
+        return _callable(value)
+    return str(value)
+
+
+def _json(value):
+    return json.dumps(value, sort_keys=True, default=_default)
+
+
+class ResultStore:
+    # SQLite table of analyzer results and trades keyed by a hash of strategy
+    # code, params, sizer, broker settings and data content. Equity curves are
+    # kept next to it as one .npz file per key.
+
+    def __init__(self, root='data/results'):
+        self.root = root
+        os.makedirs(os.path.join(root, 'equity'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'results.sqlite'))
+        self.db.executescript(SCHEMA)
+
+    def key(self, strategy, params, data_fp, cash, commission, sizer=None, sizer_params=None, extra=None):
+        # extra: anything else the stored numbers depend on (JSON-able), such
+        # as a runner's own analyzer settings
+        parts = {
+            'strategy': f'{strategy.__module__}.{strategy.__qualname__}',
+            'code': code_fingerprint(strategy),
+            'params': _with_defaults(strategy, params),
+            'sizer': code_fingerprint(sizer) if sizer is not None else None,
+            'sizer_params': _with_defaults(sizer, sizer_params),
+            # Analyzers and the cerebro assembly the stored numbers come from
+            'analyzers': module_fingerprint('sweep'),
+            'cash': cash,
+            'commission': commission,
+            'data': data_fp,
+        }
+        if extra is not None:
+            parts['extra'] = extra
+        return hashlib.sha256(_json(parts).encode()).hexdigest()
+
+    def __contains__(self, key):
+        return self.db.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is not None
+
+    def get(self, key):
+        cursor = self.db.execute(f'SELECT params, {", ".join(METRICS)} FROM results WHERE key = ?', (key,))
+        found = cursor.fetchone()
+        if found is None:
+            return None
+        return {**json.loads(found[0]), **dict(zip(METRICS, found[1:]))}
+
+    def put(self, key, strategy, params, row, cash, commission, data_fp, sizer=None, sizer_params=None,
+            analysis=None, trades=None, equity=None):
+        with self.db:
+            self.db.execute('DELETE FROM trades WHERE key = ?', (key,))
+            self.db.execute(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, strategy.__name__, _json(params), sizer.__name__ if sizer else None, _json(sizer_params or {}),
+                 cash, commission, data_fp, time.time(), *[row.get(m) for m in METRICS], _json(analysis or {})))
+            if trades:
+                self.db.executemany(
+                    'INSERT INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    [(key, t['data'], t['dtopen'], t['dtclose'], t['barlen'], t['size'], t['price'], t['pnl'],
+                      t['pnlcomm'], t['commission']) for t in trades])
+        if equity is not None:
+            np.savez(os.path.join(self.root, 'equity', f'{key}.npz'),
+                     datetime=np.asarray(equity['datetime']), value=np.asarray(equity['value']))
+
+    def trades(self, key):
+        return pd.read_sql_query('SELECT * FROM trades WHERE key = ?', self.db, params=(key,))
+
+    def equity(self, key):
+        import backtrader as bt
+        file = os.path.join(self.root, 'equity', f'{key}.npz')
+        if not os.path.exists(file):
+            return None
+        with np.load(file) as npz:
+            index = pd.DatetimeIndex([bt.num2date(dt) for dt in npz['datetime'].tolist()])
+            return pd.Series(npz['value'], index=index, name='value')
+
+    def results(self, **filters):
+        # results(strategy='MACDStrategy') -> DataFrame of stored runs
+        where = ' AND '.join(f'{column} = ?' for column in filters)
+        sql = 'SELECT * FROM results' + (f' WHERE {where}' if where else '')
+        df = pd.read_sql_query(sql, self.db, params=tuple(filters.values()))
+        params = pd.DataFrame([json.loads(p) for p in df['params']], index=df.index)
+        return pd.concat([df.drop(columns=['params']), params], axis=1)
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,184 @@
+# Monte Carlo / bootstrap robustness of a finished backtest
+#
+# Takes the closed trades and the daily equity curve of one run (the
+# TradeList and EquityCurve analyzers, or ResultStore.trades/equity) and
+# resamples them:
+#   shuffle    trade P&L in random order (or drawn with replacement), which
+#              moves drawdown and Sharpe but not the final value
+#   bootstrap  block bootstrap of daily returns, blocks keep short-range
+#              autocorrelation
+#   costs      the commission rate drawn around the one the run used, plus
+#              random slippage on both sides of every trade
+# from_strategy(strat) collects the inputs, the run's commission rate
+# included, from a finished strategy.
+# Every method builds a (paths, bars) array per chunk and reduces it to
+# final value, max drawdown and Sharpe; chunks are spread over a process pool.
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+METHODS = ('shuffle', 'bootstrap', 'costs')
+METRICS = ('final_value', 'max_drawdown', 'sharpe')
+
+_inputs = {}
+
+
+def _init_worker(inputs):
+    _inputs.update(inputs)
+
+
+def path_metrics(equity, periods=252):
+    # equity is (paths, bars) including the starting value in column 0
+    peak = np.maximum.accumulate(equity, axis=1)
+    returns = equity[:, 1:] / equity[:, :-1] - 1
+    std = returns.std(axis=1, ddof=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, returns.mean(axis=1) / std * np.sqrt(periods), np.nan)
+    return {
+        'final_value': equity[:, -1],
+        'max_drawdown': (1 - equity / peak).max(axis=1) * 100,
+        'sharpe': sharpe,
+    }
+
+
+def shuffle_paths(rng, n, pnl, cash, replace=False):
+    if replace:
+        draws = rng.choice(pnl, size=(n, len(pnl)))
+    else:
+        draws = rng.permuted(np.broadcast_to(pnl, (n, len(pnl))), axis=1)
+    return cash + np.concatenate([np.zeros((n, 1)), np.cumsum(draws, axis=1)], axis=1)
+
+
+def bootstrap_paths(rng, n, returns, cash, block=20):
+    bars = len(returns)
+    block = min(block, bars)
+    starts = rng.integers(0, bars - block + 1, size=(n, math.ceil(bars / block)))
+    index = (starts[:, :, None] + np.arange(block)).reshape(n, -1)[:, :bars]
+    growth = np.cumprod(1 + returns[index], axis=1)
+    return cash * np.concatenate([np.ones((n, 1)), growth], axis=1)
+
+
+def cost_paths(rng, n, equity, trades, commission, commission_range=(0.5, 2.0), slippage=0.0005):
+    # trades: dict of arrays bar (index of the closing bar in equity), comm
+    # (commission actually paid), turnover (|size| * price per side).
+    # Extra cost over the run = commission at a rate drawn per path
+    # uniformly in commission * commission_range, minus what was paid, plus
+    # half-normal slippage (fraction of price, per side) per trade.
+    low, high = commission_range
+    rate = rng.uniform(commission * low, commission * high, size=(n, 1))
+    extra = trades['comm'] * (rate / commission - 1)
+    extra += np.abs(rng.normal(0, slippage, size=(n, len(trades['bar'])))) * 2 * trades['turnover']
+    # Charge each trade's extra cost from its closing bar onwards
+    closed = np.searchsorted(trades['bar'], np.arange(len(equity)), side='right')
+    charged = np.concatenate([np.zeros((n, 1)), np.cumsum(extra, axis=1)], axis=1)[:, closed]
+    return equity - charged
+
+
+def _run_chunk(method, n, seed, options):
+    rng = np.random.default_rng(seed)
+    cash = _inputs['cash']
+    if method == 'shuffle':
+        paths = shuffle_paths(rng, n, _inputs['pnl'], cash, options.get('replace', False))
+        periods = _inputs['trades_per_year']
+    elif method == 'bootstrap':
+        paths = bootstrap_paths(rng, n, _inputs['returns'], cash, options.get('block', 20))
+        periods = options.get('periods', 252)
+    else:
+        paths = cost_paths(rng, n, _inputs['equity'], _inputs['trades'], **options.get('costs', {}))
+        paths = np.concatenate([np.full((n, 1), float(cash)), paths], axis=1)
+        periods = options.get('periods', 252)
+    return path_metrics(paths, periods)
+
+
+def prepare(trades, equity, cash):
+    # trades: TradeList records (list of dicts or DataFrame); equity: Series
+    # indexed by date, or the EquityCurve analysis dict
+    if isinstance(equity, dict):
+        import backtrader as bt
+        equity = pd.Series(equity['value'], index=[bt.num2date(dt) for dt in equity['datetime']])
+    values = np.asarray(equity, dtype=np.float64)
+    index = pd.DatetimeIndex(equity.index)
+    trades = pd.DataFrame(trades)
+    if len(trades):
+        trades = trades.assign(bar=index.searchsorted(pd.to_datetime(trades['dtclose']))).sort_values('bar')
+        turnover = (trades['size'].abs() * trades['price']).fillna(0).to_numpy(dtype=np.float64)
+        pnl = trades['pnlcomm'].to_numpy(dtype=np.float64)
+        years = max((index[-1] - index[0]).days / 365.25, 1 / 365.25)
+    else:
+        turnover = pnl = np.zeros(0)
+        years = 1
+    return {
+        'cash': float(cash),
+        'pnl': pnl,
+        'trades_per_year': len(pnl) / years,
+        'equity': values,
+        'returns': values / np.concatenate([[cash], values[:-1]]) - 1,
+        'trades': {
+            'bar': trades['bar'].to_numpy() if len(trades) else np.zeros(0, dtype=np.int64),
+            'comm': trades['commission'].to_numpy(dtype=np.float64) if len(trades) else np.zeros(0),
+            'turnover': turnover,
+        },
+    }
+
+
+def from_strategy(strat):
+    # simulate() inputs from a finished strategy run with the TradeList and
+    # EquityCurve analyzers (named 'tradelist' and 'equity')
+    return {
+        'trades': strat.analyzers.tradelist.get_analysis(),
+        'equity': strat.analyzers.equity.get_analysis(),
+        'cash': strat.broker.startingcash,
+        'commission': strat.broker.getcommissioninfo(strat.data).p.commission,
+    }
+
+
+def simulate(trades, equity, cash, methods=METHODS, n=10000, chunk=500, processes=None, seed=None,
+             commission=None, **options):
+    # Returns {method: {metric: array of n values}}. commission is the run's
+    # rate, which 'costs' varies around. options: replace (shuffle), block and
+    # periods (bootstrap), costs=dict(commission_range, slippage). The same
+    # seed gives the same paths whatever the process count; seed=None draws
+    # fresh entropy.
+    inputs = prepare(trades, equity, cash)
+    if 'costs' in methods:
+        if commission is None:
+            raise ValueError("'costs' needs the run's commission rate (see from_strategy)")
+        options = {**options, 'costs': {'commission': commission, **options.get('costs', {})}}
+    sizes = [min(chunk, n - i) for i in range(0, n, chunk)]
+    # One stream per method (fixed by its place in METHODS, so adding or
+    # dropping a method leaves the others' paths alone), one per chunk
+    streams = np.random.SeedSequence(seed).spawn(len(METHODS))
+    jobs = []
+    for method in methods:
+        if method not in METHODS:
+            raise ValueError(f'method must be one of {METHODS}')
+        if method == 'shuffle' and len(inputs['pnl']) < 2:
+            continue
+        seeds = streams[METHODS.index(method)].spawn(len(sizes))
+        jobs.extend((method, size, s) for size, s in zip(sizes, seeds))
+    out = {}
+    with ProcessPoolExecutor(processes or os.cpu_count(), initializer=_init_worker, initargs=(inputs,)) as pool:
+        futures = [(method, pool.submit(_run_chunk, method, size, s, options)) for method, size, s in jobs]
+        for method, future in futures:
+            result = future.result()
+            parts = out.setdefault(method, {m: [] for m in METRICS})
+            for m in METRICS:
+                parts[m].append(result[m])
+    return {method: {m: np.concatenate(parts[m]) for m in METRICS} for method, parts in out.items()}
+
+
+def intervals(results, levels=(0.05, 0.5, 0.95)):
+    # One row per (method, metric): mean and the requested quantiles
+    rows = []
+    for method, metrics in results.items():
+        for m, values in metrics.items():
+            rows.append({'method': method, 'metric': m, 'mean': np.nanmean(values),
+                         **{f'p{q * 100:g}': np.nanquantile(values, q) for q in levels}})
+    return pd.DataFrame(rows).set_index(['method', 'metric'])
+
+
+def robustness(trades, equity, cash, levels=(0.05, 0.5, 0.95), **kwargs):
+    return intervals(simulate(trades, equity, cash, **kwargs), levels)
@@ -0,0 +1,296 @@
+# Cross-sectional screener over a (dates x tickers) panel
+#
+# Screener evaluates the indicators behind the strategies for every ticker
+# at once, one NumPy column per ticker:
+#   SMA fast/slow cross   (SMACrossover)
+#   MACD line/signal cross (MACDStrategy)
+#   KDJ entry             (KDJStrategy: K > D, K < buy_threshold, close > SMA)
+#   RSI                   (Wilder, like bt.ind.RSI)
+#   last directional-change pivot (DirectionalChangeInd)
+# fit() runs a whole panel (clean.panel); window indicators are sliding
+# windows over the time axis, the recursive ones (EMAs, RSI, crossover
+# memory, pivots) one vectorized step per row. Only the state needed for
+# the next bar is kept, so update() appends a day's bars for the whole
+# universe in one more step. table() ranks the latest row and backtest()
+# hands the top names to universe.run_universe.
+#
+#   s = Screener.load(tickers, '2015-01-01', '2025-07-01')
+#   s.table().head(20)
+#   s.refresh()  # after the store has new bars
+#   s.backtest('macd_cross', '2023-01-01', '2025-07-01', top=20)
+import numpy as np
+
+from clean import panel
+
+# Signal column -> registry strategy it screens for
+STRATEGIES = {
+    'sma_cross': 'SMACrossover',
+    'macd_cross': 'MACDStrategy',
+    'kdj_entry': 'KDJStrategy',
+}
+
+
+def sma(x, period):
+    # Column-wise SMA along axis 0 (NaN until a full window)
+    out = np.full(x.shape, np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period, axis=0).mean(axis=-1)
+    return out
+
+
+def highest(x, period):
+    out = np.full(x.shape, np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period, axis=0).max(axis=-1)
+    return out
+
+
+def lowest(x, period):
+    out = np.full(x.shape, np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period, axis=0).min(axis=-1)
+    return out
+
+
+def kdj(high, low, close, period, period_d=3, period_j=3):
+    # Column-wise vector.kdj
+    hh = highest(high, period)
+    ll = lowest(low, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = 100 * (close - ll) / (hh - ll)
+    k = sma(rsv, period_d)
+    d = sma(k, period_j)
+    return k, d, 3 * k - 2 * d
+
+
+class _EMA:
+    # One step per row over every column; seeded with the mean of each
+    # column's first `period` valid values like vector.ema. alpha defaults to
+    # EMA's 2 / (period + 1); RSI's smoothing passes 1 / period.
+    def __init__(self, width, period, alpha=None):
+        self.period = period
+        self.alpha = 2.0 / (1.0 + period) if alpha is None else alpha
+        self.count = np.zeros(width, dtype=np.int64)
+        self.sum = np.zeros(width)
+        self.value = np.full(width, np.nan)
+
+    def step(self, x):
+        valid = ~np.isnan(x)
+        self.count += valid
+        warm = valid & (self.count <= self.period)
+        self.sum[warm] += x[warm]
+        value = self.value * (1.0 - self.alpha) + x * self.alpha
+        seed = valid & (self.count == self.period)
+        value[seed] = self.sum[seed] / self.period
+        # A missing value keeps the last one
+        self.value = np.where(valid, value, self.value)
+        return self.value
+
+
+class _Cross:
+    # vector.crossover one row at a time: remembers each column's last
+    # non-zero difference
+    def __init__(self, width):
+        self.nonzero = np.zeros(width)
+        self.valid = np.zeros(width, dtype=bool)
+
+    def step(self, a, b):
+        diff = a - b
+        cross = np.zeros(len(diff))
+        cross[self.valid & (self.nonzero < 0) & (diff > 0)] = 1.0
+        cross[self.valid & (self.nonzero > 0) & (diff < 0)] = -1.0
+        self.valid = ~np.isnan(diff)
+        moved = self.valid & (diff != 0)
+        self.nonzero[moved] = diff[moved]
+        return cross
+
+
+class _Pivots:
+    # DirectionalChangeInd's state machine across columns. pivot is +1 after
+    # a confirmed top, -1 after a bottom, 0 before the first one.
+    def __init__(self, width, sigma):
+        self.sigma = sigma
+        self.seen = np.zeros(width, dtype=np.int64)
+        self.up = np.ones(width, dtype=bool)
+        self.tmp_max = np.full(width, np.nan)
+        self.tmp_min = np.full(width, np.nan)
+        self.pivot = np.zeros(width, dtype=np.int8)
+        self.price = np.full(width, np.nan)
+        self.row = np.full(width, -1, dtype=np.int64)
+
+    def step(self, row, high, low, close):
+        valid = ~np.isnan(close)
+        self.seen += valid
+        first = valid & (self.seen == 1)
+        self.tmp_max[first] = high[first]
+        self.tmp_min[first] = low[first]
+        active = valid & (self.seen > 1)
+        rising = active & self.up
+        falling = active & ~self.up
+        with np.errstate(invalid='ignore'):
+            higher = rising & (high > self.tmp_max)
+            lower = falling & (low < self.tmp_min)
+            top = rising & ~higher & (close < self.tmp_max - self.tmp_max * self.sigma / 1000)
+            bottom = falling & ~lower & (close > self.tmp_min + self.tmp_min * self.sigma / 1000)
+        self.tmp_max[higher] = high[higher]
+        self.tmp_min[lower] = low[lower]
+        self.pivot[top] = 1
+        self.price[top] = self.tmp_max[top]
+        self.pivot[bottom] = -1
+        self.price[bottom] = self.tmp_min[bottom]
+        self.row[top | bottom] = row
+        self.up[top] = False
+        self.tmp_min[top] = low[top]
+        self.up[bottom] = True
+        self.tmp_max[bottom] = high[bottom]
+
+
+class Screener:
+    params = {
+        'fast': 10, 'slow': 30,  # SMACrossover
+        'macd1': 12, 'macd2': 26, 'signal': 9,  # MACDStrategy
+        'kdj_period': 9, 'sma_period': 20, 'buy_threshold': 50,  # KDJStrategy
+        'rsi_period': 14,
+        'sigma': 5,  # DirectionalChangeInd
+        'recent': 5,  # Bars a pivot counts towards the score
+    }
+
+    def __init__(self, tickers, **params):
+        self.tickers = list(tickers)
+        self.p = {**self.params, **params}
+        p, n = self.p, len(self.tickers)
+        # Bars of high/low/close the window indicators need for the last row
+        self.window = max(p['slow'], p['sma_period'], p['kdj_period'] + 4) + 1
+        self.fast = _EMA(n, p['macd1'])
+        self.slow = _EMA(n, p['macd2'])
+        self.signal = _EMA(n, p['signal'])
+        self.gain = _EMA(n, p['rsi_period'], 1.0 / p['rsi_period'])
+        self.loss = _EMA(n, p['rsi_period'], 1.0 / p['rsi_period'])
+        self.sma_cross = _Cross(n)
+        self.macd_cross = _Cross(n)
+        self.pivots = _Pivots(n, p['sigma'])
+        self.prev_close = np.full(n, np.nan)
+        self.tail = {c: np.full((0, n), np.nan) for c in ('high', 'low', 'close')}
+        self.rows = 0
+        self.date = None
+        self.last = {}
+        self.store = None
+        self.clean = {}
+
+    @classmethod
+    def load(cls, tickers, start=None, end=None, store=None, clean=None, **params):
+        # Cleaned, calendar-aligned panel from the store (see clean.panel)
+        screener = cls(tickers, **params)
+        screener.store = store
+        screener.clean = dict(clean or {})
+        return screener.fit(panel(tickers, start, end, store, **screener.clean))
+
+    def fit(self, data):
+        # data: {'index': int64 ns, 'high'/'low'/'close'...: (dates x tickers)}
+        p = self.p
+        high, low, close = (np.asarray(data[c], dtype=np.float64) for c in ('high', 'low', 'close'))
+        fast, slow = sma(close, p['fast']), sma(close, p['slow'])
+        for t in range(len(close)):
+            self._step(high[t], low[t], close[t], fast[t], slow[t])
+        self.date = data['index'][-1] if len(data['index']) else None
+        self._tail(high, low, close)
+        return self
+
+    def update(self, date, bar):
+        # bar: {'high', 'low', 'close': (tickers,) arrays}, NaN for a ticker
+        # without a bar that day (it carries its last close, like clean.panel)
+        high, low, close = (np.asarray(bar[c], dtype=np.float64) for c in ('high', 'low', 'close'))
+        gap = np.isnan(close) & ~np.isnan(self.prev_close)
+        if gap.any():
+            high, low, close = high.copy(), low.copy(), close.copy()
+            high[gap] = low[gap] = close[gap] = self.prev_close[gap]
+        self._tail(high[None], low[None], close[None])
+        fast = sma(self.tail['close'][-self.p['fast']:], self.p['fast'])[-1]
+        slow = sma(self.tail['close'][-self.p['slow']:], self.p['slow'])[-1]
+        self._step(high, low, close, fast, slow)
+        self.date = date
+        return self
+
+    def extend(self, data):
+        # Every row of a panel with dates after the last one seen
+        index = np.asarray(data['index'])
+        rows = np.arange(len(index)) if self.date is None else np.flatnonzero(index > self.date)
+        for t in rows:
+            self.update(index[t], {c: data[c][t] for c in ('high', 'low', 'close')})
+        return self
+
+    def refresh(self, end=None):
+        # Appends whatever the store holds after the last screened date
+        start = np.datetime64(int(self.date) + 1, 'ns') if self.date is not None else None
+        return self.extend(panel(self.tickers, start, end, self.store, **self.clean))
+
+    def _tail(self, high, low, close):
+        for name, rows in (('high', high), ('low', low), ('close', close)):
+            self.tail[name] = np.concatenate([self.tail[name], rows[-self.window:]])[-self.window:]
+
+    def _step(self, high, low, close, fast, slow):
+        p = self.p
+        with np.errstate(invalid='ignore'):
+            move = close - self.prev_close
+            gain = self.gain.step(np.where(move > 0, move, np.where(np.isnan(move), np.nan, 0.0)))
+            loss = self.loss.step(np.where(move < 0, -move, np.where(np.isnan(move), np.nan, 0.0)))
+        self.prev_close = np.where(np.isnan(close), self.prev_close, close)
+        line = self.fast.step(close) - self.slow.step(close)
+        signal = self.signal.step(line)
+        self.pivots.step(self.rows, high, low, close)
+        self.last = {
+            'close': close,
+            'sma_cross': self.sma_cross.step(fast, slow),
+            'macd': line,
+            'macd_signal': signal,
+            'macd_cross': self.macd_cross.step(line, signal),
+            'gain': gain,
+            'loss': loss,
+        }
+        self.rows += 1
+
+    def values(self):
+        # Latest row of every indicator as {name: (tickers,) array}
+        p = self.p
+        out = dict(self.last)
+        gain, loss = out.pop('gain'), out.pop('loss')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out['rsi'] = 100.0 - 100.0 / (1.0 + gain / loss)
+        k, d, j = kdj(self.tail['high'], self.tail['low'], self.tail['close'], p['kdj_period'])
+        out['k'], out['d'], out['j'] = k[-1], d[-1], j[-1]
+        trend = sma(self.tail['close'][-p['sma_period']:], p['sma_period'])[-1]
+        with np.errstate(invalid='ignore'):
+            out['kdj_entry'] = (out['k'] > out['d']) & (out['k'] < p['buy_threshold']) & (out['close'] > trend)
+        out['pivot'] = self.pivots.pivot.copy()
+        out['pivot_price'] = self.pivots.price.copy()
+        out['pivot_age'] = np.where(self.pivots.row >= 0, self.rows - 1 - self.pivots.row, -1)
+        out['score'] = ((out['sma_cross'] > 0).astype(np.int64) + (out['macd_cross'] > 0) + out['kdj_entry'] +
+                        ((out['pivot'] == -1) & (out['pivot_age'] < p['recent'])))
+        return out
+
+    def table(self, by=('score', 'rsi'), ascending=(False, True)):
+        # Ranked DataFrame of the latest row, one line per ticker
+        import pandas as pd
+        frame = pd.DataFrame(self.values(), index=pd.Index(self.tickers, name='ticker'))
+        frame = frame[~frame['close'].isna()]
+        return frame.sort_values(list(by), ascending=list(ascending), kind='stable')
+
+    def candidates(self, signal='score', top=None):
+        # Tickers whose signal fires on the latest row, best ranked first
+        frame = self.table()
+        frame = frame[frame[signal] > 0]
+        return frame.index[:top].tolist()
+
+    def backtest(self, signal, start, end, top=None, strategy=None, **kwargs):
+        # Detailed backtrader runs of the screened names; strategy defaults to
+        # the one the signal screens for
+        from registry import resolve
+        from universe import run_universe
+        tickers = self.candidates(signal, top)
+        if not tickers:
+            return None
+        if strategy is None:
+            if signal not in STRATEGIES:
+                raise ValueError(f'pass strategy= for signal {signal!r}; defaults exist for {sorted(STRATEGIES)}')
+            strategy = resolve('strategy', STRATEGIES[signal])
+        return run_universe(tickers, start, end, strategy, **kwargs)
@@ -1,4 +1,5 @@
 import backtrader as bt
+import numpy as np
 
 # Custom sizer to invest all available cash
 class AllInSizer(bt.Sizer):
@@ -24,4 +25,146 @@ class FixedValueSizer(bt.Sizer):
             price = data.close[0]
             size = int(self.params.value / price)
             return size if size > 0 else 0
-        return self.broker.getposition(data).size
\ No newline at end of file
+        return self.broker.getposition(data).size
+
+# Portfolio sizer: every buy the strategy places on the same bar, across its
+# feeds, is sized together from one allocation.
+#
+# Rolling volatility (stdev of log returns, annualised) and Wilder ATR are
+# computed for every feed as arrays when the first order arrives, so the
+# data must be preloaded. backtrader sizes each order as buy() is called, so
+# the sizer cannot wait for the rest of the bar's buys; `signals` must give
+# the strategy's entry rule as arrays instead. On the first buy of a bar the
+# candidates are the flat feeds whose signal is True that bar, and all of
+# them get a target in one NumPy step:
+#   'parity'  available cash split in proportion to 1 / volatility
+#   'vol'     equity * target / volatility / positions per feed
+#   'atr'     equity * risk / (atr_mult * ATR) shares per feed
+# The total is scaled down to fit `fraction` of the cash (each feed's
+# commission included) and each size is rounded down to the feed's board
+# lot. Later buys on the same bar read the cached sizes. Feeds still in
+# their volatility warm-up get 0.
+#
+#   cerebro.addsizer(PortfolioSizer, method='parity', lots={'0700.HK': 100, '1810.HK': 200},
+#                    signals=lambda c: vector.crossover(vector.sma(c['close'], 10), vector.sma(c['close'], 30)) > 0)
+#
+# HK shares trade in board lots set per stock (100 to 2000 and more), so
+# pass them in `lots`; `lot` covers any feed not listed.
+class PortfolioSizer(bt.Sizer):
+    params = (
+        ('method', 'parity'),  # 'parity', 'vol' or 'atr'
+        ('period', 20),  # Volatility and ATR lookback
+        ('periods', 252),  # Bars per year, to annualise volatility
+        ('target', 0.15),  # 'vol': annualised volatility of the whole book
+        ('positions', None),  # 'vol': feeds the target is spread over; None is every feed
+        ('risk', 0.01),  # 'atr': fraction of equity risked per position
+        ('atr_mult', 2.0),  # 'atr': stop distance in ATRs
+        ('fraction', 0.99),  # Of cash that may be committed per bar
+        ('lots', None),  # {feed name: board lot}
+        ('lot', 1),
+        ('signals', None),  # Required: callable(columns) -> bool entry array per feed
+    )
+
+    def _allocator(self):
+        # Each strategy has its own sizer instance, so the allocator is built
+        # from that strategy's feeds and kept on the sizer
+        allocator = getattr(self, '_allocation', None)
+        if allocator is None:
+            if self.p.signals is None:
+                raise ValueError('PortfolioSizer needs signals, the entry rule as callable(columns) -> bool array')
+            allocator = self._allocation = _Allocator(self.p, self.strategy.datas)
+        return allocator
+
+    def _getsizing(self, comminfo, cash, data, isbuy):
+        if not isbuy:
+            return self.broker.getposition(data).size
+        return self._allocator().size(self.broker, data)
+
+
+class _Allocator:
+    def __init__(self, p, datas):
+        self.p = p
+        self.datas = list(datas)
+        self.slot = {id(d): i for i, d in enumerate(self.datas)}
+        lots = p.lots or {}
+        self.lots = np.array([lots.get(d._name, p.lot) for d in self.datas], dtype=np.float64)
+        self.vol, self.atr, self.entries = [], [], []
+        for d in self.datas:
+            if d.buflen() != len(d.close.array):
+                raise ValueError('PortfolioSizer needs preloaded data (cerebro preload=True)')
+            columns = {c: np.asarray(getattr(d, c).array, dtype=np.float64)
+                       for c in ('open', 'high', 'low', 'close', 'volume')}
+            self.vol.append(_volatility(columns['close'], p.period) * np.sqrt(p.periods))
+            self.atr.append(_atr(columns['high'], columns['low'], columns['close'], p.period))
+            self.entries.append(np.asarray(p.signals(columns), dtype=bool))
+        self.bar = None
+        self.sizes = None
+
+    def size(self, broker, data):
+        dt = data.datetime[0]
+        if dt != self.bar:
+            self.bar = dt
+            self.sizes = self.allocate(broker, dt)
+        return int(self.sizes[self.slot[id(data)]])
+
+    def allocate(self, broker, dt):
+        p = self.p
+        n = len(self.datas)
+        # Feeds on this bar: a feed whose clock has not reached dt stays out
+        live = np.array([len(d) > 0 and d.datetime[0] == dt for d in self.datas])
+        i = np.array([len(d) - 1 for d in self.datas])
+        price = np.array([d.close[0] if len(d) else np.nan for d in self.datas])
+        vol = np.array([self.vol[k][i[k]] if live[k] else np.nan for k in range(n)])
+        atr = np.array([self.atr[k][i[k]] if live[k] else np.nan for k in range(n)])
+        flat = np.array([not broker.getposition(d).size for d in self.datas])
+        signal = np.array([live[k] and bool(self.entries[k][i[k]]) for k in range(n)])
+        candidates = live & flat & signal & (vol > 0)
+        cash = broker.getcash()
+        equity = broker.getvalue()
+
+        value = np.zeros(n)
+        if p.method == 'parity':
+            weight = np.where(candidates, 1.0 / np.where(candidates, vol, 1.0), 0.0)
+            if weight.sum() > 0:
+                value = cash * p.fraction * weight / weight.sum()
+        elif p.method == 'vol':
+            value = np.where(candidates, equity * p.target / np.where(candidates, vol, 1.0), 0.0)
+            value /= p.positions or n
+        elif p.method == 'atr':
+            ok = candidates & (atr > 0)
+            value = np.where(ok, equity * p.risk / (p.atr_mult * np.where(ok, atr, 1.0)) * price, 0.0)
+        else:
+            raise ValueError("method must be 'parity', 'vol' or 'atr'")
+
+        # Commission per unit of value, from each feed's own commission info
+        commission = np.array([broker.getcommissioninfo(d).getcommission(1, price[k]) / price[k] if candidates[k]
+                               else 0.0 for k, d in enumerate(self.datas)])
+        total = (value * (1 + commission)).sum()
+        if total > cash * p.fraction:
+            value *= cash * p.fraction / total
+        shares = np.floor(np.where(candidates, value / np.where(candidates, price, 1.0), 0.0) / self.lots) * self.lots
+        return shares
+
+
+def _volatility(close, period):
+    # Rolling sample stdev of log returns ending at each bar (per bar)
+    out = np.full(len(close), np.nan)
+    if len(close) > period:
+        returns = np.diff(np.log(close))
+        out[period:] = np.lib.stride_tricks.sliding_window_view(returns, period).std(axis=1, ddof=1)
+    return out
+
+
+def _atr(high, low, close, period):
+    # Wilder's average true range, seeded like bt.ind.ATR
+    out = np.full(len(close), np.nan)
+    if len(close) <= period:
+        return out
+    previous = close[:-1]
+    tr = np.maximum(high[1:], previous) - np.minimum(low[1:], previous)
+    prev = tr[:period].mean()
+    out[period] = prev
+    alpha = 1.0 / period
+    for k, v in enumerate(tr[period:].tolist(), period + 1):
+        out[k] = prev = prev + alpha * (v - prev)
+    return out
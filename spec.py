@@ -0,0 +1,267 @@
+# Engine-neutral strategy specs
+#
+# A Spec declares a long-only strategy once: its params, indicators (NumPy
+# kernels from vector.py over the OHLCV columns), entry/exit rules as
+# boolean arrays, close-based stop-loss/take-profit and sizing. It compiles
+# to
+#   to_backtrader(spec)   a BaseStrategy subclass for cerebro (custom sizers,
+#                         journal, analyzers); final validation
+#   to_backtesting(spec)  a backtesting.py Strategy; fast single-asset screening
+#   run_vector(spec, ..)  vector.simulate
+# All three fill market orders at the next open and check stops against the
+# close, and parity() runs the same spec through them and flags every trade
+# that differs.
+#
+# from_strategy(cls) wraps a strategy that already defines vector_signals, so
+# its rules are not written out a second time; the built-in SMA_CROSS, MACD
+# and KDJ specs are the strategies in strategy.py.
+import importlib.util
+
+import numpy as np
+import pandas as pd
+
+import strategy
+import vector
+from datastore import COLUMNS
+from strategy import BaseStrategy
+
+ENGINES = ('backtrader', 'backtesting', 'vector')
+
+
+class Spec:
+    # indicators: {name: fn(data, p) -> array}, evaluated in order; data is a
+    #   dict of float arrays (open, high, low, close, volume), p the params
+    # entry/exit: fn(ind, data, p) -> bool array, ind the indicator dict
+    # stop_loss/take_profit: a fraction or the name of a param holding one,
+    #   measured from the close of the entry signal bar
+    # size: None uses the engine's sizing (cerebro's sizer; all-in for the
+    #   others), an int or the name of a param holding a share count
+    # halt_on_reject: a buy rejected for cash stops all further trading, like
+    #   the hand-written strategies whose order guard is never released
+
+    def __init__(self, name, params, indicators, entry, exit=None, stop_loss=None, take_profit=None, size=None,
+                 halt_on_reject=False):
+        self.name = name
+        self.params = dict(params)
+        self.indicators = indicators
+        self.entry = entry
+        self.exit = exit
+        self.stop_loss = stop_loss
+        self.take_profit = take_profit
+        self.size = size
+        self.halt_on_reject = halt_on_reject
+
+    def resolve(self, params=None):
+        return {**self.params, **(params or {})}
+
+    def signals(self, data, p):
+        # dict(entries, exits, stop_loss, take_profit, size, halt_on_reject),
+        # the keywords of vector.simulate (and the shape of vector_signals)
+        def value(x):
+            return p[x] if isinstance(x, str) else x
+
+        ind = {}
+        for name, fn in self.indicators.items():
+            ind[name] = fn(data, p)
+        entries = np.asarray(self.entry(ind, data, p), dtype=bool)
+        exits = np.zeros(len(entries), dtype=bool) if self.exit is None else \
+            np.asarray(self.exit(ind, data, p), dtype=bool)
+        return dict(entries=entries, exits=exits, stop_loss=value(self.stop_loss),
+                    take_profit=value(self.take_profit), size=value(self.size), halt_on_reject=self.halt_on_reject)
+
+
+class StrategySpec(Spec):
+    # A Spec whose rules are strategy.vector_signals
+
+    def __init__(self, strategy, name=None):
+        own = set(BaseStrategy.params._getkeys())
+        params = {k: v for k, v in strategy.params._getitems() if k not in own}
+        super().__init__(name or f'{strategy.__name__}Spec', params, {}, None)
+        self.strategy = strategy
+
+    def signals(self, data, p):
+        frame = pd.DataFrame({c: np.asarray(data[c], dtype=np.float64) for c in COLUMNS})
+        rules = self.strategy.vector_signals(frame, **p)
+        n = len(frame)
+        out = dict(entries=np.zeros(n, dtype=bool), exits=np.zeros(n, dtype=bool), stop_loss=None,
+                   take_profit=None, size=None, halt_on_reject=False)
+        out.update(rules)
+        out['entries'] = np.asarray(out['entries'], dtype=bool)
+        out['exits'] = np.asarray(out['exits'], dtype=bool)
+        return out
+
+
+def from_strategy(strategy, name=None):
+    return StrategySpec(strategy, name)
+
+
+def _columns(df):
+    return {c: df[c].to_numpy(dtype=np.float64) for c in COLUMNS}
+
+
+def to_backtrader(spec):
+    # backtrader's metaclass would otherwise report its own module, which
+    # breaks pickling by name
+    return type(spec.name, (SpecStrategy,), {'params': tuple(spec.params.items()), 'spec': spec,
+                                             '__module__': __name__})
+
+
+class SpecStrategy(BaseStrategy):
+    # Runs a Spec's precomputed signal arrays through cerebro's broker. Needs
+    # preloaded data (the cerebro default) so the full columns exist in
+    # __init__.
+    spec = None
+
+    def __init__(self):
+        if self.data.buflen() != len(self.data.close.array):
+            raise ValueError('SpecStrategy needs preloaded data (cerebro preload=True)')
+        data = {c: np.asarray(getattr(self.data, c).array) for c in COLUMNS}
+        rules = self.spec.signals(data, self.spec.resolve(self.p._getkwargs()))
+        self.entries, self.exits = rules['entries'], rules['exits']
+        self.stop_loss, self.take_profit, self.size = rules['stop_loss'], rules['take_profit'], rules['size']
+        self.halt_on_reject = rules['halt_on_reject']
+        self.order = None
+        self.entry_price = None
+
+    def next(self):
+        if self.order:
+            return
+        i = len(self.data) - 1
+        close = self.data.close[0]
+        if not self.position:
+            if self.entries[i]:
+                self.record('buy_create', price=close)
+                self.order = self.buy(size=self.size)
+                self.entry_price = close
+        elif (self.exits[i] or
+              self.stop_loss is not None and close <= self.entry_price * (1 - self.stop_loss) or
+              self.take_profit is not None and close >= self.entry_price * (1 + self.take_profit)):
+            self.record('sell_create', price=close)
+            self.order = self.close()
+
+    def notify_order(self, order):
+        super().notify_order(order)
+        # halt_on_reject keeps the guard set after a rejection, as the
+        # hand-written MACD and KDJ strategies do
+        if order.status in [order.Canceled, order.Margin, order.Rejected] and not self.halt_on_reject:
+            self.order = None
+
+
+def to_backtesting(spec):
+    from backtesting import Strategy
+
+    def init(self):
+        data = {c: np.asarray(getattr(self.data, c.capitalize()), dtype=np.float64) for c in COLUMNS}
+        rules = spec.signals(data, spec.resolve({k: getattr(self, k) for k in spec.params}))
+        self.entries, self.exits = rules['entries'], rules['exits']
+        self.stop_loss, self.take_profit, self.size = rules['stop_loss'], rules['take_profit'], rules['size']
+        self.entry_price = None
+
+    def next(self):
+        i = len(self.data) - 1
+        close = self.data.Close[-1]
+        if not self.position:
+            if self.entries[i]:
+                # All-in mirrors sizer.AllInSizer: 99% of cash at the signal close
+                size = self.size if self.size is not None else int(self.equity * 0.99 / close)
+                if size > 0:
+                    self.buy(size=size)
+                    self.entry_price = close
+        elif (self.exits[i] or
+              self.stop_loss is not None and close <= self.entry_price * (1 - self.stop_loss) or
+              self.take_profit is not None and close >= self.entry_price * (1 + self.take_profit)):
+            self.position.close()
+
+    return type(spec.name, (Strategy,), {**spec.params, 'init': init, 'next': next})
+
+
+def run_vector(spec, data, cash=10000.0, commission=0.001, **params):
+    rules = spec.signals(_columns(data), spec.resolve(params))
+    return vector.simulate(data, cash=cash, commission=commission, **rules)
+
+
+# Trades of each engine as entry_bar, exit_bar, size, entry_price, exit_price
+def _trades_backtrader(spec, data, params, cash, commission, sizer, sizer_params):
+    from sizer import AllInSizer
+    from sweep import build_cerebro
+    if sizer is None and spec.signals(_columns(data), spec.resolve(params))['size'] is None:
+        sizer = AllInSizer
+    cerebro = build_cerebro({'data': data}, to_backtrader(spec), params, cash, commission, sizer, sizer_params,
+                            collect=True)
+    trades = pd.DataFrame(cerebro.run()[0].analyzers.tradelist.get_analysis(),
+                          columns=['dtopen', 'dtclose', 'size', 'price', 'pnl'])
+    index = pd.DatetimeIndex(data.index)
+    return pd.DataFrame({
+        'entry_bar': index.searchsorted(pd.to_datetime(trades['dtopen'])),
+        'exit_bar': index.searchsorted(pd.to_datetime(trades['dtclose'])),
+        'size': trades['size'],
+        'entry_price': trades['price'],
+        'exit_price': trades['price'] + trades['pnl'] / trades['size'],
+    })
+
+
+def _trades_backtesting(spec, data, params, cash, commission):
+    from backtesting import Backtest
+    frame = data[list(COLUMNS)].rename(columns=str.capitalize)
+    stats = Backtest(frame, to_backtesting(spec), cash=cash, commission=commission).run(**params)
+    trades = stats['_trades']
+    return pd.DataFrame({
+        'entry_bar': trades['EntryBar'], 'exit_bar': trades['ExitBar'], 'size': trades['Size'],
+        'entry_price': trades['EntryPrice'], 'exit_price': trades['ExitPrice'],
+    })
+
+
+def _trades_vector(spec, data, params, cash, commission):
+    trades = run_vector(spec, data, cash, commission, **params)['trades']
+    return trades[['entry_bar', 'exit_bar', 'size', 'entry_price', 'exit_price']]
+
+
+def run_trades(engine, spec, data, params=None, cash=10000.0, commission=0.001, sizer=None, sizer_params=None):
+    params = params or {}
+    if engine == 'backtrader':
+        trades = _trades_backtrader(spec, data, params, cash, commission, sizer, sizer_params)
+    elif engine == 'backtesting':
+        trades = _trades_backtesting(spec, data, params, cash, commission)
+    elif engine == 'vector':
+        trades = _trades_vector(spec, data, params, cash, commission)
+    else:
+        raise ValueError(f'engine must be one of {ENGINES}')
+    return trades.astype({'entry_bar': np.int64, 'exit_bar': np.int64, 'size': np.float64,
+                         'entry_price': np.float64, 'exit_price': np.float64}).reset_index(drop=True)
+
+
+def available_engines():
+    # backtesting.py is optional
+    if importlib.util.find_spec('backtesting') is None:
+        return tuple(e for e in ENGINES if e != 'backtesting')
+    return ENGINES
+
+
+def parity(spec, data, params=None, engines=None, cash=10000.0, commission=0.001, rtol=1e-9, **kwargs):
+    # Runs the spec through two engines and lines their closed trades up by
+    # entry bar. Returns dict(ok, diff, trades, engines): diff holds every
+    # trade that is missing from one engine or differs in exit bar, size or
+    # prices. engines defaults to backtrader against backtesting.py, or
+    # against vector when backtesting.py is not installed.
+    if engines is None:
+        engines = ('backtrader', 'backtesting' if 'backtesting' in available_engines() else 'vector')
+    a, b = engines
+    trades = {engine: run_trades(engine, spec, data, params, cash, commission, **kwargs) for engine in engines}
+    merged = trades[a].merge(trades[b], on='entry_bar', how='outer', suffixes=(f'_{a}', f'_{b}'), indicator=True)
+    differs = merged['_merge'] != 'both'
+    for column in ('exit_bar', 'size', 'entry_price', 'exit_price'):
+        x, y = merged[f'{column}_{a}'], merged[f'{column}_{b}']
+        differs |= ~np.isclose(x, y, rtol=rtol, atol=0) & merged['_merge'].eq('both')
+    diff = merged[differs].drop(columns='_merge')
+    diff.insert(0, 'date', pd.DatetimeIndex(data.index)[diff['entry_bar'].to_numpy()])
+    return {'ok': diff.empty, 'diff': diff, 'trades': trades, 'engines': tuple(engines)}
+
+
+SMA_CROSS = from_strategy(strategy.SMACrossover)
+MACD = from_strategy(strategy.MACDStrategy)
+KDJ = from_strategy(strategy.KDJStrategy)
+
+# Compiled at import so worker processes (sweep, walkforward) can unpickle them
+SMACrossoverSpec = to_backtrader(SMA_CROSS)
+MACDSpec = to_backtrader(MACD)
+KDJSpec = to_backtrader(KDJ)
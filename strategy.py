@@ -1,27 +1,105 @@
 # Strategy
 import backtrader as bt
 from indicator import *
+import vector
+from instrument import HotPath
+from journal import DEBUG, INFO, Journal
 
 
 class BaseStrategy(bt.Strategy):
-    def log(self, txt):
-        dt = self.datas[0].datetime.date(0)
-        print(f'{dt}: {txt}')
+    params = (
+        ('instrument', False),  # Record next() timing, orders and memory in self.hotpath
+        ('instrument_every', 1000),  # Sample RSS every N bars
+        ('profile', None),  # 'cprofile' or 'line' (needs line_profiler); implies instrument
+        ('journal', 'memory'),  # 'memory', 'print' or 'off' (sweeps)
+        ('log_level', INFO),  # Journal records below this level are dropped
+        ('journal_path', None),  # Flush the journal here (.csv / .parquet) at stop
+        ('progress', None),  # callable(bars, value); returning True stops the run (early abort)
+        ('progress_every', 50),  # Bars between progress calls
+    )
+
+    hotpath = None
+    journal = Journal('off')
+
+    def ind(self, indcls, *datas, **params):
+        # Indicator shared through indicator_cache with any other strategy
+        # that asks for the same class, sources and params in this run
+        indicator = indicator_cache.get(self, indcls, *datas, **params)
+        if indicator._owner is not self:
+            self.__dict__.setdefault('_shared_inds', []).append(indicator)
+        return indicator
+
+    def _periodset(self):
+        # Shared indicators are advanced by their owner but must still gate
+        # next(), so count them in while the per-data min periods are set
+        shared = self.__dict__.get('_shared_inds', [])
+        indicators = self._lineiterators[bt.LineIterator.IndType]
+        indicators.extend(shared)
+        try:
+            super()._periodset()
+        finally:
+            del indicators[len(indicators) - len(shared):]
+
+    def _start(self):
+        self.journal = Journal(self.p.journal, self.p.log_level)
+        super()._start()
+        if self.p.instrument or self.p.profile:
+            self.hotpath = HotPath(self, every=self.p.instrument_every, profile=self.p.profile)
+            self.hotpath.install()
+        if self.p.progress is not None:
+            self._install_progress()
+
+    def _install_progress(self):
+        # Wraps next() on this instance only, like HotPath, so runs without a
+        # progress callback pay nothing
+        next_ = self.next
+        progress, every = self.p.progress, self.p.progress_every
+        counter = [0]
+
+        def _next_with_progress():
+            next_()
+            counter[0] += 1
+            if counter[0] % every == 0 and progress(len(self), self.broker.getvalue()):
+                self.env.runstop()
+
+        self.next = _next_with_progress
+
+    def _stop(self):
+        if self.hotpath is not None:
+            self.hotpath.finish()
+        super()._stop()
+        if self.p.journal_path:
+            self.journal.flush(self.p.journal_path)
+        indicator_cache.release(self)
+
+    # Fast mode: strategies that can express their rules as arrays define
+    # vector_signals(data, **params) returning entries/exits (and optional
+    # stop_loss/take_profit/size) for vector.simulate
+    @classmethod
+    def vector_params(cls, params):
+        p = dict(cls.params._getpairs())
+        p.update(params)
+        return p
+
+    # The strategy's own datetime line also stays readable in stop() when
+    # running with exactbars=1, unlike the feed's ring buffer
+    def record(self, event, level=INFO, **fields):
+        self.journal.record(self.datetime[0], event, level, **fields)
+
+    def log(self, txt, level=INFO):
+        self.journal.record(self.datetime[0], 'message', level, text=txt)
 
     def notify_order(self, order):
         if order.status in [order.Completed]:
-            if order.isbuy():
-                self.log(
-                    f'BUY EXECUTED: {order.executed.size} shares at ${order.executed.price:.2f}, '
-                    f'Total Value: ${order.executed.value:.2f}, Commission: ${order.executed.comm:.2f}, '
-                    f'Cash: ${self.broker.cash:.2f}'
-                )
-            elif order.issell():
-                self.log(
-                    f'SELL EXECUTED: {order.executed.size} shares at ${order.executed.price:.2f}, '
-                    f'Total Value: ${abs(order.executed.size * order.executed.price):.2f}, Commission: ${order.executed.comm:.2f}, '
-                    f'Cash: ${self.broker.cash:.2f}'
-                )
+            if self.journal.enabled():
+                executed = order.executed
+                if order.isbuy():
+                    self.record('buy_executed', size=executed.size, price=executed.price,
+                                value=executed.value, comm=executed.comm, cash=self.broker.cash)
+                elif order.issell():
+                    self.record('sell_executed', size=executed.size, price=executed.price,
+                                value=abs(executed.size * executed.price), comm=executed.comm,
+                                cash=self.broker.cash)
             self.order = None
 
 
@@ -29,13 +107,9 @@ class SMACrossover(BaseStrategy):
     params = (('fast', 10), ('slow', 30),)
 
     def __init__(self):
-        self.fast_ma = bt.indicators.SimpleMovingAverage(
-            self.data.close, period=self.params.fast
-        )
-        self.slow_ma = bt.indicators.SimpleMovingAverage(
-            self.data.close, period=self.params.slow
-        )
-        self.crossover = bt.indicators.CrossOver(self.fast_ma, self.slow_ma)
+        self.fast_ma = self.ind(bt.indicators.SimpleMovingAverage, self.data.close, period=self.params.fast)
+        self.slow_ma = self.ind(bt.indicators.SimpleMovingAverage, self.data.close, period=self.params.slow)
+        self.crossover = self.ind(bt.indicators.CrossOver, self.fast_ma, self.slow_ma)
         self.order = None
 
     def next(self):
@@ -47,6 +121,13 @@ class SMACrossover(BaseStrategy):
         elif self.crossover < 0:
             self.order = self.sell()
 
+    @classmethod
+    def vector_signals(cls, data, **params):
+        p = cls.vector_params(params)
+        close = data['close'].to_numpy()
+        cross = vector.crossover(vector.sma(close, p['fast']), vector.sma(close, p['slow']))
+        return dict(entries=cross > 0, exits=cross < 0)
+
 
 class MomentumStrategy(BaseStrategy):
     params = (
@@ -56,9 +137,9 @@ class MomentumStrategy(BaseStrategy):
     )
 
     def __init__(self):
-        self.fast_sma = bt.indicators.SMA(self.data.close, period=self.params.fast_period)
-        self.slow_sma = bt.indicators.SMA(self.data.close, period=self.params.slow_period)
-        self.rsi = bt.indicators.RSI(self.data.close, period=14)
+        self.fast_sma = self.ind(bt.indicators.SMA, self.data.close, period=self.params.fast_period)
+        self.slow_sma = self.ind(bt.indicators.SMA, self.data.close, period=self.params.slow_period)
+        self.rsi = self.ind(bt.indicators.RSI, self.data.close, period=14)
         self.order = None
 
     def next(self):
@@ -105,7 +186,7 @@ class KDJStrategyOld(BaseStrategy):
         if self.position:
             # Check for stop-loss (10% below buy price)
             if self.data.close[0] <= self.buy_price * (1 - self.params.stop_loss):
-                print("s", self.data.close[0], self.buy_price)
+                self.record('stop_hit', DEBUG, price=self.data.close[0], target=self.buy_price)
                 self.sell(size=self.position.size)
                 self.order = None
                 self.buy_price = None
@@ -116,7 +197,8 @@ class KDJStrategyOld(BaseStrategy):
                     self.d_line[offset] > self.params.sell_threshold and
                     self.d_line[offset] > self.k_line[offset] and
                     self.d_line[offset - 1] <= self.k_line[offset - 1]):
-                print("s", self.k_line[offset], self.d_line[offset], self.k_line[offset - 1], self.d_line[offset - 1])
+                self.record('kd_sell', DEBUG, k=self.k_line[offset], d=self.d_line[offset],
+                            k_prev=self.k_line[offset - 1], d_prev=self.d_line[offset - 1])
                 self.sell(size=self.position.size)
                 self.order = None
                 self.buy_price = None
@@ -128,7 +210,8 @@ class KDJStrategyOld(BaseStrategy):
                     self.d_line[offset] < self.params.buy_threshold and
                     self.k_line[offset] > self.d_line[offset] and
                     self.k_line[offset - 1] <= self.d_line[offset - 1]):
-                print("b", self.k_line[offset], self.d_line[offset], self.k_line[offset - 1], self.d_line[offset - 1])
+                self.record('kd_buy', DEBUG, k=self.k_line[offset], d=self.d_line[offset],
+                            k_prev=self.k_line[offset - 1], d_prev=self.d_line[offset - 1])
                 self.buy()
                 self.buy_price = self.data.close[1]
 
@@ -147,10 +230,10 @@ class ElliottWaveStrategy(BaseStrategy):
 
     def __init__(self):
         # Initialize indicators
-        self.short_ma = bt.indicators.SMA(period=self.params.short_ma_period)
-        self.long_ma = bt.indicators.SMA(period=self.params.long_ma_period)
-        self.rsi = bt.indicators.RSI(period=self.params.rsi_period)
-        self.zigzag = CustomZigZag(self.data.close, percent=self.params.zigzag_percent)
+        self.short_ma = self.ind(bt.indicators.SMA, self.data.close, period=self.params.short_ma_period)
+        self.long_ma = self.ind(bt.indicators.SMA, self.data.close, period=self.params.long_ma_period)
+        self.rsi = self.ind(bt.indicators.RSI, self.data.close, period=self.params.rsi_period)
+        self.zigzag = self.ind(CustomZigZag, self.data.close, percent=self.params.zigzag_percent)
         self.order = None  # Track active orders
         self.buy_price = None  # Track buy price for stop-loss
         self.last_pivot = None  # Track last pivot type ('high' or 'low')
@@ -231,8 +314,8 @@ class KDJStrategy(BaseStrategy):
 
     def __init__(self):
         # Indicators
-        self.kdj = KDJ(self.data, period=self.p.kdj_period)
-        self.sma = bt.indicators.SMA(self.data.close, period=self.p.sma_period)
+        self.kdj = self.ind(KDJ, self.data, period=self.p.kdj_period)
+        self.sma = self.ind(bt.indicators.SMA, self.data.close, period=self.p.sma_period)
         # Track orders and entry price
         self.order = None
         self.entry_price = None
@@ -253,8 +336,7 @@ class KDJStrategy(BaseStrategy):
                 # Set stop-loss and take-profit
                 self.stop_price = self.entry_price * (1 - self.p.stop_loss)
                 self.profit_price = self.entry_price * (1 + self.p.take_profit)
-                self.log(
-                    f'BUY at {self.data.close[0]:.2f}, Stop: {self.stop_price:.2f}, Profit: {self.profit_price:.2f}')
+                self.record('buy_bracket', price=self.data.close[0], stop=self.stop_price, target=self.profit_price)
 
         else:
             # Sell condition: %K crosses below %D above 80 or price hits stop-loss/take-profit
@@ -265,11 +347,16 @@ class KDJStrategy(BaseStrategy):
                     self.data.close[0] >= self.profit_price:'''
             if self.data.close[0] <= self.stop_price or self.data.close[0] >= self.profit_price:
                 self.order = self.sell()
-                self.log(f'SELL at {self.data.close[0]:.2f}')
+                self.record('sell', price=self.data.close[0])
 
-    def log(self, txt):
-        dt = self.datas[0].datetime.date(0)
-        print(f'{dt}: {txt}')
+    @classmethod
+    def vector_signals(cls, data, **params):
+        p = cls.vector_params(params)
+        close = data['close'].to_numpy()
+        k, d, _ = vector.kdj(data['high'].to_numpy(), data['low'].to_numpy(), close, period=p['kdj_period'])
+        sma = vector.sma(close, p['sma_period'])
+        entries = (k > d) & (k < p['buy_threshold']) & (close > sma)
+        return dict(entries=entries, stop_loss=p['stop_loss'], take_profit=p['take_profit'], halt_on_reject=True)
 
 
 class MACDStrategy(BaseStrategy):
@@ -282,14 +369,15 @@ class MACDStrategy(BaseStrategy):
 
     def __init__(self):
         # Initialize MACD indicator
-        self.macd = bt.indicators.MACD(
+        self.macd = self.ind(
+            bt.indicators.MACD,
             self.data.close,
             period_me1=self.params.macd1,
             period_me2=self.params.macd2,
             period_signal=self.params.signal
         )
         # Cross of MACD line and Signal line
-        self.crossover = bt.indicators.CrossOver(self.macd.macd, self.macd.signal)
+        self.crossover = self.ind(bt.indicators.CrossOver, self.macd.macd, self.macd.signal)
         # Track position
         self.order = None
 
@@ -302,14 +390,21 @@ class MACDStrategy(BaseStrategy):
         if not self.position:
             # Buy condition: MACD crosses above Signal
             if self.crossover > 0:
-                self.log(f'BUY CREATE at {self.data.close[0]:.2f}')
+                self.record('buy_create', price=self.data.close[0])
                 self.order = self.buy(size=self.params.size)
         else:
             # Sell condition: MACD crosses below Signal
             if self.crossover < 0:
-                self.log(f'SELL CREATE at {self.data.close[0]:.2f}')
+                self.record('sell_create', price=self.data.close[0])
                 self.order = self.sell(size=self.params.size)
 
+    @classmethod
+    def vector_signals(cls, data, **params):
+        p = cls.vector_params(params)
+        line, signal = vector.macd(data['close'].to_numpy(), p['macd1'], p['macd2'], p['signal'])
+        cross = vector.crossover(line, signal)
+        return dict(entries=cross > 0, exits=cross < 0, size=p['size'], halt_on_reject=True)
+
     def stop(self):
         # Log final portfolio value
-        self.log(f'Final Portfolio Value: {self.broker.getvalue():.2f}')
\ No newline at end of file
+        self.record('final_value', value=self.broker.getvalue())
\ No newline at end of file
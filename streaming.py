@@ -0,0 +1,109 @@
+# Low-memory streaming runs over the on-disk column store
+#
+# A StoreFeed hands bars to backtrader one at a time from blocks read off the
+# column files, and run_streaming runs Cerebro with exactbars=1 so
+# every line (feed, indicators, strategy-level operations) is a ring buffer
+# sized to its minimum period. Peak memory therefore does not grow with the
+# length of the history. What still grows is backtrader's own bookkeeping:
+# the broker and strategy keep every Order and Trade object, so a strategy
+# that trades every few bars grows with its trade count.
+#
+# Deep lookback: a strategy that indexes a line further back than the line's
+# own minimum period (e.g. self.sma[-50] on an SMA(20)) reads garbage or
+# fails under exactbars=1. check_lookback() runs a sample in both modes and
+# reports whether the results agree; run it once per strategy/params before
+# switching that strategy to streaming.
+import backtrader as bt
+from datastore import COLUMNS, EPOCH_NUM, NS_PER_DAY, ColumnStore
+
+
+class StoreFeed(bt.feed.DataBase):
+    params = (
+        ('store', None),  # ColumnStore, defaults to data/store
+        ('ticker', None),
+        ('start', None),
+        ('end', None),
+        ('chunk', 65536),  # Bars read from the column files at a time
+    )
+
+    def start(self):
+        super().start()
+        self._bars = self._iter_bars()
+
+    def _iter_bars(self):
+        store = self.p.store or ColumnStore()
+        for block in store.iter_chunks(self.p.ticker, self.p.start, self.p.end, self.p.chunk):
+            dates = EPOCH_NUM + block['index'] / NS_PER_DAY
+            yield from zip(dates.tolist(), *[block[c].tolist() for c in COLUMNS])
+
+    def _load(self):
+        bar = next(self._bars, None)
+        if bar is None:
+            return False
+        dt, o, h, l, c, v = bar
+        self.lines.datetime[0] = dt
+        self.lines.open[0] = o
+        self.lines.high[0] = h
+        self.lines.low[0] = l
+        self.lines.close[0] = c
+        self.lines.volume[0] = v
+        self.lines.openinterest[0] = 0.0
+        return True
+
+
+def streaming_cerebro(feed, strategy, params=None, cash=10000.0, commission=0.001, sizer=None,
+                      sizer_params=None, exactbars=1):
+    cerebro = bt.Cerebro(exactbars=exactbars, stdstats=False, preload=exactbars != 1,
+                         runonce=False)
+    cerebro.adddata(feed)
+    cerebro.addstrategy(strategy, **(params or {}))
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    if sizer is not None:
+        cerebro.addsizer(sizer, **(sizer_params or {}))
+    # Analyzers that keep O(1) state (SharpeRatio would keep a return per period)
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    cerebro.addanalyzer(bt.analyzers.TradeAnalyzer, _name='trades')
+    return cerebro
+
+
+def _result(strat):
+    drawdown = strat.analyzers.drawdown.get_analysis()
+    returns = strat.analyzers.returns.get_analysis()
+    trades = strat.analyzers.trades.get_analysis()
+    return {
+        'max_drawdown': drawdown.get('max', {}).get('drawdown'),
+        'rtot': returns.get('rtot'),
+        'rnorm': returns.get('rnorm'),
+        'trades': trades.get('total', {}).get('closed', 0),
+        'final_value': strat.broker.getvalue(),
+    }
+
+
+def run_streaming(ticker, strategy, params=None, start=None, end=None, store=None, chunk=65536,
+                  timeframe=bt.TimeFrame.Days, compression=1, **settings):
+    # settings: cash, commission, sizer, sizer_params
+    feed = StoreFeed(store=store, ticker=ticker, start=start, end=end, chunk=chunk, name=ticker,
+                     timeframe=timeframe, compression=compression)
+    cerebro = streaming_cerebro(feed, strategy, params, **settings)
+    return _result(cerebro.run()[0])
+
+
+def check_lookback(strategy, data, params=None, bars=5000, **settings):
+    # Runs the first `bars` rows of a DataFrame with full buffers and with
+    # exactbars=1. Returns (True, result) when both agree, otherwise
+    # (False, reason): the strategy reads deeper than its indicators' minimum
+    # periods and must not be streamed.
+    sample = data.iloc[:bars]
+    results = []
+    for exactbars in (False, 1):
+        feed = bt.feeds.PandasData(dataname=sample)
+        cerebro = streaming_cerebro(feed, strategy, params, exactbars=exactbars, **settings)
+        try:
+            results.append(_result(cerebro.run()[0]))
+        except IndexError as e:
+            return False, f'IndexError with exactbars=1: {e}'
+    if results[0] != results[1]:
+        return False, f'results differ: full={results[0]} streaming={results[1]}'
+    return True, results[1]
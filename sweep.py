@@ -0,0 +1,175 @@
+# Multi-process parameter sweeps
+import itertools
+import os
+from multiprocessing import Pool, shared_memory
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+from analyzers import EquityCurve, TradeList
+from datastore import COLUMNS
+from resultstore import data_fingerprint
+
+
+def param_grid(**ranges):
+    # param_grid(macd1=[8, 12], macd2=[26, 30]) -> list of param dicts
+    names = list(ranges)
+    return [dict(zip(names, values)) for values in itertools.product(*ranges.values())]
+
+
+class SharedOHLCV:
+    # Bars for one ticker placed in a single shared-memory block: an int64 date
+    # column followed by the OHLCV columns, all stored as 8-byte words.
+
+    def __init__(self, name, rows):
+        self.name = name
+        self.rows = rows
+
+    @classmethod
+    def create(cls, df):
+        rows = len(df)
+        shm = shared_memory.SharedMemory(create=True, size=max(rows, 1) * 8 * (len(COLUMNS) + 1))
+        index = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf)
+        index[:] = pd.DatetimeIndex(df.index).as_unit('ns').asi8
+        values = np.ndarray((rows, len(COLUMNS)), dtype=np.float64, buffer=shm.buf, offset=rows * 8)
+        values[:] = df[list(COLUMNS)].to_numpy(dtype=np.float64)
+        handle = cls(shm.name, rows)
+        handle._shm = shm
+        return handle
+
+    def attach(self):
+        # Returns a DataFrame backed by the shared block (no copy)
+        self._shm = shared_memory.SharedMemory(name=self.name)
+        buf = self._shm.buf
+        index = np.ndarray((self.rows,), dtype=np.int64, buffer=buf)
+        values = np.ndarray((self.rows, len(COLUMNS)), dtype=np.float64, buffer=buf, offset=self.rows * 8)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(index.view('datetime64[ns]')),
+                            columns=list(COLUMNS), copy=False)
+
+    def __getstate__(self):
+        return {'name': self.name, 'rows': self.rows}
+
+    def close(self):
+        shm = getattr(self, '_shm', None)
+        if shm is not None:
+            shm.close()
+
+    def unlink(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+_worker = {}
+
+
+def _init_worker(handles, config):
+    _worker['data'] = {name: handle.attach() for name, handle in handles.items()}
+    _worker['handles'] = handles
+    _worker['config'] = config
+
+
+def analyze(strat):
+    sharpe = strat.analyzers.sharpe.get_analysis()
+    drawdown = strat.analyzers.drawdown.get_analysis()
+    returns = strat.analyzers.returns.get_analysis()
+    return {
+        'sharpe': sharpe.get('sharperatio'),
+        'max_drawdown': drawdown.get('max', {}).get('drawdown'),
+        'rtot': returns.get('rtot'),
+        'rnorm': returns.get('rnorm'),
+        'final_value': strat.broker.getvalue(),
+    }
+
+
+def analyze_hotpath(strat):
+    # Flattened instrumentation columns for strategies run with instrument=True
+    hotpath = strat.hotpath.get_analysis()
+    row = {f'hotpath_{k}': hotpath[k] for k in ('next_mean_us', 'next_max_us', 'warmup_s', 'run_s',
+                                                  'rss_growth_mb', 'profile')}
+    row['hotpath_orders'] = hotpath['orders']
+    return row
+
+
+def build_cerebro(data, strategy, params, cash=10000.0, commission=0.001, sizer=None, sizer_params=None,
+                  collect=False):
+    cerebro = bt.Cerebro(stdstats=False)
+    for name, df in data.items():
+        cerebro.adddata(bt.feeds.PandasData(dataname=df, name=name))
+    if 'journal' in strategy.params._getkeys():
+        # Sweeps only keep the analyzer results, drop the trade journal
+        params = {'journal': 'off', **params}
+    cerebro.addstrategy(strategy, **params)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=commission)
+    if sizer is not None:
+        cerebro.addsizer(sizer, **(sizer_params or {}))
+    cerebro.addanalyzer(bt.analyzers.SharpeRatio, _name='sharpe')
+    cerebro.addanalyzer(bt.analyzers.DrawDown, _name='drawdown')
+    cerebro.addanalyzer(bt.analyzers.Returns, _name='returns')
+    if collect:
+        # Trade list and equity curve for the result store
+        cerebro.addanalyzer(TradeList, _name='tradelist')
+        cerebro.addanalyzer(EquityCurve, _name='equity')
+    return cerebro
+
+
+def _run_one(params):
+    config = _worker['config']
+    cerebro = build_cerebro(_worker['data'], config['strategy'], params, config['cash'],
+                            config['commission'], config['sizer'], config['sizer_params'], config['collect'])
+    strat = cerebro.run()[0]
+    row = {**params, **analyze(strat)}
+    if getattr(strat, 'hotpath', None) is not None:
+        row.update(analyze_hotpath(strat))
+    if config['collect']:
+        extra = {
+            'analysis': {name: strat.analyzers.getbyname(name).get_analysis()
+                         for name in ('sharpe', 'drawdown', 'returns')},
+            'trades': strat.analyzers.tradelist.get_analysis(),
+            'equity': strat.analyzers.equity.get_analysis(),
+        }
+        return params, row, extra
+    return params, row, None
+
+
+def iter_sweep(strategy, grid, data, cash=10000.0, commission=0.001, sizer=None, sizer_params=None,
+               processes=None, chunksize=8, store=None):
+    # Yields one result row per param combination as workers finish them.
+    # data is a DataFrame or a {name: DataFrame} dict; the bars are copied into
+    # shared memory once and every worker maps the same block. With a
+    # resultstore.ResultStore, cells computed before are served from it and
+    # new ones are saved to it.
+    if isinstance(data, pd.DataFrame):
+        data = {'data': data}
+    settings = dict(cash=cash, commission=commission, sizer=sizer, sizer_params=sizer_params)
+    if store is not None:
+        data_fp = data_fingerprint(data)
+        todo = []
+        for params in grid:
+            key = store.key(strategy, params, data_fp, **settings)
+            cached = store.get(key)
+            if cached is not None:
+                yield cached
+            else:
+                todo.append(params)
+        grid = todo
+    if not grid:
+        return
+    handles = {name: SharedOHLCV.create(df) for name, df in data.items()}
+    config = dict(strategy=strategy, collect=store is not None, **settings)
+    try:
+        with Pool(processes or os.cpu_count(), initializer=_init_worker, initargs=(handles, config)) as pool:
+            for params, row, extra in pool.imap_unordered(_run_one, grid, chunksize=chunksize):
+                if extra is not None:
+                    key = store.key(strategy, params, data_fp, **settings)
+                    store.put(key, strategy, params, row, data_fp=data_fp, analysis=extra['analysis'],
+                              trades=extra['trades'], equity=extra['equity'], **settings)
+                yield row
+    finally:
+        for handle in handles.values():
+            handle.unlink()
+
+
+def run_sweep(strategy, grid, data, **kwargs):
+    return pd.DataFrame(list(iter_sweep(strategy, grid, data, **kwargs)))
@@ -0,0 +1,63 @@
+# Corporate actions picked up as the stored range grows, for providers with
+# raw and with split-adjusted bars
+import numpy as np
+import pandas as pd
+import pytest
+
+from clean import adjustment
+from datastore import ColumnStore
+from loader import get_data
+
+SPLIT = pd.Timestamp('2020-02-03')
+START, MIDDLE, END = '2020-01-01', '2020-02-01', '2020-03-02'
+
+
+class Provider:
+    # A stock that splits 2:1 on SPLIT, as seen on the day `now`. Raw bars
+    # trade at 100 before it and 50 after; a split-adjusting provider (like
+    # Yahoo) rewrites its whole history to 50 once the split has happened.
+    def __init__(self, split_adjusted):
+        self.split_adjusted = split_adjusted
+        self.now = pd.Timestamp(MIDDLE)
+
+    def __call__(self, ticker, start, end):
+        index = pd.bdate_range(START, END, inclusive='left', name='Date')
+        before = index < SPLIT
+        if self.split_adjusted and self.now >= SPLIT:
+            before = np.zeros(len(index), dtype=bool)
+        close = np.where(before, 100.0, 50.0)
+        frame = pd.DataFrame({'open': close, 'high': close, 'low': close, 'close': close,
+                              'volume': np.where(before, 1000.0, 2000.0)}, index=index)
+        return frame[(index < self.now) & (index >= pd.Timestamp(start)) & (index < pd.Timestamp(end))]
+
+    def actions(self, ticker):
+        known = [SPLIT] if self.now > SPLIT else []
+        return pd.DataFrame({'Dividends': [0.0] * len(known), 'Stock Splits': [2.0] * len(known)},
+                            index=pd.DatetimeIndex(known))
+
+
+@pytest.mark.parametrize('split_adjusted', [False, True])
+def test_extending_across_a_split_adjusts_the_stored_bars(tmp_path, split_adjusted):
+    store = ColumnStore(str(tmp_path))
+    provider = Provider(split_adjusted)
+    first = get_data('X', START, MIDDLE, provider=provider, store=store, clean=True)
+    assert (first['close'] == 100).all()
+    provider.now = pd.Timestamp(END)
+    cleaned = get_data('X', START, END, provider=provider, store=store, clean=True)
+    assert len(cleaned) > len(first)
+    # Back-adjusted to the latest terms, and not halved twice
+    assert (cleaned['close'] == 50).all()
+    assert (cleaned['volume'] == 2000).all()
+
+
+@pytest.mark.parametrize('split_adjusted', [False, True])
+def test_split_adjusted_bars_only_get_dividends(split_adjusted):
+    index = pd.bdate_range('2020-01-01', periods=4).as_unit('ns').asi8
+    close = np.full(4, 50.0)
+    actions = {'index': index[[2, 3]], 'dividends': np.array([0.0, 1.0]), 'splits': np.array([2.0, 0.0]),
+               'split_adjusted': split_adjusted}
+    price, split = adjustment(index, close, actions)
+    expected_split = np.ones(4) if split_adjusted else np.array([0.5, 0.5, 1.0, 1.0])
+    np.testing.assert_array_equal(split, expected_split)
+    # The dividend still scales every bar before its ex-date
+    np.testing.assert_allclose(price, expected_split * np.array([0.98, 0.98, 0.98, 1.0]))
@@ -0,0 +1,84 @@
+# ColumnStore: versioned rewrites, coverage of partial and empty fetches
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datastore import COLUMNS, ColumnStore
+
+
+def bars(start, periods, first=1.0):
+    index = pd.bdate_range(start, periods=periods, name='Date')
+    close = first + np.arange(periods, dtype=np.float64)
+    return pd.DataFrame({'open': close, 'high': close + 1, 'low': close - 1, 'close': close,
+                         'volume': 100.0}, index=index)
+
+
+def fetcher(frame, calls=None):
+    def fetch(ticker, start, end):
+        if calls is not None:
+            calls.append((start, end))
+        return frame[(frame.index >= pd.Timestamp(start)) & (frame.index < pd.Timestamp(end))]
+    return fetch
+
+
+def test_prepend_and_append_keep_columns_aligned(tmp_path):
+    store = ColumnStore(str(tmp_path))
+    full = bars('2020-01-01', 300)
+    store.load('X', '2020-03-01', '2020-06-01', fetcher(full))
+    store.load('X', '2020-01-01', '2020-12-01', fetcher(full))
+    expected = full[(full.index >= '2020-01-01') & (full.index < '2020-12-01')]
+    pd.testing.assert_frame_equal(store.read('X', '2020-01-01', '2020-12-01', copy=True), expected,
+                                  check_freq=False)
+    # Only the current version's files are left
+    assert sorted(os.listdir(tmp_path / 'X')) == sorted([f'{c}.2.bin' for c in ('index',) + COLUMNS] +
+                                                         ['meta.json'])
+
+
+def test_failed_prepend_leaves_previous_version(tmp_path, monkeypatch):
+    store = ColumnStore(str(tmp_path))
+    full = bars('2020-01-01', 300)
+    store.load('X', '2020-03-01', '2020-06-01', fetcher(full))
+    before = store.read('X', copy=True)
+    meta = store.meta('X')
+
+    def crash(ticker, meta):
+        raise OSError('disk full')
+
+    # The new version's columns are all written, the switch never happens
+    monkeypatch.setattr(store, '_write_meta', crash)
+    with pytest.raises(OSError):
+        store.load('X', '2020-01-01', '2020-06-01', fetcher(full))
+    monkeypatch.undo()
+    assert store.meta('X') == meta
+    pd.testing.assert_frame_equal(store.read('X', copy=True), before)
+    store.load('X', '2020-01-01', '2020-06-01', fetcher(full))
+    assert len(store.read('X')) == len(full[full.index < '2020-06-01'])
+
+
+def test_empty_fetch_is_not_covered(tmp_path):
+    store = ColumnStore(str(tmp_path))
+    calls = []
+    store.load('X', '2020-01-01', '2020-02-01', fetcher(bars('2021-01-01', 10), calls))
+    assert not store.covers('X', '2020-01-01', '2020-02-01')
+    store.load('X', '2020-01-01', '2020-02-01', fetcher(bars('2020-01-01', 100), calls))
+    assert store.covers('X', '2020-01-01', '2020-02-01')
+    assert len(store.read('X', '2020-01-01', '2020-02-01')) == 23
+    store.load('X', '2020-01-01', '2020-04-01', fetcher(bars('2030-01-01', 10), calls))
+    assert store.meta('X')['end'] == '2020-02-01'
+
+
+def test_todays_bar_is_refetched(tmp_path):
+    store = ColumnStore(str(tmp_path))
+    today = pd.Timestamp(str(np.datetime64('today', 'D')))
+    later = str((today + pd.Timedelta(days=10)).date())
+    partial = pd.DataFrame({c: [1.0, 2.0] for c in COLUMNS},
+                           index=pd.DatetimeIndex([today - pd.Timedelta(days=1), today], name='Date'))
+    store.write('X', partial, '2000-01-01', later)
+    assert store.meta('X')['end'] == str(today.date())
+    final = partial.copy()
+    final.loc[today] = 5.0
+    final.loc[today + pd.Timedelta(days=1)] = 6.0
+    store.load('X', '2000-01-01', later, fetcher(final))
+    pd.testing.assert_frame_equal(store.read('X', copy=True), final, check_freq=False)
@@ -0,0 +1,54 @@
+# Strategies sharing an indicator through BaseStrategy.ind see the same
+# values and wait the same warm-up as with their own instances
+import backtrader as bt
+import numpy as np
+import pytest
+
+from bench import synthetic_ohlcv
+from indicator import KDJ, indicator_cache
+from strategy import BaseStrategy
+
+# (class, params) pairs; one strategy also asks for a longer SMA of its own
+SHARED = [(bt.ind.SMA, {'period': 20}), (KDJ, {'period': 9})]
+
+
+def make(shared):
+    class Recorder(BaseStrategy):
+        params = (('extra', None),)
+
+        def __init__(self):
+            wanted = SHARED + ([(bt.ind.SMA, {'period': self.p.extra})] if self.p.extra else [])
+            get = self.ind if shared else (lambda cls, *datas, **params: cls(*datas, **params))
+            self.inds = [get(cls, self.data, **params) for cls, params in wanted]
+            self.rows = []
+
+        def next(self):
+            self.rows.append([len(self)] + [line[0] for ind in self.inds for line in ind.lines])
+
+    return Recorder
+
+
+def run(shared, runonce):
+    cerebro = bt.Cerebro(stdstats=False, runonce=runonce)
+    cerebro.adddata(bt.feeds.PandasData(dataname=synthetic_ohlcv(400, seed=3)))
+    strategy = make(shared)
+    cerebro.addstrategy(strategy, journal='off')
+    cerebro.addstrategy(strategy, journal='off', extra=50)
+    # Owns nothing: only the shared indicators can gate its next()
+    cerebro.addstrategy(strategy, journal='off')
+    return cerebro.run()
+
+
+@pytest.mark.parametrize('runonce', [True, False])
+def test_shared_indicators_match_separate_instances(runonce):
+    hits = indicator_cache.hits
+    shared = run(True, runonce)
+    assert indicator_cache.hits - hits == 2 * len(SHARED)
+    assert all(a is b is c for a, b, c in zip(shared[0].inds, shared[1].inds, shared[2].inds))
+    separate = run(False, runonce)
+    for mine, theirs in zip(shared, separate):
+        assert mine.rows[0][0] == theirs.rows[0][0]
+        np.testing.assert_array_equal(np.array(mine.rows), np.array(theirs.rows))
+    # The second strategy waits for its own longer SMA, the third for the
+    # shared ones like their owner
+    assert shared[1].rows[0][0] > shared[0].rows[0][0] == shared[2].rows[0][0] > 1
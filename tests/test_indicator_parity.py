@@ -0,0 +1,169 @@
+# The rewritten indicators (batch once() plus the streaming next()) against
+# the original implementations, in runonce and next modes, on random series
+# with flat stretches.
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicator import CustomZigZag, DirectionalChangeInd, KDJ
+
+
+# Original implementations, as they were before the once() rewrite
+
+class BaselineDirectionalChange(bt.Indicator):
+    lines = ('tops', 'bottoms',)
+    params = (('sigma', 5),)
+
+    def __init__(self):
+        self.addminperiod(2)
+        self.up_zig = True
+        self.tmp_max = None
+        self.tmp_min = None
+
+    def prenext(self):
+        self.tmp_max = self.data.high[0]
+        self.tmp_min = self.data.low[0]
+
+    def next(self):
+        if self.up_zig:
+            if self.data.high[0] > self.tmp_max:
+                self.tmp_max = self.data.high[0]
+            elif self.data.close[0] < self.tmp_max - self.tmp_max * self.params.sigma / 1000:
+                self.l.tops[0] = self.tmp_max
+                self.up_zig = False
+                self.tmp_min = self.data.low[0]
+        else:
+            if self.data.low[0] < self.tmp_min:
+                self.tmp_min = self.data.low[0]
+            elif self.data.close[0] > self.tmp_min + self.tmp_min * self.params.sigma / 1000:
+                self.l.bottoms[0] = self.tmp_min
+                self.up_zig = True
+                self.tmp_max = self.data.high[0]
+
+
+class BaselineZigZag(bt.Indicator):
+    lines = ('zigzag',)
+    params = (('percent', 5.0),)
+
+    def __init__(self):
+        self.last_pivot_price = None
+        self.last_pivot_type = None
+
+    def next(self):
+        if self.last_pivot_price is None:
+            self.last_pivot_price = self.data[0]
+            self.last_pivot_type = 'low'
+            self.lines.zigzag[0] = self.data[0]
+            return
+        price = self.data[0]
+        if self.last_pivot_type == 'low':
+            if price >= self.last_pivot_price * (1 + self.params.percent / 100):
+                self.lines.zigzag[0] = price
+                self.last_pivot_price = price
+                self.last_pivot_type = 'high'
+            else:
+                self.lines.zigzag[0] = 0
+        else:
+            if price <= self.last_pivot_price * (1 - self.params.percent / 100):
+                self.lines.zigzag[0] = price
+                self.last_pivot_price = price
+                self.last_pivot_type = 'low'
+            else:
+                self.lines.zigzag[0] = 0
+
+
+class BaselineKDJ(bt.Indicator):
+    lines = ('K', 'D', 'J')
+    params = (('period', 14), ('period_d', 3), ('period_j', 3))
+
+    def __init__(self):
+        highest = bt.indicators.Highest(self.data.high, period=self.p.period)
+        lowest = bt.indicators.Lowest(self.data.low, period=self.p.period)
+        rsv = 100 * (self.data.close - lowest) / (highest - lowest)
+        self.lines.K = bt.indicators.SMA(rsv, period=self.p.period_d)
+        self.lines.D = bt.indicators.SMA(self.lines.K, period=self.p.period_j)
+        self.lines.J = 3 * self.lines.K - 2 * self.lines.D
+
+
+def series(seed, bars=600, flat=True):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, bars)))
+    spread = rng.uniform(0, 0.02, bars)
+    high, low = close * (1 + spread), close * (1 - spread)
+    opens = close * (1 + rng.normal(0, 0.005, bars))
+    if flat:
+        # Stretches where every price is the same (halted / illiquid names)
+        for start in rng.integers(0, bars - 40, 4):
+            length = int(rng.integers(5, 30))
+            opens[start:start + length] = high[start:start + length] = low[start:start + length] = \
+                close[start:start + length] = close[start]
+    return pd.DataFrame({'open': opens, 'high': np.maximum(high, opens), 'low': np.minimum(low, opens),
+                         'close': close, 'volume': 1000.0}, index=pd.bdate_range('2000-01-01', periods=bars))
+
+
+def lines(df, indcls, runonce, **params):
+    class Probe(bt.Strategy):
+        def __init__(self):
+            self.probe = indcls(self.data, **params)
+
+    cerebro = bt.Cerebro(stdstats=False, runonce=runonce)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df))
+    cerebro.addstrategy(Probe)
+    probe = cerebro.run()[0].probe
+    return {alias: np.asarray(probe.lines[i].array, dtype=np.float64)
+            for i, alias in enumerate(probe.lines.getlinealiases())}
+
+
+def assert_same(a, b):
+    assert a.keys() == b.keys()
+    for alias in a:
+        np.testing.assert_array_equal(a[alias], b[alias], err_msg=alias)
+
+
+CASES = [
+    (DirectionalChangeInd, BaselineDirectionalChange, {'sigma': 5}),
+    (DirectionalChangeInd, BaselineDirectionalChange, {'sigma': 20}),
+    (CustomZigZag, BaselineZigZag, {'percent': 5.0}),
+    (CustomZigZag, BaselineZigZag, {'percent': 2.0}),
+]
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('indcls,baseline,params', CASES)
+@pytest.mark.parametrize('runonce', [True, False])
+def test_matches_baseline(seed, indcls, baseline, params, runonce):
+    df = series(seed)
+    assert_same(lines(df, indcls, runonce, **params), lines(df, baseline, runonce, **params))
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('period', [9, 14])
+@pytest.mark.parametrize('runonce', [True, False])
+def test_kdj_matches_baseline(seed, period, runonce):
+    # The baseline divides by zero on a flat window, so it is compared on
+    # series without flat stretches; the warm-up K/D values it leaves
+    # empty are compared from where it has them
+    df = series(seed, flat=False)
+    new = lines(df, KDJ, runonce, period=period)
+    old = lines(df, BaselineKDJ, runonce, period=period)
+    for alias in ('K', 'D', 'J'):
+        have = ~np.isnan(old[alias])
+        assert have.any()
+        np.testing.assert_array_equal(new[alias][have], old[alias][have], err_msg=alias)
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('period', [9, 14])
+def test_kdj_modes_agree_on_flat_windows(seed, period):
+    df = series(seed)
+    once, stepped = lines(df, KDJ, True, period=period), lines(df, KDJ, False, period=period)
+    assert_same(once, stepped)
+    high, low = df['high'].to_numpy(), df['low'].to_numpy()
+    flat = np.array([high[i - period + 1:i + 1].max() == low[i - period + 1:i + 1].min()
+                     for i in range(period - 1, len(df))])
+    assert flat.any()
+    # A flat window gives NaN K rather than raising
+    assert np.isnan(once['K'][period - 1:][flat]).all()
+    assert not np.isinf(once['K']).any()
+
@@ -0,0 +1,29 @@
+# Ranking direction and empty searches
+import pytest
+
+from bench import synthetic_ohlcv
+from optimize import optimize
+from strategy import SMACrossover
+
+SPACE = {'fast': (5, 15), 'slow': (20, 60)}
+
+
+@pytest.mark.parametrize('objective,direction,best', [
+    ('max_drawdown', None, min),
+    ('final_value', None, max),
+    ('final_value', 'min', min),
+])
+def test_best_first_in_the_objectives_direction(objective, direction, best):
+    df = optimize(SMACrossover, SPACE, synthetic_ohlcv(800, seed=4), n_trials=8, objective=objective,
+                  direction=direction, processes=1, seed=1, slack=1.0)
+    finished = df[~df['pruned']]
+    assert df.loc[0, objective] == best(finished[objective])
+
+
+def test_no_trials_returns_empty_frame():
+    assert optimize(SMACrossover, SPACE, synthetic_ohlcv(300, seed=1), n_trials=0, processes=1).empty
+
+
+def test_rejects_unknown_direction():
+    with pytest.raises(ValueError):
+        optimize(SMACrossover, SPACE, synthetic_ohlcv(300, seed=1), n_trials=1, direction='up', processes=1)
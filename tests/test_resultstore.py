@@ -0,0 +1,49 @@
+# Result store keys and main.run answering repeated runs from the store
+import pytest
+
+import main
+from bench import synthetic_ohlcv
+from resultstore import ResultStore
+
+
+def scaled(k):
+    return lambda columns: columns['close'] * k
+
+
+def key(store, **sizer_params):
+    from strategy import MACDStrategy
+    return store.key(MACDStrategy, {'progress': print}, 'data', 10000.0, 0.001, sizer_params=sizer_params)
+
+
+def test_callable_params_key_by_code_not_address(tmp_path):
+    store = ResultStore(str(tmp_path))
+    assert key(store, signals=scaled(2)) == key(store, signals=scaled(2))
+    assert key(store, signals=scaled(2)) != key(store, signals=scaled(3))
+    assert key(store, signals=lambda c: c['close']) != key(store, signals=lambda c: c['open'])
+    store.close()
+
+
+@pytest.fixture
+def spec(tmp_path):
+    data = synthetic_ohlcv(600, seed=1)
+    data.index.name = 'Date'
+    data.to_csv(tmp_path / 'X.csv')
+    return {'tickers': ['X'], 'start': '1990-01-01', 'end': '1993-01-01', 'data_dir': str(tmp_path),
+            'store': str(tmp_path / 'store'), 'results': str(tmp_path / 'results'), 'analyzers': ['sharpe'],
+            'report': None, 'journal': False}
+
+
+def test_main_run_serves_repeated_runs(spec):
+    cerebro, strategies = main.run(spec)
+    assert cerebro is not None
+    value = cerebro.broker.getvalue()
+    assert len(strategies[0].analyzers.tradelist.get_analysis())
+    cached, rows = main.run(spec)
+    assert cached is None
+    assert rows[0]['final_value'] == pytest.approx(value)
+    # Different params are a new run
+    cerebro, _ = main.run({**spec, 'strategy': {'name': 'MACDStrategy', 'params': {'macd1': 8}}})
+    assert cerebro is not None
+    store = ResultStore(spec['results'])
+    assert len(store.results()) == 2
+    store.close()
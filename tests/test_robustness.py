@@ -0,0 +1,50 @@
+# Seeding of the resampled paths and the run's own commission in 'costs'
+import backtrader as bt
+import numpy as np
+import pytest
+
+import robustness
+from analyzers import EquityCurve, TradeList
+from bench import synthetic_ohlcv
+from strategy import SMACrossover
+
+
+@pytest.fixture(scope='module')
+def run():
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(bt.feeds.PandasData(dataname=synthetic_ohlcv(1500, seed=2)))
+    cerebro.addstrategy(SMACrossover, journal='off')
+    cerebro.broker.setcash(10000.0)
+    cerebro.broker.setcommission(commission=0.002)
+    cerebro.addanalyzer(TradeList, _name='tradelist')
+    cerebro.addanalyzer(EquityCurve, _name='equity')
+    return robustness.from_strategy(cerebro.run()[0])
+
+
+def test_inputs_carry_the_runs_commission(run):
+    assert run['commission'] == 0.002
+    assert run['cash'] == 10000.0
+    assert len(run['trades']) > 5
+
+
+def test_unseeded_runs_differ_seeded_runs_repeat(run):
+    kwargs = dict(methods=('shuffle', 'bootstrap'), n=200, chunk=50, processes=1)
+    first, second = robustness.simulate(**run, **kwargs), robustness.simulate(**run, **kwargs)
+    assert not np.array_equal(first['bootstrap']['final_value'], second['bootstrap']['final_value'])
+    a = robustness.simulate(**run, seed=7, **kwargs)
+    b = robustness.simulate(**run, seed=7, **{**kwargs, 'processes': 2})
+    for method in a:
+        np.testing.assert_array_equal(a[method]['final_value'], b[method]['final_value'])
+    # A method's paths do not depend on which other methods ran
+    alone = robustness.simulate(**run, seed=7, **{**kwargs, 'methods': ('bootstrap',)})
+    np.testing.assert_array_equal(alone['bootstrap']['sharpe'], a['bootstrap']['sharpe'])
+
+
+def test_costs_vary_around_the_runs_rate(run):
+    # A range of exactly the run's rate and no slippage reproduces the run
+    result = robustness.simulate(**run, methods=('costs',), n=20, chunk=10, processes=1, seed=1,
+                                 costs={'commission_range': (1.0, 1.0), 'slippage': 0.0})
+    final = np.asarray(run['equity']['value'])[-1]
+    np.testing.assert_allclose(result['costs']['final_value'], final)
+    with pytest.raises(ValueError):
+        robustness.simulate(**{**run, 'commission': None}, methods=('costs',), n=10, processes=1)
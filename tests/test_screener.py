@@ -0,0 +1,131 @@
+# The screener's row-at-a-time indicators against backtrader's, and
+# incremental updates against a fresh fit
+import backtrader as bt
+import numpy as np
+import pytest
+
+from bench import synthetic_ohlcv
+from indicator import DirectionalChangeInd
+from screener import Screener
+
+TICKERS = ['A', 'B', 'C', 'D']
+ROWS = 400
+LATE = 60  # D lists this many rows into the panel
+
+
+def frames():
+    return [synthetic_ohlcv(ROWS, seed=k) for k in range(len(TICKERS))]
+
+
+def panel(late=True):
+    dfs = frames()
+    data = {'index': dfs[0].index.as_unit('ns').asi8}
+    for c in ('high', 'low', 'close'):
+        data[c] = np.column_stack([df[c].to_numpy() for df in dfs])
+        if late:
+            data[c][:LATE, -1] = np.nan
+    return data
+
+
+def screened(data):
+    # values() after every row
+    screener, rows = Screener(TICKERS), []
+    for t in range(len(data['index'])):
+        screener.update(data['index'][t], {c: data[c][t] for c in ('high', 'low', 'close')})
+        rows.append(screener.values())
+    return {name: np.array([row[name] for row in rows], dtype=np.float64) for name in rows[0]}
+
+
+class Probe(bt.Strategy):
+    def __init__(self):
+        p = Screener.params
+        macd = bt.ind.MACD(self.data, period_me1=p['macd1'], period_me2=p['macd2'], period_signal=p['signal'])
+        self.record = {
+            'macd': macd.macd,
+            'macd_signal': macd.signal,
+            'rsi': bt.ind.RSI(self.data, period=p['rsi_period']),
+            'sma_cross': bt.ind.CrossOver(bt.ind.SMA(self.data, period=p['fast']),
+                                          bt.ind.SMA(self.data, period=p['slow'])),
+            'macd_cross': bt.ind.CrossOver(macd.macd, macd.signal),
+        }
+        self.dc = DirectionalChangeInd(self.data, sigma=p['sigma'])
+
+
+def backtrader_lines(df):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(bt.feeds.PandasData(dataname=df))
+    cerebro.addstrategy(Probe)
+    strat = cerebro.run()[0]
+    out = {name: np.asarray(line.array, dtype=np.float64) for name, line in strat.record.items()}
+    out['tops'] = np.asarray(strat.dc.tops.array, dtype=np.float64)
+    out['bottoms'] = np.asarray(strat.dc.bottoms.array, dtype=np.float64)
+    return out
+
+
+@pytest.fixture(scope='module')
+def both():
+    return screened(panel(late=False)), [backtrader_lines(df) for df in frames()]
+
+
+@pytest.mark.parametrize('name', ['macd', 'macd_signal', 'rsi'])
+def test_ema_lines_match_backtrader(both, name):
+    mine, theirs = both
+    for k, lines in enumerate(theirs):
+        have = ~np.isnan(lines[name])
+        assert have.sum() > ROWS // 2
+        np.testing.assert_array_equal(np.isnan(mine[name][:, k]), ~have)
+        np.testing.assert_allclose(mine[name][have, k], lines[name][have], rtol=1e-9)
+
+
+@pytest.mark.parametrize('name', ['sma_cross', 'macd_cross'])
+def test_crosses_match_backtrader(both, name):
+    mine, theirs = both
+    for k, lines in enumerate(theirs):
+        have = ~np.isnan(lines[name])
+        assert (lines[name][have] != 0).sum() > 3
+        np.testing.assert_array_equal(mine[name][have, k], lines[name][have])
+
+
+def test_pivots_match_directional_change(both):
+    mine, theirs = both
+    for k, lines in enumerate(theirs):
+        top, bottom = ~np.isnan(lines['tops']), ~np.isnan(lines['bottoms'])
+        assert top.sum() > 3 and bottom.sum() > 3
+        # State after each row: type, price and age of the last pivot
+        pivot, price, age = np.zeros(ROWS), np.full(ROWS, np.nan), np.full(ROWS, -1.0)
+        for t in range(ROWS):
+            if t:
+                pivot[t], price[t], age[t] = pivot[t - 1], price[t - 1], age[t - 1] + (age[t - 1] >= 0)
+            if top[t]:
+                pivot[t], price[t], age[t] = 1, lines['tops'][t], 0
+            elif bottom[t]:
+                pivot[t], price[t], age[t] = -1, lines['bottoms'][t], 0
+        np.testing.assert_array_equal(mine['pivot'][:, k], pivot)
+        np.testing.assert_array_equal(mine['pivot_price'][:, k], price)
+        np.testing.assert_array_equal(mine['pivot_age'][:, k], age)
+
+
+def assert_same_values(a, b):
+    va, vb = a.values(), b.values()
+    assert va.keys() == vb.keys()
+    for name in va:
+        np.testing.assert_array_equal(np.asarray(va[name], dtype=np.float64),
+                                      np.asarray(vb[name], dtype=np.float64), err_msg=name)
+
+
+@pytest.mark.parametrize('split', [1, 30, 250, ROWS - 1])
+def test_extend_matches_a_fresh_fit(split):
+    data = panel()
+    head = {name: column[:split] for name, column in data.items()}
+    incremental = Screener(TICKERS).fit(head).extend(data)
+    assert incremental.rows == ROWS
+    assert_same_values(incremental, Screener(TICKERS).fit(data))
+
+
+def test_update_matches_a_fresh_fit():
+    data = panel()
+    stepped = Screener(TICKERS)
+    for t in range(ROWS):
+        stepped.update(data['index'][t], {c: data[c][t] for c in ('high', 'low', 'close')})
+    assert_same_values(stepped, Screener(TICKERS).fit(data))
+    assert stepped.date == data['index'][-1]
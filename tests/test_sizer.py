@@ -0,0 +1,114 @@
+# PortfolioSizer allocations and its precomputed volatility / ATR arrays
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench import synthetic_ohlcv
+from sizer import PortfolioSizer, _atr, _volatility
+
+FEEDS = 6
+LOTS = {'0000.HK': 100, '0001.HK': 200, '0002.HK': 500}
+
+
+def always(columns):
+    return np.ones(len(columns['close']), dtype=bool)
+
+
+class Buyer(bt.Strategy):
+    # Buys every feed on bar `on` and records what the sizer gave
+    params = (('on', 60),)
+
+    def __init__(self):
+        self.atr = [bt.ind.ATR(d, period=20) for d in self.datas]
+        self.sizes = None
+
+    def next(self):
+        if len(self) != self.p.on:
+            return
+        self.cash, self.value = self.broker.getcash(), self.broker.getvalue()
+        self.prices = np.array([d.close[0] for d in self.datas])
+        orders = [self.buy(data=d) for d in self.datas]
+        self.sizes = np.array([o.created.size if o is not None else 0 for o in orders])
+
+
+def run(on=60, cash=1e6, commissions=None, **params):
+    cerebro = bt.Cerebro(stdstats=False)
+    for k in range(FEEDS):
+        cerebro.adddata(bt.feeds.PandasData(dataname=synthetic_ohlcv(300, seed=k), name=f'{k:04d}.HK'))
+    cerebro.addstrategy(Buyer, on=on)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=0.001)
+    for name, rate in (commissions or {}).items():
+        cerebro.broker.setcommission(commission=rate, name=name)
+    cerebro.addsizer(PortfolioSizer, signals=always, **params)
+    strat = cerebro.run()[0]
+    return strat, strat.getsizer()._allocation
+
+
+def test_atr_matches_backtrader():
+    strat, _ = run()
+    for d, atr in zip(strat.datas, strat.atr):
+        mine = _atr(*(np.asarray(getattr(d, c).array) for c in ('high', 'low', 'close')), 20)
+        np.testing.assert_allclose(mine, np.asarray(atr.array), rtol=1e-12, equal_nan=True)
+
+
+def test_volatility_matches_pandas():
+    close = synthetic_ohlcv(300, seed=1)['close']
+    expected = np.log(close).diff().rolling(20).std().to_numpy()
+    np.testing.assert_allclose(_volatility(close.to_numpy(), 20), expected, rtol=1e-10, equal_nan=True)
+
+
+@pytest.mark.parametrize('method', ['parity', 'vol', 'atr'])
+def test_sizes_are_whole_lots(method):
+    strat, _ = run(method=method, lots=LOTS, lot=50)
+    lots = np.array([LOTS.get(d._name, 50) for d in strat.datas])
+    assert strat.sizes.any()
+    assert not (strat.sizes % lots).any()
+
+
+def test_warm_up_feeds_get_nothing():
+    # The strategy's own ATR starts next() at bar 21, the sizer needs 31
+    strat, _ = run(on=22, period=30)
+    assert strat.sizes is not None and not strat.sizes.any()
+
+
+def test_parity_splits_cash_by_inverse_volatility():
+    strat, allocator = run(lot=1)
+    i = strat.p.on - 1
+    weight = 1 / np.array([vol[i] for vol in allocator.vol])
+    target = strat.cash * 0.99 * weight / weight.sum() / (1 + 0.001)
+    np.testing.assert_allclose(strat.sizes * strat.prices, target, atol=strat.prices.max())
+
+
+def test_atr_risks_a_fixed_fraction_of_equity():
+    strat, allocator = run(method='atr', risk=0.001, lot=1)
+    i = strat.p.on - 1
+    atr = np.array([a[i] for a in allocator.atr])
+    np.testing.assert_array_equal(strat.sizes, np.floor(strat.value * 0.001 / (2.0 * atr)))
+
+
+def test_vol_targets_volatility_per_position():
+    strat, allocator = run(method='vol', target=0.05, lot=1)
+    i = strat.p.on - 1
+    vol = np.array([v[i] for v in allocator.vol])
+    np.testing.assert_array_equal(strat.sizes, np.floor(strat.value * 0.05 / vol / FEEDS / strat.prices))
+
+
+def test_scaled_down_to_fraction_with_each_feeds_commission():
+    commissions = {'0000.HK': 0.05, '0003.HK': 0.02}
+    strat, _ = run(method='vol', target=5.0, lot=1, fraction=0.5, commissions=commissions)
+    rates = np.array([commissions.get(d._name, 0.001) for d in strat.datas])
+    committed = (strat.sizes * strat.prices * (1 + rates)).sum()
+    assert committed <= strat.cash * 0.5
+    # Only lot rounding is left unspent
+    assert committed > strat.cash * 0.5 - (strat.prices * (1 + rates)).sum()
+
+
+def test_signals_are_required():
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(bt.feeds.PandasData(dataname=synthetic_ohlcv(100, seed=1)))
+    cerebro.addstrategy(Buyer, on=50)
+    cerebro.addsizer(PortfolioSizer)
+    with pytest.raises(ValueError):
+        cerebro.run()
@@ -0,0 +1,65 @@
+# Specs through every installed engine, and the strategy-derived specs
+# against the strategies they wrap
+import backtrader as bt
+import numpy as np
+import pytest
+
+import spec
+import strategy
+from bench import synthetic_ohlcv
+from sizer import AllInSizer
+
+SPECS = [
+    (spec.SMA_CROSS, {}),
+    (spec.SMA_CROSS, {'fast': 5, 'slow': 20}),
+    (spec.MACD, {}),
+    (spec.MACD, {'size': 7}),
+    (spec.KDJ, {}),
+    (spec.KDJ, {'kdj_period': 14, 'stop_loss': 0.05}),
+]
+
+
+@pytest.mark.parametrize('seed', [1, 4, 5])
+@pytest.mark.parametrize('rules,params', SPECS)
+def test_backtrader_matches_vector(rules, params, seed):
+    data = synthetic_ohlcv(2000, seed=seed)
+    result = spec.parity(rules, data, params, engines=('backtrader', 'vector'))
+    assert len(result['trades']['backtrader'])
+    assert result['ok'], result['diff']
+
+
+@pytest.mark.parametrize('rules,params', SPECS[:3])
+def test_backtrader_matches_backtesting(rules, params):
+    pytest.importorskip('backtesting')
+    result = spec.parity(rules, synthetic_ohlcv(2000, seed=1), params, engines=('backtrader', 'backtesting'))
+    assert result['ok'], result['diff']
+
+
+def test_default_engines_skip_missing_backtesting():
+    result = spec.parity(spec.SMA_CROSS, synthetic_ohlcv(500, seed=1))
+    assert result['engines'][1] in spec.available_engines()
+
+
+def _final_value(strat, data, params, cash=10000.0):
+    cerebro = bt.Cerebro(stdstats=False)
+    cerebro.adddata(bt.feeds.PandasData(dataname=data))
+    cerebro.addstrategy(strat, journal='off', **params)
+    cerebro.broker.setcash(cash)
+    cerebro.broker.setcommission(commission=0.001)
+    cerebro.addsizer(AllInSizer)
+    cerebro.run()
+    return cerebro.broker.getvalue()
+
+
+@pytest.mark.parametrize('seed', [1, 4, 5])
+@pytest.mark.parametrize('compiled,original,params', [
+    (spec.SMACrossoverSpec, strategy.SMACrossover, {}),
+    (spec.MACDSpec, strategy.MACDStrategy, {}),
+    (spec.KDJSpec, strategy.KDJStrategy, {}),
+    # Cash too small for size=100: the original stops trading after the
+    # first rejected buy and the spec must too
+    (spec.MACDSpec, strategy.MACDStrategy, {'size': 1000}),
+])
+def test_compiled_spec_matches_strategy(compiled, original, params, seed):
+    data = synthetic_ohlcv(2000, seed=seed)
+    assert np.isclose(_final_value(compiled, data, params), _final_value(original, data, params), rtol=1e-12)
@@ -0,0 +1,31 @@
+# Walk-forward equity curves: the vector engine against backtrader, with
+# grids that set the strategies' own size param
+import numpy as np
+import pytest
+
+import strategy
+from bench import synthetic_ohlcv
+from walkforward import equity_matrix, walk_forward
+
+GRIDS = [
+    (strategy.MACDStrategy, [{'macd1': 12, 'macd2': 26, 'size': 7}, {'macd1': 8, 'macd2': 21, 'size': 50}]),
+    (strategy.SMACrossover, [{'fast': 10, 'slow': 30}, {'fast': 5, 'slow': 20}]),
+]
+
+
+@pytest.mark.parametrize('strat,grid', GRIDS)
+def test_vector_matches_backtrader(strat, grid):
+    data = synthetic_ohlcv(1500, seed=3)
+    grid = [{**params, 'journal': 'off'} for params in grid]
+    fast = equity_matrix(strat, grid, data, engine='vector', processes=1)
+    slow = equity_matrix(strat, grid, data, engine='backtrader', processes=1)
+    np.testing.assert_allclose(fast, slow, rtol=1e-9)
+
+
+def test_walk_forward_with_size_in_grid():
+    data = synthetic_ohlcv(1500, seed=4)
+    grid = [{'size': 10}, {'size': 20, 'macd1': 8}]
+    result = walk_forward(strategy.MACDStrategy, grid, data, train=400, test=200, processes=1)
+    assert len(result['windows']) == 5
+    assert set(result['windows']['size']) <= {10, 20}
+    assert np.isfinite(result['equity']).all()
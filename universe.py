@@ -0,0 +1,106 @@
+# Sharded universe backtests with portfolio-level aggregation
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+
+from loader import get_data
+from sweep import analyze, build_cerebro
+
+
+def shard(tickers, shards):
+    # Round-robin split so shards stay balanced when tickers are sorted by size
+    return [tickers[i::shards] for i in range(shards) if tickers[i::shards]]
+
+
+def _run_shard(tickers, start, end, strategy, params, cash, commission, sizer, sizer_params, provider, store):
+    # Each ticker is backtested in its own Cerebro on its own cash sleeve; the
+    # strategies in strategy.py only trade self.data, so one feed per run is
+    # what they expect anyway.
+    out = []
+    for ticker in tickers:
+        try:
+            data = get_data(ticker, start, end, provider=provider, store=store)
+        except Exception as e:
+            out.append({'ticker': ticker, 'error': f'{type(e).__name__}: {e}'})
+            continue
+        if data is None or len(data) == 0:
+            out.append({'ticker': ticker, 'error': 'no data'})
+            continue
+        params = dict(params)
+        if 'journal' in strategy.params._getkeys():
+            params.setdefault('journal', 'off')
+        cerebro = build_cerebro({ticker: data}, strategy, params, cash, commission, sizer, sizer_params,
+                                collect=True)
+        strat = cerebro.run()[0]
+        equity = strat.analyzers.equity.get_analysis()
+        out.append({
+            'ticker': ticker,
+            'error': None,
+            **analyze(strat),
+            'trades': strat.analyzers.tradelist.get_analysis(),
+            'equity': (np.asarray(equity['datetime']), np.asarray(equity['value'])),
+        })
+    return out
+
+
+def portfolio_stats(equity, periods=252):
+    returns = equity.pct_change().dropna()
+    drawdown = 1 - equity / equity.cummax()
+    years = len(returns) / periods if len(returns) else np.nan
+    std = returns.std()
+    return {
+        'start_value': equity.iloc[0],
+        'final_value': equity.iloc[-1],
+        'rtot': equity.iloc[-1] / equity.iloc[0] - 1,
+        'rnorm': (equity.iloc[-1] / equity.iloc[0]) ** (1 / years) - 1 if years else np.nan,
+        'sharpe': returns.mean() / std * np.sqrt(periods) if std else np.nan,
+        'max_drawdown': drawdown.max() * 100,
+    }
+
+
+def run_universe(tickers, start, end, strategy, params=None, cash=10000.0, commission=0.001, sizer=None,
+                 sizer_params=None, processes=None, shards=None, provider=None, store=None):
+    # Splits tickers across worker processes and merges the per-ticker runs
+    # into an equal-weight portfolio: `cash` is split evenly into sleeves.
+    # Returns dict(per_ticker=DataFrame, trades=DataFrame, equity=Series, stats=dict).
+    from loader import store as default_store
+    store = default_store if store is None else store
+    tickers = list(dict.fromkeys(tickers))
+    if not tickers:
+        raise ValueError('run_universe needs at least one ticker')
+    processes = processes or os.cpu_count()
+    shards = shard(list(tickers), shards or processes * 4)
+    sleeve = cash / len(tickers)
+    rows = []
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_run_shard, part, start, end, strategy, params or {}, sleeve, commission,
+                               sizer, sizer_params, provider, store) for part in shards]
+        for future in as_completed(futures):
+            rows.extend(future.result())
+    return aggregate(rows, sleeve, tickers)
+
+
+def aggregate(rows, sleeve, tickers):
+    curves, trades = {}, []
+    for row in rows:
+        if row['error'] is not None:
+            continue
+        dates, values = row.pop('equity')
+        curves[row['ticker']] = pd.Series(values, index=pd.DatetimeIndex([bt.num2date(d) for d in dates.tolist()]))
+        trades.extend({'ticker': row['ticker'], **t} for t in row.pop('trades'))
+    per_ticker = pd.DataFrame([{k: v for k, v in row.items() if k not in ('equity', 'trades')} for row in rows])
+    per_ticker = per_ticker.set_index('ticker').reindex(list(tickers))
+
+    # Sleeves sit in cash before their first bar and hold their last value after
+    if curves:
+        equity = pd.DataFrame(curves).sort_index().ffill().fillna(sleeve)
+        # Tickers that failed to load stay as idle cash
+        equity = equity.sum(axis=1) + sleeve * (len(tickers) - len(curves))
+        stats = portfolio_stats(equity)
+    else:
+        equity = pd.Series(dtype=float)
+        stats = {}
+    return {'per_ticker': per_ticker, 'trades': pd.DataFrame(trades), 'equity': equity, 'stats': stats}
@@ -0,0 +1,189 @@
+# Vectorized signal kernels and a light fill simulator ("fast mode").
+# Mirrors backtrader's indicator definitions and its default broker: orders
+# created on bar t fill at the open of bar t+1, commission is a percentage of
+# traded value. Results match the event-driven run up to floating point and
+# are meant for screening before the full backtrader run.
+import numpy as np
+
+
+def sma(x, period):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period).mean(axis=1)
+    return out
+
+
+def ema(x, period):
+    # Seeded with the SMA of the first `period` valid values like bt.ind.EMA
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) < period:
+        return out
+    start = valid[0] + period - 1
+    alpha = 2.0 / (1.0 + period)
+    alpha1 = 1.0 - alpha
+    prev = x[valid[0]:start + 1].mean()
+    out[start] = prev
+    values = x[start + 1:].tolist()
+    for i, v in enumerate(values, start + 1):
+        out[i] = prev = prev * alpha1 + v * alpha
+    return out
+
+
+def highest(x, period):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period).max(axis=1)
+    return out
+
+
+def lowest(x, period):
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if len(x) >= period:
+        out[period - 1:] = np.lib.stride_tricks.sliding_window_view(x, period).min(axis=1)
+    return out
+
+
+def crossover(a, b):
+    # +1 / -1 / 0 like bt.ind.CrossOver, including its "last non-zero
+    # difference" handling when the two lines touch
+    diff = np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)
+    nzd = diff.copy()
+    nzd[nzd == 0] = np.nan
+    # Forward fill, then 0 before the first non-zero difference
+    filled = np.where(np.isnan(nzd), 0, np.arange(len(nzd)))
+    nzd = nzd[np.maximum.accumulate(filled)] if len(nzd) else nzd
+    nzd[np.isnan(nzd)] = 0.0
+    prev = np.concatenate([[np.nan], nzd[:-1]])
+    prev[np.isnan(np.concatenate([[np.nan], diff[:-1]]))] = np.nan
+    cross = np.zeros(len(diff))
+    cross[(prev < 0) & (diff > 0)] = 1.0
+    cross[(prev > 0) & (diff < 0)] = -1.0
+    return cross
+
+
+def macd(close, period_me1=12, period_me2=26, period_signal=9):
+    line = ema(close, period_me1) - ema(close, period_me2)
+    return line, ema(line, period_signal)
+
+
+def kdj(high, low, close, period=14, period_d=3, period_j=3):
+    # Same construction as indicator.KDJ
+    hh = highest(high, period)
+    ll = lowest(low, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsv = 100 * (np.asarray(close, dtype=np.float64) - ll) / (hh - ll)
+    k = sma(rsv, period_d)
+    d = sma(k, period_j)
+    return k, d, 3 * k - 2 * d
+
+
+def simulate(data, entries, exits=None, cash=10000.0, commission=0.001, size=None, value=None,
+             stop_loss=None, take_profit=None, halt_on_reject=False):
+    # Long-only, one position at a time. Sizing follows sizer.py: size=None is
+    # AllInSizer, value=... is FixedValueSizer, an int is a fixed stake.
+    # stop_loss/take_profit are fractions of the close on the entry signal bar.
+    # Buys the broker would reject for cash (checked at the signal close and
+    # again at the fill open) are dropped; halt_on_reject mirrors strategies
+    # whose pending-order guard is never cleared after such a rejection.
+    import pandas as pd
+    opens = np.asarray(data['open'], dtype=np.float64)
+    closes = np.asarray(data['close'], dtype=np.float64)
+    n = len(closes)
+    entries = np.asarray(entries, dtype=bool)
+    exits = np.zeros(n, dtype=bool) if exits is None else np.asarray(exits, dtype=bool)
+    entry_idx = np.flatnonzero(entries)
+
+    cash_line = np.full(n, float(cash))
+    pos_line = np.zeros(n)
+    trades = []
+    i = 0
+    while True:
+        # Next entry signal while flat
+        k = np.searchsorted(entry_idx, i)
+        if k == len(entry_idx):
+            break
+        e = entry_idx[k]
+        f = e + 1
+        if f >= n:
+            break
+        if size is not None:
+            qty = size
+        elif value is not None:
+            qty = int(value / closes[e])
+        else:
+            qty = int((cash * 0.99) / closes[e])
+        if qty <= 0:
+            i = f
+            continue
+        cost = qty * opens[f]
+        quoted = qty * closes[e]
+        if quoted + quoted * commission > cash or cost + cost * commission > cash:
+            if halt_on_reject:
+                break
+            i = f
+            continue
+        buy_comm = cost * commission
+        cash -= cost + buy_comm
+        cash_line[f:] = cash
+        pos_line[f:] = qty
+
+        # First exit condition from the fill bar onwards
+        hit = exits[f:].copy()
+        if stop_loss is not None:
+            hit |= closes[f:] <= closes[e] * (1 - stop_loss)
+        if take_profit is not None:
+            hit |= closes[f:] >= closes[e] * (1 + take_profit)
+        if not hit.any():
+            break
+        x = f + int(np.argmax(hit))
+        s = x + 1
+        if s >= n:
+            break
+        proceeds = qty * opens[s]
+        sell_comm = proceeds * commission
+        cash += proceeds - sell_comm
+        cash_line[s:] = cash
+        pos_line[s:] = 0
+        trades.append({
+            'entry_bar': f, 'exit_bar': s, 'size': qty,
+            'entry_price': opens[f], 'exit_price': opens[s],
+            'pnl': proceeds - cost, 'pnlcomm': proceeds - cost - buy_comm - sell_comm,
+        })
+        i = s
+
+    equity = cash_line + pos_line * closes
+    index = getattr(data, 'index', None)
+    trades = pd.DataFrame(trades, columns=['entry_bar', 'exit_bar', 'size', 'entry_price',
+                                           'exit_price', 'pnl', 'pnlcomm'])
+    if index is not None and len(trades):
+        trades['entry_date'] = index[trades['entry_bar']]
+        trades['exit_date'] = index[trades['exit_bar']]
+    return {'equity': pd.Series(equity, index=index), 'trades': trades, 'final_value': equity[-1] if n else cash}
+
+
+def run_fast(strategy, data, cash=10000.0, commission=0.001, stake=None, value=None, **params):
+    # Strategies opt in by defining vector_signals(data, **params). params are
+    # strategy params only; stake/value stand in for the sizer and are
+    # overridden by a strategy that sizes its own orders.
+    signals = strategy.vector_signals(data, **params)
+    size = signals.pop('size', stake)
+    return simulate(data, cash=cash, commission=commission, size=size, value=value, **signals)
+
+
+def sizing(sizer=None, sizer_params=None):
+    # run_fast sizing arguments matching a backtrader sizer, or None when the
+    # simulator has no equivalent. No sizer is backtrader's FixedSize(stake=1).
+    name = getattr(sizer, '__name__', None)
+    sizer_params = sizer_params or {}
+    if name in (None, 'FixedSize', 'SizerFix'):
+        return {'stake': sizer_params.get('stake', 1)}
+    if name == 'AllInSizer':
+        return {'stake': None}
+    if name == 'FixedValueSizer':
+        return {'value': sizer_params.get('value', 1000)}
+    return None